@@ -1,4 +1,4 @@
 """API package initialization."""
-from app.api import chat, documents, sessions
+from app.api import chat, documents, sessions, metrics, debug
 
-__all__ = ["chat", "documents", "sessions"]
+__all__ = ["chat", "documents", "sessions", "metrics", "debug"]
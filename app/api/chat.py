@@ -4,7 +4,7 @@ Handles chat interactions with the AI assistant.
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session as DBSession
-from app.config.database import get_db
+from app.config.database import get_db, read_router
 from app.models.models import Session, Message
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.rag_service import rag_service
@@ -14,13 +14,16 @@ router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
 
 @router.post("/", response_model=ChatResponse)
-async def chat(
+def chat(
     request: ChatRequest,
     db: DBSession = Depends(get_db)
 ):
     """
     Chat endpoint for sending messages to the AI assistant.
     
+    Defined as a plain function so FastAPI runs it in its threadpool: the
+    retrieval, database and LLM calls below are blocking.
+    
     Args:
         request: ChatRequest containing session_id and message
         db: Database session
@@ -48,7 +51,8 @@ async def chat(
         assistant_response = rag_service.generate_response(
             db, 
             session.id, 
-            request.message
+            request.message,
+            session_key=request.session_id
         )
         
         # Save user message
@@ -71,6 +75,7 @@ async def chat(
         session.updated_at = datetime.now()
         
         db.commit()
+        read_router.mark_written(request.session_id)
         db.refresh(assistant_msg)
         
         return ChatResponse(
@@ -0,0 +1,87 @@
+"""
+Debug API endpoints.
+Lists and downloads request profiles; disabled unless DEBUG_TOKEN is set.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+from app.config.settings import settings
+from app.services.profiling import profile_store
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """
+    Check the X-Debug-Token header.
+    
+    Raises:
+        HTTPException: 404 if debug endpoints are disabled, 403 if the token is wrong
+    """
+    if not settings.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_debug_token is None or not hmac.compare_digest(x_debug_token, settings.DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+router = APIRouter(
+    prefix="/api/debug",
+    tags=["Debug"],
+    dependencies=[Depends(require_debug_token)],
+    include_in_schema=False
+)
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    List the profiles kept by the worker that serves the request.
+    
+    Returns:
+        Profile summaries, newest first
+    """
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Get a profile with its hottest functions and SQL statements.
+    
+    Args:
+        profile_id: Id from the X-Profile-Id response header
+        
+    Returns:
+        Profile details
+        
+    Raises:
+        HTTPException: If the profile is not stored on this worker
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.to_dict()
+
+
+@router.get("/profiles/{profile_id}/folded")
+async def download_profile(profile_id: str):
+    """
+    Download a profile's stack samples in collapsed-stack format.
+    
+    The file can be opened with speedscope or flamegraph.pl.
+    
+    Args:
+        profile_id: Id from the X-Profile-Id response header
+        
+    Returns:
+        Collapsed stacks as a text attachment
+        
+    Raises:
+        HTTPException: If the profile is not stored on this worker
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile.folded(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
@@ -3,30 +3,149 @@ Document upload API endpoints.
 Handles file uploads for RAG context.
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from sqlalchemy import func
 from sqlalchemy.orm import Session as DBSession
-from app.config.database import get_db
-from app.models.models import Session, Document, DocumentChunk
-from app.models.schemas import DocumentUploadResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import tempfile
+from app.api.responses import FastJSONResponse
+from app.config.database import get_db, get_read_db, read_router
+from app.models.models import Session, Document, DocumentChunk, SessionDocument
+from app.models.schemas import DocumentUploadResponse, AttachDocumentRequest, PinDocumentRequest
+from app.services import library_service
 from app.services.document_service import document_processor
-from app.services.embedding_service import embedding_service
+from app.services.ingestion_service import ingestion_service
+from app.services.reembedding_service import EmbeddingModelMismatchError
 from app.config.settings import settings
 
 router = APIRouter(prefix="/api/documents", tags=["Documents"])
 
 
+async def spool_upload(file: UploadFile) -> tempfile.SpooledTemporaryFile:
+    """
+    Stream an upload into a spooled temporary file.
+    
+    Small files stay in memory; anything above UPLOAD_SPOOL_MAX_BYTES rolls
+    over to disk. Only one UPLOAD_READ_BLOCK_BYTES block is held at a time,
+    and the upload is rejected as soon as it passes MAX_UPLOAD_BYTES.
+    
+    Args:
+        file: Uploaded file
+        
+    Returns:
+        Spooled file positioned at the start; the caller must close it
+        
+    Raises:
+        HTTPException: If the file is larger than MAX_UPLOAD_BYTES
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_BYTES)
+    size = 0
+    try:
+        while True:
+            block = await file.read(settings.UPLOAD_READ_BLOCK_BYTES)
+            if not block:
+                break
+            size += len(block)
+            if size > settings.MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum upload size is {settings.MAX_UPLOAD_BYTES} bytes."
+                )
+            spooled.write(block)
+    except BaseException:
+        spooled.close()
+        raise
+    
+    spooled.seek(0)
+    return spooled
+
+
+def validate_upload_type(file: UploadFile):
+    """
+    Reject files that are neither PDF nor plain text.
+    
+    Args:
+        file: Uploaded file
+        
+    Raises:
+        HTTPException: If file type not supported
+    """
+    allowed_types = ["application/pdf", "text/plain"]
+    if file.content_type not in allowed_types:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Unsupported file type. Allowed types: PDF, TXT"
+        )
+
+
+async def ingest_upload(
+    db: DBSession,
+    session_pk: Optional[int],
+    file: UploadFile,
+    spooled: tempfile.SpooledTemporaryFile,
+    existing: Optional[Document]
+):
+    """
+    Extract the text of a spooled upload and ingest it.
+    
+    Parsing and embedding run in the threadpool, so they do not block the
+    event loop.
+    
+    Args:
+        db: Database session
+        session_pk: Database id of the session, or None for the library
+        file: Uploaded file
+        spooled: Spooled upload content; closed once it has been read
+        existing: Document the upload replaces, if any
+        
+    Returns:
+        (IngestionResult, file type)
+    """
+    if file.content_type == "application/pdf":
+        text_content = await run_in_threadpool(document_processor.process_pdf_file, spooled)
+        file_type = "pdf"
+    else:  # text/plain
+        text_content = await run_in_threadpool(
+            document_processor.process_text_file,
+            spooled,
+            block_size=settings.UPLOAD_READ_BLOCK_BYTES
+        )
+        file_type = "txt"
+    spooled.close()
+    
+    # Re-uploads of a file replace the stored document incrementally
+    result = await run_in_threadpool(
+        ingestion_service.ingest_text,
+        db,
+        session_pk,
+        file.filename,
+        file_type,
+        text_content,
+        document=existing
+    )
+    return result, file_type
+
+
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     session_id: str = Form(...),
     file: UploadFile = File(...),
+    document_id: Optional[int] = Form(None),
     db: DBSession = Depends(get_db)
 ):
     """
     Upload a document for RAG context.
     Supports PDF and TXT file formats.
     
+    Uploading a file with the same name to the same session (or passing the
+    document_id of an existing document) re-indexes that document: unchanged
+    chunks keep their embeddings, only new or changed chunks are embedded,
+    and chunks that disappeared are removed.
+    
     Args:
         session_id: Session ID to associate the document with
         file: Uploaded file (PDF or TXT)
+        document_id: Optional id of the document this upload replaces
         db: Database session
         
     Returns:
@@ -35,13 +154,10 @@ async def upload_document(
     Raises:
         HTTPException: If file type not supported or error occurs
     """
-    # Validate file type
-    allowed_types = ["application/pdf", "text/plain"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Unsupported file type. Allowed types: PDF, TXT"
-        )
+    validate_upload_type(file)
+    
+    # Stream the upload to a temporary file before touching the database
+    spooled = await spool_upload(file)
     
     # Get or create session
     session = db.query(Session).filter(
@@ -54,74 +170,314 @@ async def upload_document(
         db.commit()
         db.refresh(session)
     
+    # Find the document this upload replaces, if any
+    existing = ingestion_service.find_existing_document(db, session.id, file.filename, document_id)
+    if document_id is not None and existing is None:
+        spooled.close()
+        raise HTTPException(status_code=404, detail="Document not found")
+    
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Process document based on type
-        if file.content_type == "application/pdf":
-            text_content = document_processor.process_pdf(file_content)
-            file_type = "pdf"
-        else:  # text/plain
-            text_content = document_processor.process_text(file_content)
-            file_type = "txt"
-        
-        # Create document record
-        document = Document(
-            session_id=session.id,
+        result, file_type = await ingest_upload(db, session.id, file, spooled, existing)
+        read_router.mark_written(session_id)
+        
+        if existing is not None:
+            message = "Document re-indexed successfully"
+        else:
+            message = "Document uploaded and processed successfully"
+        
+        return DocumentUploadResponse(
+            session_id=session_id,
+            document_id=result.document.id,
             filename=file.filename,
             file_type=file_type,
-            content=text_content
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-        
-        # Chunk the text
-        chunks = document_processor.chunk_text(
-            text_content,
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+            chunks_created=result.chunks_added,
+            chunks_reused=result.chunks_reused,
+            chunks_added=result.chunks_added,
+            chunks_removed=result.chunks_removed,
+            message=message
         )
+    
+    except EmbeddingModelMismatchError as e:
+        db.rollback()
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        db.rollback()
+        # Log the full error internally
+        import logging
+        logging.error(f"Error processing document: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An error occurred while processing the document. Please try again.")
+    
+    finally:
+        spooled.close()
+
+
+@router.post("/library/upload", response_model=DocumentUploadResponse)
+async def upload_library_document(
+    file: UploadFile = File(...),
+    document_id: Optional[int] = Form(None),
+    db: DBSession = Depends(get_db)
+):
+    """
+    Upload a document to the shared library.
+    
+    Library documents are ingested once and can then be attached to any
+    number of sessions without copying their chunks. Re-uploading a file
+    with the same name re-indexes it for every session it is attached to.
+    
+    Args:
+        file: Uploaded file (PDF or TXT)
+        document_id: Optional id of the library document this upload replaces
+        db: Database session
         
-        # Generate embeddings for chunks
-        embeddings = embedding_service.generate_embeddings(chunks)
+    Returns:
+        DocumentUploadResponse with upload details (session_id is null)
         
-        # Store chunks with embeddings
-        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            doc_chunk = DocumentChunk(
-                document_id=document.id,
-                chunk_text=chunk,
-                chunk_index=idx,
-                embedding=embedding
-            )
-            db.add(doc_chunk)
+    Raises:
+        HTTPException: If file type not supported or error occurs
+    """
+    validate_upload_type(file)
+    spooled = await spool_upload(file)
+    
+    existing = ingestion_service.find_existing_document(db, None, file.filename, document_id)
+    if document_id is not None and existing is None:
+        spooled.close()
+        raise HTTPException(status_code=404, detail="Library document not found")
+    
+    try:
+        result, file_type = await ingest_upload(db, None, file, spooled, existing)
         
-        db.commit()
+        if existing is not None:
+            message = "Library document re-indexed successfully"
+        else:
+            message = "Library document uploaded and processed successfully"
         
         return DocumentUploadResponse(
-            session_id=session_id,
+            session_id=None,
+            document_id=result.document.id,
             filename=file.filename,
             file_type=file_type,
-            chunks_created=len(chunks),
-            message="Document uploaded and processed successfully"
+            chunks_created=result.chunks_added,
+            chunks_reused=result.chunks_reused,
+            chunks_added=result.chunks_added,
+            chunks_removed=result.chunks_removed,
+            message=message
         )
     
+    except EmbeddingModelMismatchError as e:
+        db.rollback()
+        raise HTTPException(status_code=503, detail=str(e))
+    
     except Exception as e:
         db.rollback()
         # Log the full error internally
         import logging
-        logging.error(f"Error processing document: {str(e)}", exc_info=True)
+        logging.error(f"Error processing library document: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="An error occurred while processing the document. Please try again.")
+    
+    finally:
+        spooled.close()
+
+
+@router.get("/library")
+async def list_library_documents(
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    List all documents in the shared library.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        List of library documents with chunk and attachment counts
+    """
+    attachment_count = db.query(func.count(SessionDocument.session_id)).filter(
+        SessionDocument.document_id == Document.id
+    ).correlate(Document).scalar_subquery()
+    
+    documents = db.query(
+        Document.id,
+        Document.filename,
+        Document.file_type,
+        Document.created_at,
+        func.count(DocumentChunk.id).label("chunks_count"),
+        attachment_count.label("sessions_count")
+    ).outerjoin(DocumentChunk).filter(
+        Document.session_id.is_(None)
+    ).group_by(Document.id).order_by(Document.id).all()
+    
+    return FastJSONResponse({
+        "documents": [
+            {
+                "id": doc.id,
+                "filename": doc.filename,
+                "file_type": doc.file_type,
+                "created_at": doc.created_at,
+                "chunks_count": doc.chunks_count,
+                "sessions_count": doc.sessions_count
+            }
+            for doc in documents
+        ]
+    })
+
+
+@router.delete("/library/{document_id}")
+async def delete_library_document(
+    document_id: int,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Delete a library document and detach it from all sessions.
+    
+    Args:
+        document_id: Library document id
+        db: Database session
+        
+    Returns:
+        Success message
+        
+    Raises:
+        HTTPException: If the library document is not found
+    """
+    document = library_service.get_library_document(db, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Library document not found")
+    
+    library_service.delete_library_document(db, document)
+    return {"message": f"Library document {document_id} deleted successfully", "document_id": document_id}
+
+
+@router.post("/library/{document_id}/attach")
+async def attach_library_document(
+    document_id: int,
+    request: AttachDocumentRequest,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Attach a library document to a session.
+    
+    The session retrieves from the document's chunks from now on; nothing
+    is copied or re-embedded. Attaching twice is a no-op.
+    
+    Args:
+        document_id: Library document id
+        request: AttachDocumentRequest with the session ID
+        db: Database session
+        
+    Returns:
+        Attachment status
+        
+    Raises:
+        HTTPException: If the session or library document is not found
+    """
+    session = db.query(Session).filter(
+        Session.session_id == request.session_id
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if library_service.get_library_document(db, document_id) is None:
+        raise HTTPException(status_code=404, detail="Library document not found")
+    
+    attached = library_service.attach_document(db, session.id, document_id)
+    read_router.mark_written(request.session_id)
+    return {
+        "session_id": request.session_id,
+        "document_id": document_id,
+        "attached": True,
+        "message": "Document attached" if attached else "Document was already attached"
+    }
+
+
+@router.delete("/library/{document_id}/attach/{session_id}")
+async def detach_library_document(
+    document_id: int,
+    session_id: str,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Detach a library document from a session; the document stays in the library.
+    
+    Args:
+        document_id: Library document id
+        session_id: Session ID
+        db: Database session
+        
+    Returns:
+        Detachment status
+        
+    Raises:
+        HTTPException: If the session is not found or the document is not attached to it
+    """
+    session = db.query(Session).filter(
+        Session.session_id == session_id
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if not library_service.detach_document(db, session.id, document_id):
+        raise HTTPException(status_code=404, detail="Document is not attached to this session")
+    read_router.mark_written(session_id)
+    
+    return {
+        "session_id": session_id,
+        "document_id": document_id,
+        "attached": False,
+        "message": "Document detached"
+    }
+
+
+@router.post("/{document_id}/pin")
+async def pin_document(
+    document_id: int,
+    request: PinDocumentRequest,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Pin or unpin a document in a session's prompts.
+    
+    Pinned documents are sent in full (up to PROMPT_PINNED_MAX_TOKENS) at
+    the start of every prompt of the session, ahead of the retrieved
+    context. Works for the session's own and attached library documents.
+    
+    Args:
+        document_id: Document id
+        request: PinDocumentRequest with the session ID and pinned state
+        db: Database session
+        
+    Returns:
+        Pinned status
+        
+    Raises:
+        HTTPException: If the session is not found or the document is not part of it
+    """
+    session = db.query(Session).filter(
+        Session.session_id == request.session_id
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if not library_service.set_pinned(db, session.id, document_id, request.pinned):
+        raise HTTPException(status_code=404, detail="Document not found in this session")
+    read_router.mark_written(request.session_id)
+    
+    return {
+        "session_id": request.session_id,
+        "document_id": document_id,
+        "pinned": request.pinned,
+        "message": "Document pinned" if request.pinned else "Document unpinned"
+    }
 
 
 @router.get("/list/{session_id}")
 async def list_documents(
     session_id: str,
-    db: DBSession = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
     """
-    List all documents uploaded for a session.
+    List all documents uploaded for a session, followed by the library
+    documents attached to it (marked "shared").
     
     Args:
         session_id: Session ID to filter documents
@@ -141,12 +497,23 @@ async def list_documents(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get all documents for this session
-    documents = db.query(Document).filter(
-        Document.session_id == session.id
-    ).all()
+    # Get all documents of this session with their chunk counts in one query
+    documents = db.query(
+        Document.id,
+        Document.filename,
+        Document.file_type,
+        Document.created_at,
+        Document.session_id,
+        func.coalesce(SessionDocument.pinned, Document.pinned).label("pinned"),
+        func.count(DocumentChunk.id).label("chunks_count")
+    ).outerjoin(DocumentChunk).outerjoin(
+        SessionDocument,
+        (SessionDocument.document_id == Document.id) & (SessionDocument.session_id == session.id)
+    ).filter(
+        Document.id.in_(library_service.session_document_ids(session.id))
+    ).group_by(Document.id, SessionDocument.pinned).order_by(Document.session_id.is_(None), Document.id).all()
     
-    return {
+    return FastJSONResponse({
         "session_id": session_id,
         "documents": [
             {
@@ -154,8 +521,10 @@ async def list_documents(
                 "filename": doc.filename,
                 "file_type": doc.file_type,
                 "created_at": doc.created_at,
-                "chunks_count": len(doc.chunks)
+                "chunks_count": doc.chunks_count,
+                "shared": doc.session_id is None,
+                "pinned": doc.pinned
             }
             for doc in documents
         ]
-    }
+    })
@@ -0,0 +1,41 @@
+"""
+Metrics API endpoints.
+Exposes load and cache counters of this worker process.
+"""
+from fastapi import APIRouter
+import os
+from app.config.database import read_router
+from app.middleware import chat_admission, chat_idempotency, upload_admission
+from app.services.llm_service import llm_service
+from app.services.rag_service import rag_service
+from app.services.vector_cache import vector_cache
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get("/")
+async def get_metrics():
+    """
+    Get runtime metrics of the worker that serves the request.
+    
+    Counters are per process; with several workers, each reports its own.
+    
+    Returns:
+        Admission queue depth and rejections, idempotency replays, LLM
+        latency and prompt cache usage, answer paths, skipped RAG stages,
+        read routing and vector cache counters
+    """
+    return {
+        "pid": os.getpid(),
+        "admission": {
+            "chat": chat_admission.stats(),
+            "upload": upload_admission.stats(),
+        },
+        "idempotency": chat_idempotency.stats(),
+        "llm_latency": llm_service.get_latency_stats(),
+        "llm_prompt_cache": llm_service.get_prompt_cache_stats(),
+        "answer_paths": rag_service.get_path_stats(),
+        "rag_stages": rag_service.get_stage_stats(),
+        "read_routing": read_router.stats(),
+        "vector_cache": vector_cache.stats(),
+    }
@@ -0,0 +1,29 @@
+"""
+Fast JSON responses for endpoints that return rows straight from the database.
+Serializes plain dicts and lists without building and re-validating Pydantic models per row.
+"""
+from typing import Any
+from fastapi.responses import JSONResponse
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by orjson, or by pydantic-core when orjson is missing.
+
+    Returning it from an endpoint bypasses FastAPI's response_model
+    validation and jsonable_encoder, so it is only meant for content built
+    from trusted database rows that already match the declared schema.
+    Datetimes are rendered the same way as by the Pydantic models
+    (ISO 8601, UTC as "Z").
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+        return pydantic_core.to_json(content)
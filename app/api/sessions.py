@@ -2,17 +2,58 @@
 Session management API endpoints.
 Handles creation and retrieval of chat sessions.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session as DBSession
-from app.config.database import get_db
-from app.models.models import Session
-from app.models.schemas import SessionCreate, SessionResponse, ConversationHistory, MessageHistory
+from app.api.responses import FastJSONResponse
+from app.config.database import get_db, get_read_db, read_router
+from app.models.models import Session, Message, Document, SessionDocument
+from app.models.schemas import SessionCreate, SessionResponse, ConversationHistory
+from app.config.settings import settings
+from app.services.session_cleanup import (
+    count_session_rows,
+    mark_session_deleted,
+    purge_session,
+    purge_session_in_background,
+)
 from typing import List
 import uuid
 
 router = APIRouter(prefix="/api/sessions", tags=["Sessions"])
 
 
+def session_summary_query(db: DBSession):
+    """
+    Query session columns with message and document counts.
+    
+    The counts are correlated subqueries, so listing sessions costs one
+    query instead of loading every message and document of every session.
+    Attached library documents count as documents of the session.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Query yielding (session_id, created_at, message_count, document_count) rows
+    """
+    message_count = db.query(func.count(Message.id)).filter(
+        Message.session_id == Session.id
+    ).correlate(Session).scalar_subquery()
+    document_count = db.query(func.count(Document.id)).filter(
+        Document.session_id == Session.id
+    ).correlate(Session).scalar_subquery()
+    attached_count = db.query(func.count(SessionDocument.document_id)).filter(
+        SessionDocument.session_id == Session.id
+    ).correlate(Session).scalar_subquery()
+    
+    return db.query(
+        Session.session_id,
+        Session.created_at,
+        message_count.label("message_count"),
+        (document_count + attached_count).label("document_count")
+    )
+
+
 @router.post("/", response_model=SessionResponse)
 async def create_session(
     request: SessionCreate,
@@ -46,6 +87,7 @@ async def create_session(
     session = Session(session_id=session_id)
     db.add(session)
     db.commit()
+    read_router.mark_written(session_id)
     db.refresh(session)
     
     return SessionResponse(
@@ -59,7 +101,7 @@ async def create_session(
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: str,
-    db: DBSession = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
     """
     Get session details.
@@ -74,7 +116,7 @@ async def get_session(
     Raises:
         HTTPException: If session not found
     """
-    session = db.query(Session).filter(
+    session = session_summary_query(db).filter(
         Session.session_id == session_id
     ).first()
     
@@ -84,19 +126,22 @@ async def get_session(
     return SessionResponse(
         session_id=session.session_id,
         created_at=session.created_at,
-        message_count=len(session.messages),
-        document_count=len(session.documents)
+        message_count=session.message_count,
+        document_count=session.document_count
     )
 
 
 @router.get("/{session_id}/history", response_model=ConversationHistory)
 async def get_conversation_history(
     session_id: str,
-    db: DBSession = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
     """
     Get conversation history for a session.
     
+    Rows are read as plain columns and serialized directly (see
+    FastJSONResponse), which matters for sessions with thousands of messages.
+    
     Args:
         session_id: Session ID
         db: Database session
@@ -114,31 +159,47 @@ async def get_conversation_history(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = [
-        MessageHistory(
-            role=msg.role,
-            content=msg.content,
-            created_at=msg.created_at
-        )
-        for msg in session.messages
-    ]
-    
-    return ConversationHistory(
-        session_id=session_id,
-        messages=messages
+    query = db.query(Message.role, Message.content, Message.created_at).filter(
+        Message.session_id == session.id
     )
+    
+    # No message predates its session; with a partitioned messages table
+    # this bound lets PostgreSQL skip partitions older than the session
+    # (as in the RAG history query; a plain table may hold NULL timestamps)
+    if settings.MESSAGES_PARTITIONING:
+        query = query.filter(Message.created_at >= session.created_at)
+    
+    history = query.order_by(Message.created_at, Message.id).all()
+    
+    return FastJSONResponse({
+        "session_id": session_id,
+        "messages": [
+            {"role": role, "content": content, "created_at": created_at}
+            for role, content, created_at in history
+        ]
+    })
 
 
 @router.delete("/{session_id}")
-async def delete_session(
+def delete_session(
     session_id: str,
+    background_tasks: BackgroundTasks,
     db: DBSession = Depends(get_db)
 ):
     """
     Delete a session and all associated data (messages and documents).
+    Attached library documents are only detached, never deleted.
+    
+    Small sessions are deleted right away with set-based statements. Sessions
+    with more than SESSION_DELETE_INLINE_MAX_ROWS chunks and messages are
+    hidden immediately and purged in bounded batches in the background.
+    
+    Defined as a plain function so FastAPI runs it in its threadpool: the
+    row count and the inline purge are blocking.
     
     Args:
         session_id: Session ID to delete
+        background_tasks: FastAPI background task queue
         db: Database session
         
     Returns:
@@ -154,19 +215,26 @@ async def delete_session(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Delete the session (cascade will delete related messages and documents)
-    db.delete(session)
-    db.commit()
+    # Delete the session (ON DELETE CASCADE removes related messages and documents)
+    if count_session_rows(db, session.id) > settings.SESSION_DELETE_INLINE_MAX_ROWS:
+        mark_session_deleted(db, session)
+        background_tasks.add_task(purge_session_in_background, session.id)
+        purge = "background"
+    else:
+        purge_session(db, session.id)
+        purge = "completed"
+    read_router.mark_written(session_id)
     
     return {
         "message": f"Session {session_id} deleted successfully",
-        "session_id": session_id
+        "session_id": session_id,
+        "purge": purge
     }
 
 
 @router.get("/", response_model=List[SessionResponse])
 async def list_sessions(
-    db: DBSession = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
     """
     List all available sessions.
@@ -177,14 +245,16 @@ async def list_sessions(
     Returns:
         List of SessionResponse objects
     """
-    sessions = db.query(Session).order_by(Session.created_at.desc()).all()
-    
-    return [
-        SessionResponse(
-            session_id=session.session_id,
-            created_at=session.created_at,
-            message_count=len(session.messages),
-            document_count=len(session.documents)
-        )
+    sessions = session_summary_query(db).filter(
+        Session.deleted_at.is_(None)
+    ).order_by(Session.created_at.desc()).all()
+    
+    return FastJSONResponse([
+        {
+            "session_id": session.session_id,
+            "created_at": session.created_at,
+            "message_count": session.message_count,
+            "document_count": session.document_count
+        }
         for session in sessions
-    ]
+    ])
@@ -1,5 +1,5 @@
 """Configuration package initialization."""
 from app.config.settings import settings
-from app.config.database import get_db, engine, Base
+from app.config.database import get_db, get_read_db, engine, Base
 
-__all__ = ["settings", "get_db", "engine", "Base"]
+__all__ = ["settings", "get_db", "get_read_db", "engine", "Base"]
@@ -1,18 +1,205 @@
 """Database configuration and session management."""
-from sqlalchemy import create_engine
+from typing import Dict, List, Optional
+import itertools
+import logging
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config.settings import settings
+from app.config.vector_binding import install_vector_binding
+
+logger = logging.getLogger(__name__)
 
 # Create database engine
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW
+)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replicas (none unless DATABASE_REPLICA_URLS is set)
+replica_engines = [
+    create_engine(
+        url.strip(),
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        # An unreachable replica must not hold up the request that checks it
+        connect_args={"connect_timeout": settings.REPLICA_CONNECT_TIMEOUT_SECONDS}
+    )
+    for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()
+]
+
+# Query vectors are bound as NumPy arrays on every engine
+for _engine in [engine, *replica_engines]:
+    install_vector_binding(_engine)
+
 # Base class for database models
 Base = declarative_base()
 
+# Replay lag of a standby in seconds; 0 when it has replayed everything it
+# received (an idle primary would otherwise look lagged) or is not a standby.
+# NULL when its WAL receiver is not streaming: it then receives nothing, so
+# having replayed everything received says nothing about its lag. (status is
+# only visible with pg_read_all_stats; otherwise the receiver must just run.)
+_REPLICA_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE coalesce(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadRouter:
+    """
+    Routes read-only database sessions to replicas.
+
+    Replicas are used round-robin. A replica is skipped while it lags more
+    than max_lag seconds, is not streaming WAL from the primary, or cannot
+    be reached; its state is re-checked every
+    check_interval seconds. With no usable replica, reads go to the primary.
+
+    For read-your-writes, writers call mark_written() with the public
+    session id; reads for that session then use the primary for
+    read_your_writes seconds. This is tracked per process, so deployments
+    with several workers should route a chat session to one worker (sticky
+    load balancing) or keep the window above the usual replication lag.
+    """
+
+    def __init__(
+        self,
+        replicas: List,
+        read_your_writes: float,
+        max_lag: float,
+        check_interval: float
+    ):
+        """
+        Args:
+            replicas: Replica engines
+            read_your_writes: Seconds after a write during which reads go to the primary
+            max_lag: Replication lag in seconds above which a replica is skipped
+            check_interval: Seconds between lag checks of a replica
+        """
+        self.replicas = replicas
+        self.read_your_writes = read_your_writes
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._factories = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replicas]
+        self._next = itertools.count()
+        self._written: Dict[str, float] = {}
+        self._health: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self.reads = {"primary": 0, "replica": 0, "sticky": 0}
+
+    def mark_written(self, session_key: Optional[str]):
+        """
+        Record a write for a chat session, pinning its reads to the primary for a while.
+
+        Args:
+            session_key: Public session id
+        """
+        if not self.replicas or session_key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._written[session_key] = now
+            if len(self._written) > 10000:
+                cutoff = now - self.read_your_writes
+                self._written = {key: at for key, at in self._written.items() if at >= cutoff}
+
+    def recently_written(self, session_key: Optional[str]) -> bool:
+        """
+        Check whether a chat session was written within the read-your-writes window.
+
+        Args:
+            session_key: Public session id
+
+        Returns:
+            True if reads for the session must go to the primary
+        """
+        if session_key is None:
+            return False
+        with self._lock:
+            written_at = self._written.get(session_key)
+        return written_at is not None and time.monotonic() - written_at < self.read_your_writes
+
+    def _usable(self, index: int) -> bool:
+        """Whether a replica is reachable and within max_lag, re-checking it at most every check_interval."""
+        now = time.monotonic()
+        with self._lock:
+            checked_at, usable = self._health.get(index, (None, True))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return usable
+        try:
+            with self.replicas[index].connect() as conn:
+                lag = conn.execute(_REPLICA_LAG).scalar()
+            if lag is None:
+                usable = False
+                logger.warning(f"Replica {index} is not streaming from the primary; reading from other servers")
+            else:
+                usable = float(lag) <= self.max_lag
+                if not usable:
+                    logger.warning(f"Replica {index} lags {float(lag):.1f}s behind; reading from other servers")
+        except Exception as e:
+            usable = False
+            logger.warning(f"Replica {index} is unavailable: {str(e)}")
+        with self._lock:
+            self._health[index] = (now, usable)
+        return usable
+
+    def session(self, session_key: Optional[str] = None) -> Session:
+        """
+        Open a session for read-only queries.
+
+        Args:
+            session_key: Public session id the reads are for, if any
+
+        Returns:
+            Session on a replica, or on the primary when the chat session
+            was just written or no replica is usable
+        """
+        if self.replicas:
+            if self.recently_written(session_key):
+                self.reads["sticky"] += 1
+                return SessionLocal()
+            start = next(self._next)
+            for offset in range(len(self.replicas)):
+                index = (start + offset) % len(self.replicas)
+                if self._usable(index):
+                    self.reads["replica"] += 1
+                    return self._factories[index]()
+        self.reads["primary"] += 1
+        return SessionLocal()
+
+    def stats(self) -> Dict:
+        """
+        Get routing counters.
+
+        Returns:
+            Dictionary with replica count and reads per destination
+        """
+        with self._lock:
+            usable = sum(1 for _, ok in self._health.values() if ok)
+        return {"replicas": len(self.replicas), "usable_replicas": usable, "reads": dict(self.reads)}
+
+
+# Global read router instance
+read_router = ReadRouter(
+    replica_engines,
+    read_your_writes=settings.READ_YOUR_WRITES_SECONDS,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.REPLICA_CHECK_INTERVAL_SECONDS
+)
+
 
 def get_db():
     """
@@ -24,3 +211,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Dependency function to get a read-only database session.
+    Uses a replica unless the session in the `session_id` path parameter was
+    just written by this worker.
+    """
+    db = read_router.session(request.path_params.get("session_id"))
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,91 @@
+"""
+pgvector parameter binding for psycopg2.
+Sends float32 NumPy query vectors as compact pgvector literals and registers the vector type per connection.
+"""
+from functools import lru_cache
+import numpy as np
+import psycopg2
+from psycopg2.extensions import adapt, new_type, register_adapter, register_type
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pgvector.utils import from_db
+
+
+@lru_cache(maxsize=8)
+def _vector_format(dimension: int) -> str:
+    # 9 significant digits round-trip any float32 exactly
+    return "[" + ",".join(["%.9g"] * dimension) + "]"
+
+
+def format_vector(vector: np.ndarray) -> str:
+    """
+    Render a vector as a pgvector text literal.
+
+    psycopg2 only sends parameters in text format, so this is what the
+    server parses. Printing float32 values with 9 significant digits is
+    lossless and about 40% shorter (and faster to produce) than str() of
+    the Python floats.
+
+    Args:
+        vector: One-dimensional numeric array
+
+    Returns:
+        Literal such as "[0.1,0.2,0.3]"
+
+    Raises:
+        ValueError: If the array is not one-dimensional
+    """
+    if vector.ndim != 1:
+        raise ValueError("expected a one-dimensional vector")
+    return _vector_format(vector.shape[0]) % tuple(vector.astype(np.float32, copy=False).tolist())
+
+
+class VectorLiteral:
+    """psycopg2 adapter that binds NumPy arrays as pgvector literals."""
+
+    def __init__(self, vector: np.ndarray):
+        self.vector = vector
+
+    def getquoted(self) -> bytes:
+        return adapt(format_vector(self.vector)).getquoted()
+
+
+def register_vector_type(dbapi_connection):
+    """
+    Parse vector columns of raw queries on this connection into float32 arrays.
+
+    Does nothing when the vector extension is not installed yet (e.g. before
+    init_db.py ran).
+
+    Args:
+        dbapi_connection: psycopg2 connection
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT NULL::vector")
+        oid = cursor.description[0][1]
+    except psycopg2.Error:
+        dbapi_connection.rollback()
+        return
+    finally:
+        cursor.close()
+    dbapi_connection.rollback()
+    register_type(new_type((oid,), "VECTOR", lambda value, cursor: from_db(value)), dbapi_connection)
+
+
+def install_vector_binding(engine: Engine):
+    """
+    Bind NumPy arrays as vectors and register the vector type on every new connection of an engine.
+
+    Args:
+        engine: SQLAlchemy engine using psycopg2
+    """
+    register_adapter(np.ndarray, VectorLiteral)
+    if getattr(engine, "_vector_binding_installed", False):
+        return
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        register_vector_type(dbapi_connection)
+
+    engine._vector_binding_installed = True
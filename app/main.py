@@ -2,11 +2,26 @@
 Main FastAPI application.
 Configures and runs the AI Chatbot API server.
 """
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat, documents, sessions
-from app.config.database import engine, Base
+from app.api import chat, documents, sessions, metrics, debug
+from app.middleware import (
+    AdmissionControlMiddleware,
+    CompressionMiddleware,
+    IdempotencyMiddleware,
+    ProfilingMiddleware,
+    UploadSizeLimitMiddleware,
+    chat_admission,
+    chat_idempotency,
+    upload_admission,
+)
+from app.config.database import engine, replica_engines, Base
 from app.config.settings import settings
+from app.services.profiling import install_query_hooks
+from app.services.rag_service import database_connections_needed
+from app.services.session_cleanup import run_session_sweep
 
 # Create FastAPI app
 app = FastAPI(
@@ -15,6 +30,26 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Shed load instead of queueing without bound; uploads get their own budget
+# so ingestion cannot starve chat
+app.add_middleware(
+    AdmissionControlMiddleware,
+    routes=[
+        ("/api/chat", chat_admission),
+        ("/api/documents/upload", upload_admission),
+        ("/api/documents/library/upload", upload_admission),
+    ]
+)
+
+# Retries with the same Idempotency-Key wait for or replay the first chat
+# request (outside admission control, so waiting duplicates take no slot)
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=chat_idempotency,
+    paths=["/api/chat"],
+    wait_timeout=settings.IDEMPOTENCY_WAIT_SECONDS
+)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,17 +59,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads before their body is parsed
+# (the slack covers multipart framing and form fields)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024,
+    paths=["/api/documents/upload", "/api/documents/library/upload"]
+)
+
+# Compress large responses (history pages, session lists) for clients that accept it
+if settings.RESPONSE_COMPRESSION_MIN_BYTES > 0:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# Count SQL queries per request and profile requests on demand (outermost,
+# so profiles cover the other middleware too)
+for query_engine in [engine, *replica_engines]:
+    install_query_hooks(query_engine)
+app.add_middleware(
+    ProfilingMiddleware,
+    debug_token=settings.DEBUG_TOKEN,
+    sample_rate=settings.PROFILE_SAMPLE_RATE,
+    query_warn_threshold=settings.SQL_QUERY_WARN_THRESHOLD
+)
+
 # Include routers
 app.include_router(chat.router)
 app.include_router(documents.router)
 app.include_router(sessions.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+
+
+async def session_sweeper():
+    """Periodically expire idle sessions and finish interrupted purges."""
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL_SECONDS)
+        try:
+            deleted = await asyncio.to_thread(run_session_sweep)
+            if deleted:
+                logging.info(f"Session sweeper deleted {deleted} sessions")
+        except Exception as e:
+            logging.error(f"Session sweep failed: {str(e)}", exc_info=True)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup."""
-    # This will be handled by init_db.py script
-    pass
+    # Table creation is handled by init_db.py script
+    needed = database_connections_needed()
+    pool = settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW
+    if needed > pool:
+        logging.warning(
+            f"Admitted requests may need {needed} database connections but the pool has {pool}; "
+            f"raise DATABASE_MAX_OVERFLOW or lower CHAT_MAX_CONCURRENCY"
+        )
+    if settings.SESSION_SWEEP_INTERVAL_SECONDS > 0:
+        app.state.session_sweeper = asyncio.create_task(session_sweeper())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks."""
+    sweeper = getattr(app.state, "session_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
 
 
 @app.get("/")
@@ -0,0 +1,17 @@
+"""Middleware package initialization."""
+from app.middleware.admission import AdmissionControlMiddleware, chat_admission, upload_admission
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.idempotency import IdempotencyMiddleware, chat_idempotency
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.upload_limit import UploadSizeLimitMiddleware
+
+__all__ = [
+    "AdmissionControlMiddleware",
+    "CompressionMiddleware",
+    "IdempotencyMiddleware",
+    "ProfilingMiddleware",
+    "UploadSizeLimitMiddleware",
+    "chat_admission",
+    "chat_idempotency",
+    "upload_admission",
+]
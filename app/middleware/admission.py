@@ -0,0 +1,283 @@
+"""
+Admission control for expensive endpoints.
+Bounds concurrent and queued requests and sheds the excess with 429/503 instead of letting everyone slow down.
+"""
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+import asyncio
+import json
+import math
+import time
+from app.config.settings import settings
+
+# Largest request body buffered to read the session id of a JSON request
+MAX_INSPECTED_BODY_BYTES = 64 * 1024
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO wait queue for one class of requests.
+
+    At most max_concurrent requests run at a time. Up to max_queue more wait
+    for a slot for at most queue_timeout seconds; a freed slot is handed
+    directly to the oldest waiter. Requests beyond that are rejected with
+    503 right away. With max_per_session set, one session may have at most
+    that many requests running or waiting; more are rejected with 429.
+
+    The controller lives on the event loop of one worker process and is not
+    thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float,
+        max_per_session: int = 0
+    ):
+        """
+        Args:
+            name: Name used in metrics
+            max_concurrent: Maximum requests running at once
+            max_queue: Maximum requests waiting for a slot
+            queue_timeout: Seconds a request may wait for a slot
+            max_per_session: Maximum running or waiting requests per session (0 = unlimited)
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_session = max_per_session
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._per_session: Dict[str, int] = {}
+        # Moving average of request duration, used for Retry-After
+        self._service_seconds = 1.0
+
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0, "session_limit": 0}
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_seconds * backlog / max(self.max_concurrent, 1)))
+
+    def _reject(self, reason: str, status_code: int, detail: str):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(status_code, detail, self.retry_after())
+
+    def _leave_session(self, session_key: Optional[str]):
+        if session_key is None:
+            return
+        remaining = self._per_session.get(session_key, 0) - 1
+        if remaining > 0:
+            self._per_session[session_key] = remaining
+        else:
+            self._per_session.pop(session_key, None)
+
+    async def acquire(self, session_key: Optional[str] = None):
+        """
+        Wait for a slot.
+
+        Args:
+            session_key: Session the request belongs to, if known
+
+        Raises:
+            AdmissionRejected: If the session, the queue or the wait time is over its limit
+        """
+        if session_key is not None and self.max_per_session > 0:
+            if self._per_session.get(session_key, 0) >= self.max_per_session:
+                self._reject("session_limit", 429, "Too many concurrent requests for this session.")
+        else:
+            session_key = None
+
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self._reject("queue_full", 503, "Server is busy. Please retry later.")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            if session_key is not None:
+                self._per_session[session_key] = self._per_session.get(session_key, 0) + 1
+            try:
+                await asyncio.wait_for(waiter, self.queue_timeout)
+            except BaseException as e:
+                granted = waiter.done() and not waiter.cancelled()
+                if not granted:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    self._leave_session(session_key)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._reject("queue_timeout", 503, "Server is busy. Please retry later.")
+                    raise
+                if not isinstance(e, asyncio.TimeoutError):
+                    # Cancelled right after being handed a slot: give it back
+                    self.release(session_key)
+                    raise
+            self.admitted += 1
+            return
+
+        if session_key is not None:
+            self._per_session[session_key] = self._per_session.get(session_key, 0) + 1
+        self.admitted += 1
+
+    def release(self, session_key: Optional[str] = None, duration: Optional[float] = None):
+        """
+        Free a slot, handing it to the oldest waiter if there is one.
+
+        Args:
+            session_key: Session passed to acquire()
+            duration: Seconds the request ran, to update the Retry-After estimate
+        """
+        if session_key is not None and self.max_per_session > 0:
+            self._leave_session(session_key)
+        if duration is not None:
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * duration
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict:
+        """
+        Get queue depth and counters.
+
+        Returns:
+            Dictionary with active, queued, limits, admitted and rejected counts
+        """
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_service_seconds": round(self._service_seconds, 3),
+        }
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that puts requests to selected paths through an AdmissionController.
+
+    For controllers with a per-session limit, the JSON body is buffered
+    (up to MAX_INSPECTED_BODY_BYTES) to read its session_id and is then
+    replayed to the application unchanged.
+    """
+
+    def __init__(self, app, routes: Iterable[Tuple[str, AdmissionController]], methods: Iterable[str] = ("POST",)):
+        """
+        Args:
+            app: Wrapped ASGI application
+            routes: (path prefix, controller) pairs; the first matching prefix wins
+            methods: HTTP methods that are admission-controlled
+        """
+        self.app = app
+        self.routes = list(routes)
+        self.methods = set(methods)
+
+    def _controller_for(self, scope) -> Optional[AdmissionController]:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return None
+        for prefix, controller in self.routes:
+            if scope["path"].startswith(prefix):
+                return controller
+        return None
+
+    async def __call__(self, scope, receive, send):
+        controller = self._controller_for(scope)
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        session_key = None
+        if controller.max_per_session > 0:
+            receive, session_key = await self._read_session_id(receive)
+
+        try:
+            await controller.acquire(session_key)
+        except AdmissionRejected as e:
+            await self._reject(send, e)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(session_key, time.monotonic() - started)
+
+    async def _read_session_id(self, receive):
+        """Buffer a small JSON body and return a replaying receive plus its session_id."""
+        messages = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False) or size > MAX_INSPECTED_BODY_BYTES:
+                break
+
+        session_key = None
+        if size <= MAX_INSPECTED_BODY_BYTES and messages[-1]["type"] == "http.request" \
+                and not messages[-1].get("more_body", False):
+            try:
+                payload = json.loads(b"".join(message.get("body", b"") for message in messages))
+                if isinstance(payload, dict) and isinstance(payload.get("session_id"), str):
+                    session_key = payload["session_id"]
+            except ValueError:
+                pass
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return replay, session_key
+
+    async def _reject(self, send, rejection: AdmissionRejected):
+        """Send a 429/503 response in FastAPI's error format."""
+        body = json.dumps({"detail": rejection.detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(rejection.retry_after).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Global admission controllers (one per worker process)
+chat_admission = AdmissionController(
+    "chat",
+    max_concurrent=settings.CHAT_MAX_CONCURRENCY,
+    max_queue=settings.CHAT_MAX_QUEUE,
+    queue_timeout=settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+    max_per_session=settings.CHAT_MAX_PER_SESSION
+)
+upload_admission = AdmissionController(
+    "upload",
+    max_concurrent=settings.UPLOAD_MAX_CONCURRENCY,
+    max_queue=settings.UPLOAD_MAX_QUEUE,
+    queue_timeout=settings.UPLOAD_QUEUE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,136 @@
+"""
+Response compression with content negotiation.
+Compresses large responses with brotli or gzip, whichever the client prefers and the server supports.
+"""
+from typing import Dict, List, Optional
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header.
+
+    Args:
+        header: Header value, e.g. "br;q=1.0, gzip;q=0.8, *;q=0.1"
+
+    Returns:
+        Mapping of lower-case coding to quality value
+    """
+    codings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[name] = quality
+    return codings
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses complete responses above a size threshold.
+
+    Brotli is preferred when the brotli package is installed and the client
+    accepts it; gzip is the fallback. Responses that are streamed in several
+    body messages, already encoded, or smaller than minimum_size are sent
+    unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+        """
+        Args:
+            app: Wrapped ASGI application
+            minimum_size: Smallest body in bytes that is compressed
+            gzip_level: gzip compression level (1-9)
+            brotli_quality: brotli quality (0-11); low values are much faster
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        for name, value in scope.get("headers") or []:
+            if name == b"accept-encoding":
+                codings = parse_accept_encoding(value.decode("latin-1"))
+                break
+        else:
+            return None
+
+        def accepted(coding: str) -> float:
+            return codings.get(coding, codings.get("*", 0.0))
+
+        candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+        best = max(candidates, key=accepted)
+        return best if accepted(best) > 0 else None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers: List = message.get("headers") or []
+                if any(name.lower() == b"content-encoding" for name, _ in headers):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streamed or small responses go out as they are
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding)
+            headers = [
+                (name, value) for name, value in start_message.get("headers") or []
+                if name.lower() not in (b"content-length", b"vary")
+            ]
+            vary = [value for name, value in start_message.get("headers") or [] if name.lower() == b"vary"]
+            headers.append((b"content-encoding", encoding.encode("ascii")))
+            headers.append((b"content-length", str(len(compressed)).encode("ascii")))
+            headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,287 @@
+"""
+Idempotency keys for non-idempotent endpoints.
+Retries carrying the same Idempotency-Key join the request in flight or get its stored response replayed.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+from app.config.settings import settings
+
+# Longest accepted Idempotency-Key header value
+MAX_KEY_LENGTH = 255
+
+# Responses that are not stored, so a retry runs the request again
+NOT_REPLAYED_STATUSES = {408, 409, 425, 429}
+
+
+class IdempotencyEntry:
+    """One request key: in flight until done is set, then holds the response."""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.response: Optional[Tuple[int, List[Tuple[bytes, bytes]], bytes]] = None
+        self.expires_at: Optional[float] = None
+
+
+class IdempotencyStore:
+    """
+    Short-lived store of requests by idempotency key.
+
+    An entry is created when the first request with a key starts (the
+    leader). Requests with the same key that arrive while it runs wait for
+    it (single-flight); once it finished, its response is replayed for
+    ttl_seconds. Entries of failed requests are dropped right away so a
+    later retry runs again.
+
+    The store lives on the event loop of one worker process and is not
+    thread-safe. Retries that reach another worker are not deduplicated.
+    """
+
+    def __init__(self, ttl_seconds: float, max_keys: int):
+        """
+        Args:
+            ttl_seconds: How long a completed response is replayed
+            max_keys: Maximum completed responses kept; the oldest are evicted
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._in_flight: Dict[str, IdempotencyEntry] = {}
+        # Completed entries in completion order, so the oldest expire first
+        self._completed: "OrderedDict[str, IdempotencyEntry]" = OrderedDict()
+        self.replayed = 0
+        self.joined = 0
+        self.mismatched = 0
+
+    def _expire(self):
+        """Drop expired completed entries and the oldest ones beyond max_keys."""
+        now = time.monotonic()
+        while self._completed:
+            key, entry = next(iter(self._completed.items()))
+            if entry.expires_at > now and len(self._completed) <= self.max_keys:
+                break
+            del self._completed[key]
+
+    def get(self, key: str) -> Optional[IdempotencyEntry]:
+        """
+        Look up a key.
+
+        Args:
+            key: Store key
+
+        Returns:
+            In-flight or completed entry, or None
+        """
+        entry = self._in_flight.get(key)
+        if entry is not None:
+            return entry
+        self._expire()
+        return self._completed.get(key)
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyEntry:
+        """
+        Register the leader request for a key.
+
+        Args:
+            key: Store key
+            fingerprint: Hash of the request body
+
+        Returns:
+            New in-flight entry
+        """
+        entry = IdempotencyEntry(fingerprint)
+        self._in_flight[key] = entry
+        return entry
+
+    def complete(self, key: str, entry: IdempotencyEntry, response: Optional[Tuple]):
+        """
+        Finish the leader request and wake up requests waiting for it.
+
+        Args:
+            key: Store key
+            entry: Entry returned by begin()
+            response: (status, headers, body) to replay, or None to forget the key
+        """
+        entry.response = response
+        entry.done.set()
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+        if response is not None:
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+            self._completed.pop(key, None)
+            self._completed[key] = entry
+            self._expire()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get store counters.
+
+        Returns:
+            Dictionary with in-flight and stored keys, replayed and joined
+            requests, and key reuses with a different body
+        """
+        return {
+            "in_flight": len(self._in_flight),
+            "stored": len(self._completed),
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "mismatched": self.mismatched,
+        }
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that deduplicates requests carrying an Idempotency-Key header.
+
+    Requests without the header pass through unchanged. The key is scoped to
+    the request path, and the request body is fingerprinted: reusing a key
+    with a different body is rejected with 422. Replayed responses carry an
+    Idempotent-Replayed: true header. Server errors and 408/409/425/429
+    responses are not stored, so the client can retry them.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore,
+        paths: Iterable[str],
+        wait_timeout: float,
+        methods: Iterable[str] = ("POST",)
+    ):
+        """
+        Args:
+            app: Wrapped ASGI application
+            store: Store shared by the paths
+            paths: Exact paths the middleware applies to
+            wait_timeout: Seconds a duplicate waits for the request in flight
+            methods: HTTP methods the middleware applies to
+        """
+        self.app = app
+        self.store = store
+        self.paths = set(paths)
+        self.wait_timeout = wait_timeout
+        self.methods = set(methods)
+
+    @staticmethod
+    async def _send_json(send, status_code: int, detail: str, headers: List[Tuple[bytes, bytes]] = ()):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _replay(send, response: Tuple[int, List[Tuple[bytes, bytes]], bytes]):
+        status, headers, body = response
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [*headers, (b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or scope["path"].rstrip("/") not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope.get("headers") or []:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1").strip()
+                break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await self._send_json(send, 400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+            return
+
+        # Read the whole body to fingerprint it; the app gets it replayed
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store_key = f"{scope['path'].rstrip('/')}\0{key}"
+
+        # Join or replay an earlier request with this key; if it failed and
+        # was forgotten, another duplicate may already have taken over
+        while True:
+            entry = self.store.get(store_key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                self.store.mismatched += 1
+                await self._send_json(send, 422, "Idempotency-Key was already used with a different request body")
+                return
+            if not entry.done.is_set():
+                self.store.joined += 1
+                try:
+                    await asyncio.wait_for(entry.done.wait(), timeout=self.wait_timeout)
+                except asyncio.TimeoutError:
+                    await self._send_json(
+                        send, 409, "A request with this Idempotency-Key is still in progress",
+                        [(b"retry-after", str(max(1, int(self.wait_timeout))).encode("ascii"))]
+                    )
+                    return
+            if entry.response is not None:
+                self.store.replayed += 1
+                await self._replay(send, entry.response)
+                return
+
+        entry = self.store.begin(store_key, fingerprint)
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = None
+        headers: List[Tuple[bytes, bytes]] = []
+        response_chunks = []
+
+        async def recording_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, replay_receive, recording_send)
+            if status is not None and status < 500 and status not in NOT_REPLAYED_STATUSES:
+                response = (status, headers, b"".join(response_chunks))
+        finally:
+            self.store.complete(store_key, entry, response)
+
+
+# Global idempotency store for chat requests
+chat_idempotency = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_keys=settings.IDEMPOTENCY_MAX_KEYS
+)
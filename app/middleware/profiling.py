@@ -0,0 +1,76 @@
+"""
+Opt-in request profiling and SQL query counting.
+Profiles requests on demand or by sampling, and warns about requests that run many SQL queries.
+"""
+import hmac
+import logging
+import random
+from app.services.profiling import RequestProfile, profile_store, start_query_stats
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that counts the SQL queries of every request and profiles some.
+
+    A request is profiled when it carries "X-Profile: 1" together with a
+    valid "X-Debug-Token", or when it is picked by sample_rate. Profiled
+    responses carry an "X-Profile-Id" header; the profile can then be
+    fetched from the debug endpoints. Any request running more than
+    query_warn_threshold SQL statements is logged as a warning.
+    """
+
+    def __init__(self, app, debug_token: str = "", sample_rate: float = 0.0, query_warn_threshold: int = 0):
+        """
+        Args:
+            app: Wrapped ASGI application
+            debug_token: Token required to request a profile by header ("" disables it)
+            sample_rate: Fraction of requests profiled automatically
+            query_warn_threshold: Warn above this many queries per request (0 disables)
+        """
+        self.app = app
+        self.debug_token = debug_token.encode("utf-8")
+        self.sample_rate = sample_rate
+        self.query_warn_threshold = query_warn_threshold
+
+    def _profile_reason(self, scope):
+        headers = dict(scope.get("headers") or [])
+        if self.debug_token and headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+            if hmac.compare_digest(headers.get(b"x-debug-token", b""), self.debug_token):
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._profile_reason(scope)
+        profile = RequestProfile(scope["method"], scope["path"], reason) if reason else None
+        queries = profile.queries if profile is not None else start_query_stats()
+        status_code = None
+
+        async def profiled_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile is not None:
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"x-profile-id", profile.id.encode("ascii")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            if profile is not None:
+                profile.finish(status_code)
+                profile_store.add(profile)
+            if 0 < self.query_warn_threshold < queries.count:
+                logger.warning(
+                    f"{scope['method']} {scope['path']} ran {queries.count} SQL queries "
+                    f"({queries.seconds * 1000:.1f} ms); check for lazy-loading N+1 patterns"
+                )
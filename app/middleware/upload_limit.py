@@ -0,0 +1,77 @@
+"""
+Request body size limit for upload endpoints.
+Rejects oversized uploads before the multipart body is parsed and spooled.
+"""
+from typing import Iterable
+import json
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that caps the request body size on upload paths.
+
+    Requests announcing a larger Content-Length are rejected with 413 before
+    any of the body is read. Chunked requests are counted while they stream;
+    once they pass the limit the 413 is sent, the application sees a client
+    disconnect, and whatever it tries to send afterwards is dropped.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        """
+        Args:
+            app: Wrapped ASGI application
+            max_bytes: Maximum request body size in bytes
+            paths: Path prefixes the limit applies to
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    await self._reject(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def _reject(self, send):
+        """Send a 413 response in FastAPI's error format."""
+        body = json.dumps({
+            "detail": f"File too large. Maximum upload size is {self.max_bytes} bytes."
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -2,11 +2,12 @@
 Database models for the AI Chatbot application.
 Defines the schema for sessions, messages, and documents.
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Index
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Index, Boolean
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, false
 from pgvector.sqlalchemy import Vector
 from app.config.database import Base
+from app.config.settings import settings
 
 
 class Session(Base):
@@ -19,11 +20,16 @@ class Session(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(255), unique=True, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    # Set while a large session is being purged in the background
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
     
-    # Relationships
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
-    documents = relationship("Document", back_populates="session", cascade="all, delete-orphan")
+    # Relationships (rows are removed by ON DELETE CASCADE in the database,
+    # so the ORM never loads children just to delete them)
+    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    documents = relationship("Document", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    # Shared library documents attached to this session
+    attached_documents = relationship("SessionDocument", back_populates="session", passive_deletes=True)
 
 
 class Message(Base):
@@ -34,7 +40,7 @@ class Message(Base):
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True)
     role = Column(String(50), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -47,36 +53,83 @@ class Document(Base):
     """
     Document model to store uploaded files.
     Stores file metadata and references to chunked embeddings.
+    
+    Documents with a session_id belong to that session. Library documents
+    have no session_id; they are ingested once and attached to any number
+    of sessions through session_documents.
+    
+    The full text is either kept inline in `content` or, with
+    DOCUMENT_CONTENT_STORAGE=blob, compressed in the blob store under
+    `content_hash`. `content` is deferred so listing documents never loads it;
+    use get_document_text() from the blob store service to read it.
     """
     __tablename__ = "documents"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=True, index=True)
     filename = Column(String(255), nullable=False)
     file_type = Column(String(50), nullable=False)
-    content = Column(Text)  # Full text content of the document
+    content = deferred(Column(Text))  # Full text content of the document (inline storage)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the full text (blob storage)
+    # Pinned documents are included in full in every prompt of their session
+    pinned = Column(Boolean, nullable=False, server_default=false())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship
     session = relationship("Session", back_populates="documents")
-    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    attachments = relationship("SessionDocument", back_populates="document", passive_deletes=True)
+
+
+class SessionDocument(Base):
+    """
+    Attachment of a library document to a session.
+    Deleting either side removes the link only (ON DELETE CASCADE on both keys).
+    """
+    __tablename__ = "session_documents"
+    
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True, index=True)
+    # Pinned in this session's prompts (see Document.pinned)
+    pinned = Column(Boolean, nullable=False, server_default=false())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    session = relationship("Session", back_populates="attached_documents")
+    document = relationship("Document", back_populates="attachments")
 
 
 class DocumentChunk(Base):
     """
     DocumentChunk model to store document chunks with embeddings.
     Uses pgvector for storing and querying vector embeddings.
-    Note: Embedding dimension (384) matches all-MiniLM-L6-v2 model.
-    If changing the embedding model, update this dimension accordingly.
+    Note: Embedding dimension (EMBEDDING_DIMENSION, 384) matches all-MiniLM-L6-v2 model.
+    To change the embedding model on an existing database, re-embed the
+    chunks with `python reembed.py` and then update both settings.
+    
+    session_id repeats the document's session (NULL for library documents)
+    so retrieval can filter chunks without a join. With
+    DOCUMENT_CHUNKS_PARTITIONS set, init_db.py creates the table
+    hash-partitioned by it (see partition_service).
     """
     __tablename__ = "document_chunks"
     
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=True, index=True)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
+    # SHA-256 of chunk_text, used to re-index re-uploaded documents incrementally
+    chunk_hash = Column(String(64))
+    # Token count of chunk_text, used to pack retrieved context to a token budget
+    token_count = Column(Integer)
     # Vector embedding (dimension=384 for all-MiniLM-L6-v2 model)
-    embedding = Column(Vector(384))
+    embedding = Column(Vector(settings.EMBEDDING_DIMENSION))
     
     # Relationship
     document = relationship("Document", back_populates="chunks")
+    
+    # Neighbouring chunks of a hit are looked up by position (CHUNK_NEIGHBOR_WINDOW)
+    __table_args__ = (
+        Index("ix_document_chunks_document_id_chunk_index", "document_id", "chunk_index"),
+    )
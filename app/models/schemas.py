@@ -35,14 +35,29 @@ class SessionResponse(BaseModel):
 
 
 class DocumentUploadResponse(BaseModel):
-    """Schema for document upload response."""
-    session_id: str
+    """Schema for document upload response (session_id is None for library uploads)."""
+    session_id: Optional[str] = None
+    document_id: Optional[int] = None
     filename: str
     file_type: str
     chunks_created: int
+    chunks_reused: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
     message: str
 
 
+class AttachDocumentRequest(BaseModel):
+    """Schema for attaching a library document to a session."""
+    session_id: str = Field(..., description="Session to attach the document to")
+
+
+class PinDocumentRequest(BaseModel):
+    """Schema for pinning a document in a session's prompts."""
+    session_id: str = Field(..., description="Session the document belongs to or is attached to")
+    pinned: bool = Field(True, description="Pin (true) or unpin (false) the document")
+
+
 class MessageHistory(BaseModel):
     """Schema for message in conversation history."""
     role: str
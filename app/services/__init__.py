@@ -1,7 +1,8 @@
-"""Services package initialization."""
-from app.services.llm_service import llm_service
-from app.services.embedding_service import embedding_service
-from app.services.document_service import document_processor
-from app.services.rag_service import rag_service
+"""
+Services package initialization.
 
-__all__ = ["llm_service", "embedding_service", "document_processor", "rag_service"]
+Nothing is imported here: importing embedding_service loads the embedding
+model, and worker processes that only need one module of this package
+(encode pool, bulk extraction, re-embedding) must not pay for that. Import
+the services from their modules, e.g. app.services.rag_service.
+"""
@@ -0,0 +1,248 @@
+"""
+Content-addressed blob store for full document text.
+Keeps extracted text compressed on local disk instead of in the documents table.
+"""
+from typing import Iterator, Optional, Tuple
+import hashlib
+import os
+import tempfile
+import time
+import zlib
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+
+class BlobStore:
+    """
+    Stores UTF-8 text under its SHA-256 digest.
+
+    Identical texts are stored once. Blobs are compressed with zstd when the
+    zstandard package is installed and with zlib otherwise; the file suffix
+    records the codec, so a store written with either can always be read.
+
+    Layout: <root>/<digest[:2]>/<digest[2:4]>/<digest>.zst (or .zz)
+
+    Blobs are not deleted when documents go away, since another document may
+    share the text; delete_unreferenced_blobs() sweeps the ones left over.
+    """
+
+    def __init__(self, root: str, level: int = 3):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory that holds the blobs
+            level: Compression level
+        """
+        self.root = root
+        self.level = level
+
+    def _path(self, digest: str, suffix: str) -> str:
+        """Filesystem path of a blob."""
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + suffix)
+
+    def put_text(self, text: str) -> str:
+        """
+        Store text and return its digest.
+
+        Args:
+            text: Text to store
+
+        Returns:
+            Hex SHA-256 digest of the UTF-8 encoded text
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        for suffix in (".zst", ".zz"):
+            try:
+                # Reused blob: refresh its age so garbage collection keeps it
+                # until the new document referencing it is committed
+                os.utime(self._path(digest, suffix))
+                return digest
+            except FileNotFoundError:
+                pass
+
+        if zstandard is not None:
+            suffix = ".zst"
+            payload = zstandard.ZstdCompressor(level=self.level).compress(data)
+        else:
+            suffix = ".zz"
+            payload = zlib.compress(data, min(self.level, 9))
+
+        path = self._path(digest, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    def exists(self, digest: str) -> bool:
+        """
+        Check whether a blob is stored.
+
+        Args:
+            digest: Hex SHA-256 digest
+
+        Returns:
+            True if the blob exists in either codec
+        """
+        return any(os.path.exists(self._path(digest, suffix)) for suffix in (".zst", ".zz"))
+
+    def get_text(self, digest: str) -> str:
+        """
+        Load text by digest.
+
+        Args:
+            digest: Hex SHA-256 digest
+
+        Returns:
+            The stored text
+
+        Raises:
+            FileNotFoundError: If no blob with this digest exists
+            RuntimeError: If the blob is zstd-compressed but zstandard is missing
+        """
+        path = self._path(digest, ".zst")
+        if os.path.exists(path):
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read .zst blobs")
+            with open(path, "rb") as blob:
+                return zstandard.ZstdDecompressor().decompress(blob.read()).decode("utf-8")
+
+        with open(self._path(digest, ".zz"), "rb") as blob:
+            return zlib.decompress(blob.read()).decode("utf-8")
+
+    def iter_blobs(self) -> Iterator[Tuple[str, str]]:
+        """
+        List every stored blob.
+
+        Yields:
+            (digest, path) pairs, in no particular order
+        """
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                digest, suffix = os.path.splitext(name)
+                if suffix in (".zst", ".zz"):
+                    yield digest, os.path.join(directory, name)
+
+
+def get_document_text(document) -> Optional[str]:
+    """
+    Get the full text of a document wherever it is stored.
+
+    Args:
+        document: Document model instance
+
+    Returns:
+        Full text, or None if the document has none
+    """
+    if document.content_hash:
+        return blob_store.get_text(document.content_hash)
+    return document.content
+
+
+def move_inline_content_to_blobs(db: Session, batch_size: int = 100) -> int:
+    """
+    Move full text still stored in documents.content into the blob store.
+
+    Works in batches and commits after each one, so it can be interrupted
+    and re-run safely.
+
+    Args:
+        db: Database session
+        batch_size: Documents per batch
+
+    Returns:
+        Number of documents moved
+    """
+    from app.models.models import Document
+
+    moved = 0
+    while True:
+        documents = db.query(Document).filter(
+            Document.content.isnot(None),
+            Document.content_hash.is_(None)
+        ).order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            return moved
+
+        for document in documents:
+            document.content_hash = blob_store.put_text(document.content)
+            document.content = None
+        db.commit()
+        moved += len(documents)
+
+
+def delete_unreferenced_blobs(db: Session, min_age_seconds: float = 3600, batch_size: int = 500) -> int:
+    """
+    Delete blobs that no document references any more.
+
+    Session purge, expiry, library deletes and re-indexing drop or replace
+    documents.content_hash but leave the blob behind. Blobs are checked in
+    batches against the index on documents.content_hash. Blobs written or
+    reused within min_age_seconds are kept, because put_text() runs before
+    the document that references the blob is committed.
+
+    Args:
+        db: Database session
+        min_age_seconds: Grace period for recently written or reused blobs
+        batch_size: Digests looked up per query
+
+    Returns:
+        Number of blobs deleted
+    """
+    from app.models.models import Document
+
+    cutoff = time.time() - min_age_seconds
+    deleted = 0
+
+    def sweep(batch):
+        nonlocal deleted
+        referenced = {
+            digest for (digest,) in db.query(Document.content_hash).filter(
+                Document.content_hash.in_([digest for digest, _ in batch])
+            ).distinct()
+        }
+        for digest, path in batch:
+            if digest in referenced:
+                continue
+            try:
+                # Skip a blob that an upload reused since it was listed
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+                os.unlink(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+
+    batch = []
+    for digest, path in blob_store.iter_blobs():
+        try:
+            if os.stat(path).st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        batch.append((digest, path))
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+    db.rollback()
+    return deleted
+
+
+# Global blob store instance
+blob_store = BlobStore(settings.DOCUMENT_BLOB_DIR, level=settings.DOCUMENT_BLOB_COMPRESSION_LEVEL)
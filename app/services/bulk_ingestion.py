@@ -0,0 +1,336 @@
+"""
+Bulk document ingestion pipeline.
+Extracts files in worker processes, embeds chunks in large batches and writes documents in bulk.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zipfile
+from app.config.database import SessionLocal
+from app.services.document_service import document_processor
+from app.services.token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {".pdf": "pdf", ".txt": "txt"}
+
+
+class Source(NamedTuple):
+    """One input file, either on disk or inside a ZIP archive."""
+    name: str
+    path: str
+    member: Optional[str] = None
+
+
+class ExtractedDocument(NamedTuple):
+    """Result of extracting, chunking and token-counting one source in a worker process."""
+    source: Source
+    file_type: str
+    text_content: str
+    chunks: List[str]
+    token_counts: List[int]
+    busy_seconds: float
+    error: Optional[str] = None
+
+
+def file_type_of(name: str) -> Optional[str]:
+    """
+    Map a filename to a supported document type.
+
+    Args:
+        name: Filename or archive member name
+
+    Returns:
+        "pdf" or "txt", or None if the file is not supported
+    """
+    return SUPPORTED_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def find_sources(path: str) -> Iterator[Source]:
+    """
+    List the files of a directory (recursively) or ZIP archive.
+
+    Args:
+        path: Directory or .zip file
+
+    Yields:
+        Sources named by their path relative to the directory or archive root
+    """
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield Source(info.filename, path, info.filename)
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            full_path = os.path.join(root, filename)
+            yield Source(os.path.relpath(full_path, path).replace(os.sep, "/"), full_path)
+
+
+# --- Extraction worker processes ---------------------------------------------
+
+_archives: Dict[str, zipfile.ZipFile] = {}
+
+
+def _extract(source: Source) -> ExtractedDocument:
+    """Extract, chunk and count tokens of one source; runs in a worker process."""
+    started = time.perf_counter()
+    file_type = file_type_of(source.name)
+    try:
+        if source.member is None:
+            with open(source.path, "rb") as file:
+                if file_type == "pdf":
+                    text_content = document_processor.process_pdf_file(file)
+                else:
+                    text_content = document_processor.process_text_file(file)
+        else:
+            if source.path not in _archives:
+                _archives[source.path] = zipfile.ZipFile(source.path)
+            with _archives[source.path].open(source.member) as file:
+                if file_type == "pdf":
+                    # Archive members cannot be memory-mapped
+                    text_content = document_processor.process_pdf(file.read())
+                else:
+                    text_content = document_processor.process_text_file(file)
+
+        chunks = document_processor.chunk_document(text_content)
+        token_counts = [count_tokens(chunk) for chunk in chunks]
+        return ExtractedDocument(source, file_type, text_content, chunks, token_counts, time.perf_counter() - started)
+    except Exception as e:
+        return ExtractedDocument(source, file_type, "", [], [], time.perf_counter() - started, error=str(e))
+
+
+class BulkIngestionPipeline:
+    """
+    Three-stage pipeline for loading many documents into one session.
+
+    Stages run concurrently and are connected by bounded queues, so a slow
+    stage applies backpressure instead of letting work pile up in memory:
+
+    1. extract: a process pool extracts text, chunks it and counts chunk tokens
+    2. embed: chunks of several documents are embedded in one large batch
+    3. write: each embedded batch of documents is stored in one transaction
+
+    Busy time is recorded per stage to report utilization.
+    """
+
+    STAGES = ("extract", "embed", "write")
+
+    def __init__(
+        self,
+        session_id: Optional[int],
+        extract_workers: int = 4,
+        embed_batch_size: int = 512,
+        queue_size: int = 8
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            session_id: Database id of the target session, or None to add
+                the documents to the shared library
+            extract_workers: Number of extraction processes
+            embed_batch_size: Minimum chunks per encode call (a batch is
+                flushed once it reaches this size)
+            queue_size: Capacity of each queue between stages
+        """
+        self.session_id = session_id
+        self.extract_workers = extract_workers
+        self.embed_batch_size = embed_batch_size
+        self.extracted = queue.Queue(maxsize=queue_size)
+        self.embedded = queue.Queue(maxsize=queue_size)
+
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._busy = {stage: 0.0 for stage in self.STAGES}
+        self._started = 0.0
+        self.files = 0
+        self.chunks = 0
+        self.failed: List[str] = []
+
+    def _put(self, target: queue.Queue, item):
+        """Put an item, giving up if another stage failed."""
+        while not self._abort.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue):
+        """Get an item, or None (end of stream) if another stage failed."""
+        while not self._abort.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _add_busy(self, stage: str, seconds: float):
+        with self._lock:
+            self._busy[stage] += seconds
+
+    def _run_stage(self, stage: Callable, *args):
+        """Run a stage and stop the whole pipeline if it fails."""
+        try:
+            stage(*args)
+        except BaseException as e:
+            logger.error(f"Bulk ingestion stage {stage.__name__} failed: {str(e)}", exc_info=True)
+            self._error = e
+            self._abort.set()
+
+    def _extract_stage(self, sources: Iterable[Source]):
+        """Fan sources out to the process pool, keeping a bounded number in flight."""
+        in_flight = self.extract_workers * 2
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.extract_workers, mp_context=context) as pool:
+            pending = deque()
+            for source in sources:
+                if self._abort.is_set():
+                    break
+                pending.append(pool.submit(_extract, source))
+                if len(pending) >= in_flight:
+                    self._collect(pending.popleft().result())
+            while pending and not self._abort.is_set():
+                self._collect(pending.popleft().result())
+            for future in pending:
+                future.cancel()
+        self._put(self.extracted, None)
+
+    def _collect(self, document: ExtractedDocument):
+        self._add_busy("extract", document.busy_seconds)
+        if document.error is not None:
+            logger.warning(f"Skipping {document.source.name}: {document.error}")
+            with self._lock:
+                self.failed.append(document.source.name)
+            return
+        self._put(self.extracted, document)
+
+    def _embed_stage(self, embedding_service, prepared_document):
+        """Group extracted documents into large batches and embed them together."""
+        batch: List[ExtractedDocument] = []
+        batch_chunks = 0
+
+        def flush():
+            started = time.perf_counter()
+            embeddings = embedding_service.encode([chunk for document in batch for chunk in document.chunks])
+            prepared = []
+            offset = 0
+            for document in batch:
+                end = offset + len(document.chunks)
+                prepared.append(prepared_document(
+                    filename=document.source.name,
+                    file_type=document.file_type,
+                    text_content=document.text_content,
+                    chunks=document.chunks,
+                    token_counts=document.token_counts,
+                    embeddings=embeddings[offset:end]
+                ))
+                offset = end
+            self._add_busy("embed", time.perf_counter() - started)
+            self._put(self.embedded, prepared)
+
+        while True:
+            document = self._get(self.extracted)
+            if document is None:
+                break
+            batch.append(document)
+            batch_chunks += len(document.chunks)
+            if batch_chunks >= self.embed_batch_size:
+                flush()
+                batch, batch_chunks = [], 0
+
+        if batch and not self._abort.is_set():
+            flush()
+        self._put(self.embedded, None)
+
+    def _write_stage(self, ingestion_service):
+        """Store each embedded batch of documents in one transaction."""
+        db = SessionLocal()
+        try:
+            while True:
+                documents = self._get(self.embedded)
+                if documents is None:
+                    break
+                started = time.perf_counter()
+                ingestion_service.store_documents(db, self.session_id, documents)
+                self._add_busy("write", time.perf_counter() - started)
+                with self._lock:
+                    self.files += len(documents)
+                    self.chunks += sum(len(document.chunks) for document in documents)
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """
+        Get throughput and per-stage utilization so far.
+
+        Returns:
+            Dictionary with counts, rates and utilization (0-1) per stage
+        """
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        with self._lock:
+            return {
+                "files": self.files,
+                "chunks": self.chunks,
+                "failed": len(self.failed),
+                "elapsed_seconds": elapsed,
+                "files_per_sec": self.files / elapsed,
+                "chunks_per_sec": self.chunks / elapsed,
+                "utilization": {
+                    "extract": self._busy["extract"] / (elapsed * self.extract_workers),
+                    "embed": self._busy["embed"] / elapsed,
+                    "write": self._busy["write"] / elapsed,
+                },
+            }
+
+    def run(
+        self,
+        sources: Iterable[Source],
+        progress: Optional[Callable[[Dict], None]] = None,
+        progress_interval: float = 1.0
+    ) -> Dict:
+        """
+        Ingest all sources and wait for the pipeline to drain.
+
+        Args:
+            sources: Files to ingest (only supported types should be passed)
+            progress: Called with stats() every progress_interval seconds
+            progress_interval: Seconds between progress callbacks
+
+        Returns:
+            Final stats()
+
+        Raises:
+            Exception: The first error raised by the embed or write stage
+        """
+        from app.services.embedding_service import embedding_service
+        from app.services.ingestion_service import PreparedDocument, ingestion_service
+
+        self._started = time.monotonic()
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._extract_stage, sources), name="ingest-extract"),
+            threading.Thread(target=self._run_stage, args=(self._embed_stage, embedding_service, PreparedDocument), name="ingest-embed"),
+            threading.Thread(target=self._run_stage, args=(self._write_stage, ingestion_service), name="ingest-write"),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=progress_interval)
+                if progress is not None:
+                    progress(self.stats())
+
+        if self._error is not None:
+            raise self._error
+        return self.stats()
@@ -0,0 +1,66 @@
+"""
+Neighbour-window expansion of retrieved chunks.
+With CHUNK_NEIGHBOR_WINDOW, each hit is extended with the chunks around it at query time instead of storing overlap.
+"""
+from typing import Dict, List, Tuple
+from app.services.token_budget import RetrievedChunk
+
+# Position of a stored chunk: (document_id, chunk_index)
+ChunkPosition = Tuple[int, int]
+
+# A similarity search hit: (document_id, chunk_index, distance)
+Hit = Tuple[int, int, float]
+
+
+def window_positions(hit: Hit, window: int) -> List[ChunkPosition]:
+    """
+    Positions covered by a hit and its neighbours.
+
+    Args:
+        hit: Similarity search hit
+        window: Neighbouring chunks on each side
+
+    Returns:
+        Positions from chunk_index - window to chunk_index + window
+    """
+    document_id, chunk_index, _ = hit
+    return [(document_id, index) for index in range(chunk_index - window, chunk_index + window + 1)]
+
+
+def expand_hits(hits: List[Hit], chunks: Dict[ChunkPosition, Tuple[str, int]], window: int) -> List[RetrievedChunk]:
+    """
+    Replace each hit by the passage made of its chunk and its neighbours.
+
+    Hits are taken closest first, and chunks already in the passage of a
+    closer hit are left out of later ones, so no text reaches the prompt
+    twice. All windows have the same width, so what remains of a window is
+    still contiguous, and a passage never exceeds 2 * window + 1 chunks; a
+    hit whose window is fully covered is dropped. Chunks are stored without
+    overlap in this mode, so a passage is their text joined as is.
+
+    Args:
+        hits: Hits ordered by distance, closest first
+        chunks: (text, token count) of the stored chunks around the hits;
+            positions before the first or after the last chunk are missing
+        window: Neighbouring chunks on each side
+
+    Returns:
+        One RetrievedChunk per remaining passage, closest first, with the
+        distance of its hit
+    """
+    used = set()
+    expanded = []
+    for hit in hits:
+        positions = [
+            position for position in window_positions(hit, window)
+            if position in chunks and position not in used
+        ]
+        if not positions:
+            continue
+        used.update(positions)
+        expanded.append(RetrievedChunk(
+            "".join(chunks[position][0] for position in positions),
+            hit[2],
+            sum(chunks[position][1] for position in positions)
+        ))
+    return expanded
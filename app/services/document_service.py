@@ -3,8 +3,11 @@ Document processing service for handling file uploads.
 Supports PDF and text file formats.
 """
 from pypdf import PdfReader
-from typing import List
+from typing import BinaryIO, List
+import codecs
 import io
+import mmap
+from app.config.settings import settings
 
 
 class DocumentProcessor:
@@ -25,6 +28,8 @@ class DocumentProcessor:
     Chunk configuration (via environment variables):
     - CHUNK_SIZE: Maximum characters per chunk (default: 1000)
     - CHUNK_OVERLAP: Character overlap between consecutive chunks (default: 200)
+    - CHUNK_NEIGHBOR_WINDOW: When set, chunks are stored without overlap and
+      retrieval adds the neighbouring chunks instead (default: 0)
     
     The overlap helps maintain context continuity across chunk boundaries.
     """
@@ -60,6 +65,76 @@ class DocumentProcessor:
         """
         return file_content.decode('utf-8')
     
+    def process_pdf_file(self, file: BinaryIO) -> str:
+        """
+        Extract text from a PDF file on disk without reading it into memory.
+        
+        The file is memory-mapped, so pages are paged in by the OS as the
+        parser touches them instead of being copied into Python bytes.
+        
+        Args:
+            file: Binary file object backed by a real file descriptor
+            
+        Returns:
+            Extracted text from the PDF
+            
+        Raises:
+            ValueError: If the file is empty
+        """
+        file.flush()
+        if file.seek(0, io.SEEK_END) == 0:
+            raise ValueError("Cannot parse an empty PDF file")
+        
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            pdf_reader = PdfReader(mapped)
+            pages = [page.extract_text() for page in pdf_reader.pages]
+            # Drop the parser's references into the mapping before it closes
+            del pdf_reader
+        
+        return "\n".join(pages).strip()
+    
+    def process_text_file(self, file: BinaryIO, block_size: int = 1024 * 1024) -> str:
+        """
+        Decode a UTF-8 text file incrementally.
+        
+        Reads fixed-size blocks so the raw bytes are never held in memory
+        all at once; multi-byte characters split across blocks are handled
+        by the incremental decoder.
+        
+        Args:
+            file: Binary file object positioned at the start
+            block_size: Bytes to read per block
+            
+        Returns:
+            Decoded text content
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        parts = []
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            parts.append(decoder.decode(block))
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts)
+    
+    def chunk_document(self, text: str) -> List[str]:
+        """
+        Split a document's text into chunks for storage with the configured sizes.
+        
+        With CHUNK_NEIGHBOR_WINDOW set, consecutive chunks do not overlap:
+        retrieval joins each hit with its neighbours, which restores the
+        context at chunk boundaries without storing and embedding it twice.
+        
+        Args:
+            text: Extracted document text
+            
+        Returns:
+            List of text chunks
+        """
+        chunk_overlap = 0 if settings.CHUNK_NEIGHBOR_WINDOW > 0 else settings.CHUNK_OVERLAP
+        return self.chunk_text(text, chunk_size=settings.CHUNK_SIZE, chunk_overlap=chunk_overlap)
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
         """
         Split text into overlapping chunks.
@@ -0,0 +1,302 @@
+"""
+Shared embedding server for multi-worker deployments.
+Loads the embedding model once per node and serves all workers over a Unix socket.
+
+Run it next to the API workers with:
+
+    python -m app.services.embedding_server
+
+and start the workers with EMBEDDING_MODE=server.
+"""
+from typing import List, Optional
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+
+def send_frame(sock: socket.socket, payload: bytes):
+    """
+    Send one length-prefixed frame.
+
+    Args:
+        sock: Connected socket
+        payload: Frame body
+    """
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Read exactly size bytes or raise ConnectionError on EOF."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Embedding server connection closed")
+        received += count
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> bytes:
+    """
+    Receive one length-prefixed frame.
+
+    Args:
+        sock: Connected socket
+
+    Returns:
+        Frame body
+    """
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+class _PendingRequest:
+    """Texts from one client call waiting to be encoded in a shared batch."""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+
+class _Batcher:
+    """
+    Collects requests from all connections and encodes them together.
+
+    A batch is closed when it holds EMBEDDING_SERVER_MAX_BATCH texts or when
+    EMBEDDING_SERVER_MAX_WAIT_MS has passed since its first request arrived.
+    """
+
+    def __init__(self, service, max_batch: int, max_wait: float):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        thread.start()
+
+    def submit(self, texts: List[str]) -> _PendingRequest:
+        """Queue texts for the next batch and return the pending request."""
+        request = _PendingRequest(texts)
+        self.requests.put(request)
+        return request
+
+    def _collect(self) -> List[_PendingRequest]:
+        """Block for the first request, then gather more until the batch closes."""
+        batch = [self.requests.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        """Encode batches forever."""
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = self.service.encode(texts)
+                offset = 0
+                for request in batch:
+                    request.embeddings = embeddings[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                logger.error(f"Embedding batch failed: {str(e)}", exc_info=True)
+                for request in batch:
+                    request.error = str(e)
+            self.batches += 1
+            self.texts += len(texts)
+            for request in batch:
+                request.done.set()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves one worker connection until it closes."""
+
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                message = json.loads(recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+
+            if message.get("op") == "info":
+                send_frame(self.request, json.dumps({
+                    "model": settings.EMBEDDING_MODEL,
+                    "dim": batcher.service.get_embedding_dimension(),
+                    "batches": batcher.batches,
+                    "texts": batcher.texts,
+                }).encode("utf-8"))
+                continue
+
+            pending = batcher.submit(message.get("texts", []))
+            pending.done.wait()
+            if pending.error is not None:
+                send_frame(self.request, json.dumps({"error": pending.error}).encode("utf-8"))
+                continue
+
+            rows, dim = pending.embeddings.shape
+            send_frame(self.request, json.dumps({"rows": rows, "dim": dim}).encode("utf-8"))
+            send_frame(self.request, np.ascontiguousarray(pending.embeddings, dtype=np.float32).tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that owns the only copy of the embedding model on a node."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service):
+        """
+        Bind the socket and start the batching thread.
+
+        Args:
+            socket_path: Filesystem path of the Unix socket
+            service: Local-mode EmbeddingService that owns the model
+        """
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.batcher = _Batcher(
+            service,
+            max_batch=settings.EMBEDDING_SERVER_MAX_BATCH,
+            max_wait=settings.EMBEDDING_SERVER_MAX_WAIT_MS / 1000.0
+        )
+        super().__init__(socket_path, _Handler)
+
+
+class EmbeddingClient:
+    """
+    Thin client used by EmbeddingService in server mode.
+
+    Keeps one connection per thread and reconnects once if the server restarted.
+    A call that times out is not retried: the server is busy, and sending the
+    texts again would only add to its load.
+    """
+
+    def __init__(self, socket_path: str, timeout: float):
+        """
+        Initialize the client without connecting.
+
+        Args:
+            socket_path: Filesystem path of the server's Unix socket
+            timeout: Socket timeout in seconds for a single call
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        """Get this thread's connection, opening it if needed."""
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        """Drop this thread's connection."""
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _request(self, message: dict, expect_body: bool):
+        """Send one request, retrying once if the connection was refused, broken or the socket is gone."""
+        payload = json.dumps(message).encode("utf-8")
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_frame(sock, payload)
+                header = json.loads(recv_frame(sock))
+                if "error" in header:
+                    raise RuntimeError(f"Embedding server error: {header['error']}")
+                if not expect_body:
+                    return header, None
+                return header, recv_frame(sock)
+            except (ConnectionError, FileNotFoundError):
+                self._reset()
+                if attempt:
+                    raise
+            except OSError:
+                # A timeout leaves a reply in flight on this connection
+                self._reset()
+                raise
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts on the server.
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        header, body = self._request({"texts": texts}, expect_body=True)
+        return np.frombuffer(body, dtype=np.float32).reshape(header["rows"], header["dim"])
+
+    def info(self) -> dict:
+        """
+        Get the model name, dimension and batching counters of the server.
+
+        Returns:
+            Server info dictionary
+        """
+        header, _ = self._request({"op": "info"}, expect_body=False)
+        return header
+
+
+def main():
+    """Load the model and serve embedding requests until interrupted."""
+    logging.basicConfig(level=logging.INFO)
+    from app.services.embedding_service import EmbeddingService, embedding_service
+
+    # Reuse the global instance if it already loaded the model in this process
+    service = embedding_service if embedding_service.mode == "local" else EmbeddingService(mode="local")
+    server = EmbeddingServer(settings.EMBEDDING_SERVER_SOCKET, service)
+    logger.info(
+        f"Embedding server for {settings.EMBEDDING_MODEL} listening on {settings.EMBEDDING_SERVER_SOCKET}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(settings.EMBEDDING_SERVER_SOCKET):
+            os.unlink(settings.EMBEDDING_SERVER_SOCKET)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,67 +2,126 @@
 Embedding service for generating vector embeddings from text.
 Uses sentence transformers for creating embeddings.
 """
-from sentence_transformers import SentenceTransformer
 from app.config.settings import settings
-from typing import List
+from app.services.encode_pool import create_encode_pool, set_torch_threads
+from typing import List, Optional
 import numpy as np
 
 
 class EmbeddingService:
     """
     Service for generating text embeddings.
-    
+
     Uses Sentence Transformers to convert text into dense vector embeddings.
     These embeddings are used for:
     - Vector similarity search in the document chunks
     - Finding relevant documents for user queries
     - Semantic understanding of text
-    
+
     Default model: all-MiniLM-L6-v2 (384-dimensional embeddings)
     This is a lightweight, efficient model suitable for RAG applications.
-    
+
     To use a different model, set EMBEDDING_MODEL in .env file.
     Ensure the model dimension matches the Vector column definition in models.
+
+    Modes (EMBEDDING_MODE):
+    - local: the model is loaded into this process (default)
+    - server: calls are forwarded to the shared embedding server on
+      EMBEDDING_SERVER_SOCKET, so workers never import torch or load weights
+
+    In local mode, calls with at least EMBEDDING_POOL_MIN_TEXTS texts are
+    split across a multi-process encode pool when EMBEDDING_POOL_WORKERS
+    is set; smaller calls always run in this process.
     """
-    
-    def __init__(self):
-        """Initialize the embedding model."""
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        self.embedding_dimension = self.model.get_sentence_embedding_dimension()
-    
+
+    def __init__(self, mode: Optional[str] = None):
+        """
+        Initialize the embedding model or the server client.
+
+        Args:
+            mode: "local" or "server", defaults to EMBEDDING_MODE
+        """
+        self.mode = (mode or settings.EMBEDDING_MODE).lower()
+        self.model = None
+        self.client = None
+        self.pool = None
+        self.embedding_dimension = None
+
+        if self.mode == "local":
+            set_torch_threads(settings.EMBEDDING_THREADS)
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            self.embedding_dimension = self.model.get_sentence_embedding_dimension()
+            self.pool = create_encode_pool(
+                settings.EMBEDDING_MODEL,
+                settings.EMBEDDING_POOL_WORKERS,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                threads_per_worker=settings.EMBEDDING_POOL_THREADS_PER_WORKER
+            )
+        elif self.mode == "server":
+            from app.services.embedding_server import EmbeddingClient
+            self.client = EmbeddingClient(
+                settings.EMBEDDING_SERVER_SOCKET,
+                timeout=settings.EMBEDDING_SERVER_TIMEOUT_SECONDS
+            )
+        else:
+            raise ValueError(f"Unsupported EMBEDDING_MODE: {self.mode}")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts into a float32 matrix.
+
+        Args:
+            texts: List of input texts to embed
+
+        Returns:
+            Array of shape (len(texts), embedding dimension)
+        """
+        if not texts:
+            return np.zeros((0, self.get_embedding_dimension()), dtype=np.float32)
+        if self.client is not None:
+            return self.client.encode(texts)
+        if self.pool is not None and len(texts) >= settings.EMBEDDING_POOL_MIN_TEXTS:
+            return self.pool.encode(texts)
+        return self.model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+
     def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for a single text.
-        
+
         Args:
             text: Input text to embed
-            
+
         Returns:
             List of floats representing the embedding vector
         """
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
-    
+        return self.encode([text])[0].tolist()
+
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for multiple texts.
-        
+
         Args:
             texts: List of input texts to embed
-            
+
         Returns:
             List of embedding vectors
         """
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
-    
+        return self.encode(texts).tolist()
+
     def get_embedding_dimension(self) -> int:
         """
         Get the dimension of embeddings produced by this model.
-        
+
         Returns:
             Integer dimension of embedding vectors
         """
+        if self.embedding_dimension is None:
+            self.embedding_dimension = self.client.info()["dim"]
         return self.embedding_dimension
 
 
@@ -0,0 +1,150 @@
+"""
+Multi-process pool for encoding large batches of texts.
+Each worker process loads its own copy of the embedding model with a fixed number of torch threads.
+"""
+from typing import List, Optional
+import logging
+import multiprocessing
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_worker_model = None
+_worker_batch_size = 32
+
+
+def set_torch_threads(threads: int):
+    """
+    Limit the threads torch uses in this process.
+
+    Args:
+        threads: Number of intra-op threads; 0 keeps the torch default
+    """
+    if threads <= 0:
+        return
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _init_worker(model_name: str, batch_size: int, threads: int):
+    """Load the model once per worker process."""
+    global _worker_model, _worker_batch_size
+    set_torch_threads(threads)
+    from sentence_transformers import SentenceTransformer
+
+    _worker_model = SentenceTransformer(model_name)
+    _worker_batch_size = batch_size
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    """Encode one slice of texts in a worker process."""
+    return _worker_model.encode(
+        texts,
+        batch_size=_worker_batch_size,
+        convert_to_numpy=True
+    ).astype(np.float32, copy=False)
+
+
+class EncodePool:
+    """
+    Pool of worker processes that encode slices of one large call in parallel.
+
+    Like sentence-transformers' multi-process encoding, but the workers
+    stay up between calls and both the batch size and the torch threads
+    per worker are explicit, so workers x threads can be sized to the
+    cores that are actually free. The processes are started on first use.
+    """
+
+    def __init__(self, model_name: str, workers: int, batch_size: int = 32, threads_per_worker: int = 1):
+        """
+        Configure the pool.
+
+        Args:
+            model_name: sentence-transformers model to load in each worker
+            workers: Number of worker processes
+            batch_size: Texts per forward pass inside a worker
+            threads_per_worker: Torch threads per worker (0 keeps the default)
+        """
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context("spawn")
+                self._pool = context.Pool(
+                    processes=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.batch_size, self.threads_per_worker)
+                )
+                logger.info(f"Started embedding encode pool with {self.workers} workers")
+            return self._pool
+
+    def split(self, texts: List[str]) -> List[List[str]]:
+        """
+        Split texts into contiguous slices for the workers.
+
+        Slices are a multiple of the batch size where possible, and there
+        are a few more slices than workers so a slow slice does not leave
+        the other workers idle at the end of a call.
+
+        Args:
+            texts: Texts of one call
+
+        Returns:
+            Slices in input order
+        """
+        target = -(-len(texts) // (self.workers * 2))
+        size = max(self.batch_size, -(-target // self.batch_size) * self.batch_size)
+        return [texts[start:start + size] for start in range(0, len(texts), size)]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts across the worker processes.
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            float32 array of shape (len(texts), embedding dimension), in input order
+        """
+        return np.vstack(self._get_pool().map(_encode, self.split(texts), chunksize=1))
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+def create_encode_pool(model_name: str, workers: Optional[int], batch_size: int, threads_per_worker: int) -> Optional[EncodePool]:
+    """
+    Create an encode pool if it is enabled.
+
+    Args:
+        model_name: sentence-transformers model name
+        workers: Number of workers; 0 disables the pool, -1 uses one per CPU
+        batch_size: Texts per forward pass inside a worker
+        threads_per_worker: Torch threads per worker
+
+    Returns:
+        EncodePool, or None if disabled
+    """
+    if workers is None or workers == 0:
+        return None
+    if workers < 0:
+        workers = max(1, (os.cpu_count() or 1) // max(threads_per_worker, 1))
+    return EncodePool(model_name, workers, batch_size=batch_size, threads_per_worker=threads_per_worker)
@@ -0,0 +1,98 @@
+"""
+Local fake chat model with a simulated provider prompt cache.
+Selected with LLM_PROVIDER=fake for development, load tests and prompt cache benchmarks; it never calls a real provider.
+"""
+from collections import OrderedDict
+from typing import Any, List, Optional
+import hashlib
+import threading
+import time
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+from app.services.token_budget import CHARS_PER_TOKEN
+
+
+class PrefixCacheFakeChatModel(BaseChatModel):
+    """
+    Fake chat model that reports usage like a provider with automatic prefix caching.
+
+    The prompt is serialized message by message and hashed at every
+    cache_block_tokens boundary. A later prompt that starts with the same
+    text up to a stored boundary gets those tokens reported as cached
+    (usage_metadata input_token_details.cache_read), once the shared prefix
+    reaches cache_min_tokens. This mirrors how hosted providers match cached
+    prefixes in fixed-size blocks above a minimum length.
+
+    Tokens are estimated at CHARS_PER_TOKEN characters each. The response
+    text only summarizes the prompt.
+    """
+
+    latency_seconds: float = 0.0
+    cache_min_tokens: int = 1024
+    cache_block_tokens: int = 128
+    max_cached_prefixes: int = 100000
+
+    _prefixes: "OrderedDict[str, None]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefix-cache-fake"
+
+    @staticmethod
+    def _serialize(messages: List[BaseMessage]) -> str:
+        return "".join(f"<{message.type}>{message.content}\n" for message in messages)
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Look up the longest cached prefix of a prompt, then cache the prompt's own prefixes."""
+        block_chars = self.cache_block_tokens * CHARS_PER_TOKEN
+        min_chars = self.cache_min_tokens * CHARS_PER_TOKEN
+        digest = hashlib.sha256()
+        boundaries = []
+        for end in range(block_chars, len(prompt) + 1, block_chars):
+            digest.update(prompt[end - block_chars:end].encode("utf-8"))
+            if end >= min_chars:
+                boundaries.append((end, digest.hexdigest()))
+
+        cached_chars = 0
+        with self._lock:
+            for end, key in boundaries:
+                if key not in self._prefixes:
+                    break
+                cached_chars = end
+            for _, key in boundaries:
+                self._prefixes[key] = None
+                self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.max_cached_prefixes:
+                self._prefixes.popitem(last=False)
+        return cached_chars // CHARS_PER_TOKEN
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        prompt = self._serialize(messages)
+        input_tokens = -(-len(prompt) // CHARS_PER_TOKEN)
+        cached_tokens = self._cached_tokens(prompt)
+        content = (
+            f"Fake response to a prompt of {len(messages)} messages "
+            f"({input_tokens} tokens, {cached_tokens} cached)."
+        )
+        output_tokens = -(-len(content) // CHARS_PER_TOKEN)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached_tokens},
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,284 @@
+"""
+Document ingestion service.
+Stores extracted document text, chunks it and keeps chunk embeddings in sync with it.
+"""
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.models import Document, DocumentChunk
+from app.services.blob_store import blob_store
+from app.services.document_service import document_processor
+from app.services.embedding_service import embedding_service
+from app.services.library_service import invalidate_document
+from app.services.reembedding_service import embedding_model_check
+from app.services.token_budget import count_tokens
+from app.services.vector_cache import vector_cache
+
+
+class IngestionResult(NamedTuple):
+    """Outcome of ingesting one document."""
+    document: Document
+    chunks_added: int
+    chunks_reused: int
+    chunks_removed: int
+
+
+class PreparedDocument(NamedTuple):
+    """A document that is already extracted, chunked and embedded."""
+    filename: str
+    file_type: str
+    text_content: str
+    chunks: List[str]
+    token_counts: List[int]
+    embeddings: np.ndarray
+
+
+def chunk_hash(chunk: str) -> str:
+    """
+    Hash a chunk's text for change detection.
+
+    Args:
+        chunk: Chunk text
+
+    Returns:
+        Hex SHA-256 digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class IngestionService:
+    """
+    Service for turning extracted text into stored, embedded chunks.
+
+    Re-uploading a document re-indexes it incrementally: the new chunks are
+    matched against the stored ones by content hash, unchanged chunks keep
+    their rows and embeddings (only their position is updated), and only new
+    or changed chunks are embedded.
+    """
+
+    def find_existing_document(
+        self,
+        db: Session,
+        session_id: Optional[int],
+        filename: str,
+        document_id: Optional[int] = None
+    ) -> Optional[Document]:
+        """
+        Find the document a new upload replaces.
+
+        Args:
+            db: Database session
+            session_id: Database id of the session, or None for the library
+            filename: Uploaded filename
+            document_id: Explicit document to replace, if given
+
+        Returns:
+            Latest document of the session (or library) with this filename
+            (or the given id), or None if the upload is a new document
+        """
+        if session_id is None:
+            query = db.query(Document).filter(Document.session_id.is_(None))
+        else:
+            query = db.query(Document).filter(Document.session_id == session_id)
+        if document_id is not None:
+            return query.filter(Document.id == document_id).first()
+        return query.filter(Document.filename == filename).order_by(Document.id.desc()).first()
+
+    def _store_text(self, document: Document, text_content: str):
+        """Store the full text inline or in the blob store, per DOCUMENT_CONTENT_STORAGE."""
+        if settings.DOCUMENT_CONTENT_STORAGE == "blob":
+            document.content_hash = blob_store.put_text(text_content)
+            document.content = None
+        else:
+            document.content = text_content
+            document.content_hash = None
+
+    def _diff_chunks(
+        self,
+        db: Session,
+        document_id: int,
+        hashes: List[str]
+    ) -> Tuple[List[int], List[Dict[str, int]], List[int]]:
+        """
+        Match new chunk hashes against the stored chunks of a document.
+
+        Args:
+            db: Database session
+            document_id: Document being re-indexed
+            hashes: Hashes of the new chunks, in order
+
+        Returns:
+            (indexes of new chunks that need embedding,
+             position updates for reused rows,
+             ids of stored rows that disappeared)
+        """
+        stored = db.query(
+            DocumentChunk.id,
+            DocumentChunk.chunk_index,
+            DocumentChunk.chunk_hash
+        ).filter(DocumentChunk.document_id == document_id).order_by(DocumentChunk.chunk_index).all()
+
+        # Rows written before chunk hashes existed are hashed from their text
+        missing = [row.id for row in stored if row.chunk_hash is None]
+        backfilled = {}
+        if missing:
+            backfilled = {
+                row.id: chunk_hash(row.chunk_text)
+                for row in db.query(DocumentChunk.id, DocumentChunk.chunk_text).filter(
+                    DocumentChunk.id.in_(missing)
+                )
+            }
+
+        available = defaultdict(list)
+        for row in stored:
+            available[row.chunk_hash or backfilled[row.id]].append(row)
+
+        to_embed = []
+        moved = []
+        for index, digest in enumerate(hashes):
+            if available[digest]:
+                row = available[digest].pop(0)
+                if row.chunk_index != index or row.id in backfilled:
+                    moved.append({"id": row.id, "chunk_index": index, "chunk_hash": digest})
+            else:
+                to_embed.append(index)
+
+        removed = [row.id for rows in available.values() for row in rows]
+        return to_embed, moved, removed
+
+    def ingest_text(
+        self,
+        db: Session,
+        session_id: Optional[int],
+        filename: str,
+        file_type: str,
+        text_content: str,
+        document: Optional[Document] = None
+    ) -> IngestionResult:
+        """
+        Store a document's text and its embedded chunks in one transaction.
+
+        Args:
+            db: Database session
+            session_id: Database id of the session, or None for a library document
+            filename: Original filename
+            file_type: "pdf" or "txt"
+            text_content: Extracted text
+            document: Existing document to re-index instead of creating a new one
+
+        Returns:
+            IngestionResult with chunk counts
+
+        Raises:
+            EmbeddingModelMismatchError: If the stored embeddings were made by another model
+        """
+        embedding_model_check.ensure(db)
+        if document is None:
+            document = Document(session_id=session_id, filename=filename, file_type=file_type)
+            db.add(document)
+        else:
+            document.filename = filename
+            document.file_type = file_type
+        self._store_text(document, text_content)
+        db.flush()
+
+        # Chunk the text
+        chunks = document_processor.chunk_document(text_content)
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+
+        to_embed, moved, removed = self._diff_chunks(db, document.id, hashes)
+
+        if removed:
+            db.query(DocumentChunk).filter(DocumentChunk.id.in_(removed)).delete(synchronize_session=False)
+        if moved:
+            db.bulk_update_mappings(DocumentChunk, moved)
+
+        # Generate embeddings only for new or changed chunks (kept as one float32 matrix)
+        if to_embed:
+            embeddings = embedding_service.encode([chunks[index] for index in to_embed])
+            db.execute(insert(DocumentChunk), [
+                {
+                    "document_id": document.id,
+                    "session_id": document.session_id,
+                    "chunk_text": chunks[index],
+                    "chunk_index": index,
+                    "chunk_hash": hashes[index],
+                    "token_count": count_tokens(chunks[index]),
+                    "embedding": embedding,
+                }
+                for index, embedding in zip(to_embed, embeddings)
+            ])
+
+        db.commit()
+        db.refresh(document)
+        invalidate_document(db, document)
+
+        return IngestionResult(
+            document=document,
+            chunks_added=len(to_embed),
+            chunks_reused=len(chunks) - len(to_embed),
+            chunks_removed=len(removed)
+        )
+
+    def store_documents(
+        self,
+        db: Session,
+        session_id: Optional[int],
+        documents: List[PreparedDocument]
+    ) -> List[Document]:
+        """
+        Store several new, already embedded documents in one transaction.
+
+        Used by bulk ingestion: all document rows are flushed together and
+        all their chunks are written with a single multi-row insert.
+
+        Args:
+            db: Database session
+            session_id: Database id of the session, or None for library documents
+            documents: Prepared documents
+
+        Returns:
+            The stored Document rows, in input order
+
+        Raises:
+            EmbeddingModelMismatchError: If the stored embeddings were made by another model
+        """
+        embedding_model_check.ensure(db)
+        rows = []
+        for prepared in documents:
+            document = Document(session_id=session_id, filename=prepared.filename, file_type=prepared.file_type)
+            self._store_text(document, prepared.text_content)
+            rows.append(document)
+        db.add_all(rows)
+        db.flush()
+
+        chunk_rows = [
+            {
+                "document_id": document.id,
+                "session_id": session_id,
+                "chunk_text": chunk,
+                "chunk_index": index,
+                "chunk_hash": chunk_hash(chunk),
+                "token_count": token_count,
+                "embedding": embedding,
+            }
+            for document, prepared in zip(rows, documents)
+            for index, (chunk, token_count, embedding) in enumerate(
+                zip(prepared.chunks, prepared.token_counts, prepared.embeddings)
+            )
+        ]
+        if chunk_rows:
+            db.execute(insert(DocumentChunk), chunk_rows)
+
+        db.commit()
+        if session_id is not None:
+            vector_cache.invalidate(session_id)
+        return rows
+
+
+# Global ingestion service instance
+ingestion_service = IngestionService()
@@ -0,0 +1,192 @@
+"""
+Shared document library service.
+Attaches library documents to sessions and resolves the documents a session can retrieve from.
+"""
+from typing import List, Optional
+from sqlalchemy import and_, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.models import Document, DocumentChunk, SessionDocument
+from app.services.vector_cache import vector_cache
+
+
+def session_document_ids(session_id: int):
+    """
+    Ids of all documents a session retrieves from: its own plus attached library documents.
+
+    Both branches are index lookups (documents.session_id and the
+    session_documents primary key), so the result can be used directly as
+    `Document.id.in_(...)`. To select chunks, use session_chunk_filter().
+
+    Args:
+        session_id: Database id of the session
+
+    Returns:
+        Selectable with a single document id column
+    """
+    return union_all(
+        select(Document.id).where(Document.session_id == session_id),
+        select(SessionDocument.document_id).where(SessionDocument.session_id == session_id)
+    )
+
+
+def session_chunk_filter(session_id: int):
+    """
+    Condition selecting the chunks a session retrieves from.
+
+    Own chunks are matched on document_chunks.session_id and library chunks
+    (session_id NULL) on the session's attachments, so on a partitioned
+    table PostgreSQL only reads the session's partition and the library one.
+
+    Args:
+        session_id: Database id of the session
+
+    Returns:
+        SQLAlchemy boolean clause on DocumentChunk
+    """
+    return or_(
+        DocumentChunk.session_id == session_id,
+        and_(
+            DocumentChunk.session_id.is_(None),
+            DocumentChunk.document_id.in_(
+                select(SessionDocument.document_id).where(SessionDocument.session_id == session_id)
+            )
+        )
+    )
+
+
+def get_library_document(db: Session, document_id: int) -> Optional[Document]:
+    """
+    Look up a library document.
+
+    Args:
+        db: Database session
+        document_id: Document id
+
+    Returns:
+        The document, or None if it does not exist or belongs to a session
+    """
+    return db.query(Document).filter(
+        Document.id == document_id,
+        Document.session_id.is_(None)
+    ).first()
+
+
+def attached_session_ids(db: Session, document_id: int) -> List[int]:
+    """
+    Sessions a library document is attached to.
+
+    Args:
+        db: Database session
+        document_id: Document id
+
+    Returns:
+        Database ids of the sessions
+    """
+    return [
+        row[0] for row in db.query(SessionDocument.session_id).filter(
+            SessionDocument.document_id == document_id
+        )
+    ]
+
+
+def invalidate_document(db: Session, document: Document):
+    """
+    Drop cached vectors of every session that retrieves from a document.
+
+    Args:
+        db: Database session
+        document: Changed document
+    """
+    if document.session_id is not None:
+        vector_cache.invalidate(document.session_id)
+        return
+    for session_id in attached_session_ids(db, document.id):
+        vector_cache.invalidate(session_id)
+
+
+def attach_document(db: Session, session_id: int, document_id: int) -> bool:
+    """
+    Attach a library document to a session.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+        document_id: Library document id
+
+    Returns:
+        True if the document was attached, False if it already was
+    """
+    inserted = db.execute(
+        pg_insert(SessionDocument)
+        .values(session_id=session_id, document_id=document_id)
+        .on_conflict_do_nothing()
+    ).rowcount
+    db.commit()
+    vector_cache.invalidate(session_id)
+    return inserted > 0
+
+
+def detach_document(db: Session, session_id: int, document_id: int) -> bool:
+    """
+    Detach a library document from a session; the document itself is kept.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+        document_id: Library document id
+
+    Returns:
+        True if the document was attached
+    """
+    deleted = db.query(SessionDocument).filter(
+        SessionDocument.session_id == session_id,
+        SessionDocument.document_id == document_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    vector_cache.invalidate(session_id)
+    return deleted > 0
+
+
+def set_pinned(db: Session, session_id: int, document_id: int, pinned: bool) -> bool:
+    """
+    Pin or unpin a document in a session's prompts.
+
+    Own documents of the session are pinned on the document, library
+    documents on their attachment to the session.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+        document_id: Document id
+        pinned: New pinned state
+
+    Returns:
+        True if the document belongs to or is attached to the session
+    """
+    updated = db.query(Document).filter(
+        Document.id == document_id,
+        Document.session_id == session_id
+    ).update({Document.pinned: pinned}, synchronize_session=False)
+    if not updated:
+        updated = db.query(SessionDocument).filter(
+            SessionDocument.session_id == session_id,
+            SessionDocument.document_id == document_id
+        ).update({SessionDocument.pinned: pinned}, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
+def delete_library_document(db: Session, document: Document):
+    """
+    Delete a library document, detaching it from every session.
+
+    Args:
+        db: Database session
+        document: Library document
+    """
+    session_ids = attached_session_ids(db, document.id)
+    db.delete(document)
+    db.commit()
+    for session_id in session_ids:
+        vector_cache.invalidate(session_id)
@@ -2,9 +2,125 @@
 LLM service for managing language model interactions.
 Supports multiple providers based on environment settings.
 """
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
 from app.config.settings import settings
+from app.services.fake_llm import PrefixCacheFakeChatModel
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when an LLM call does not finish before its deadline."""
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when no concurrency slot frees up for a new LLM call in time."""
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one provider.
+
+    Percentiles are computed over the most recent LLM_LATENCY_WINDOW calls,
+    so the hedge threshold follows the provider as it speeds up or degrades.
+    """
+
+    def __init__(self, window_size: int):
+        """Initialize an empty latency window."""
+        self._samples = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """
+        Record the latency of one successful call.
+
+        Args:
+            seconds: Wall-clock duration of the call
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        """Number of samples currently in the window."""
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Get a latency percentile from the current window.
+
+        Args:
+            pct: Percentile between 0 and 100
+
+        Returns:
+            Latency in seconds, or None if no samples were recorded yet
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(pct / 100.0 * (len(samples) - 1)))))
+        return samples[rank]
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """
+        Summarize the current window.
+
+        Returns:
+            Dictionary with sample count and p50/p90/p99 latencies
+        """
+        return {
+            "count": self.count(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+def prompt_cache_usage(response) -> Optional[Tuple[int, int]]:
+    """
+    Read prompt and cached prompt token counts from a provider response.
+
+    Uses LangChain's usage_metadata (input_token_details.cache_read) and
+    falls back to the raw OpenAI (prompt_tokens_details.cached_tokens) and
+    Gemini (cached_content_token_count) usage fields.
+
+    Args:
+        response: Message returned by a chat model
+
+    Returns:
+        (input_tokens, cached_tokens), or None if the provider reported no usage
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("input_tokens") is not None:
+        details = usage.get("input_token_details") or {}
+        return usage["input_tokens"], details.get("cache_read") or 0
+
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return token_usage["prompt_tokens"], details.get("cached_tokens") or 0
+    gemini_usage = metadata.get("usage_metadata") or {}
+    if gemini_usage.get("prompt_token_count") is not None:
+        return gemini_usage["prompt_token_count"], gemini_usage.get("cached_content_token_count") or 0
+    return None
+
+
+def attempt_timeout() -> float:
+    """
+    Client timeout of a single provider attempt.
+
+    LLM_TIMEOUT_SECONDS bounds the whole call, so it is split evenly across
+    the first attempt and LLM_MAX_RETRIES retries; otherwise one slow
+    attempt would use the entire deadline and retries could never run.
+
+    Returns:
+        Seconds per attempt
+    """
+    return settings.LLM_TIMEOUT_SECONDS / (max(settings.LLM_MAX_RETRIES, 0) + 1)
 
 
 class LLMService:
@@ -12,55 +128,271 @@ class LLMService:
     Service for managing language model interactions.
 
     Provider selection is controlled by LLM_PROVIDER in the environment.
-    Supported providers: openai, gemini.
+    Supported providers: openai, gemini, and fake (a local model for tests
+    and benchmarks that simulates a provider prompt cache).
+
+    Every call made through invoke() is bounded:
+    - LLM_MAX_CONCURRENCY caps in-flight provider calls per process; callers
+      wait at most LLM_QUEUE_TIMEOUT_SECONDS for a free slot
+    - LLM_TIMEOUT_SECONDS is the end-to-end deadline of a call, retries included;
+      each provider attempt gets an equal share of it (attempt_timeout())
+    - With LLM_HEDGE_ENABLED, a second request is sent to LLM_HEDGE_PROVIDER
+      (or the same provider) once the first one runs longer than the
+      LLM_HEDGE_PERCENTILE latency observed for the primary provider, and
+      whichever answers first wins
+
+    Prompts are laid out so their prefix repeats across turns (see
+    prompt_layout). OpenAI and Gemini 2.5+ cache repeated prefixes on their own;
+    the cache key passed to invoke() is sent to OpenAI as prompt_cache_key
+    so prompts with the same prefix are routed to the same cache. The
+    share of prompt tokens served from the cache is tracked per provider.
     """
     
     def __init__(self):
         """Initialize the LLM service."""
         self.llm = None
+        self._llms = {}
+        self._init_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+        # Hedged calls take a slot of their own, so twice the cap is the most
+        # that can ever run at once
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.LLM_MAX_CONCURRENCY * 2,
+            thread_name_prefix="llm-call"
+        )
+        self._latency = {}
+        self._usage_lock = threading.Lock()
+        self._prompt_usage = {}
     
-    def _initialize_llm(self):
+    def _initialize_llm(self, provider: Optional[str] = None):
         """
         Initialize a provider-specific language model.
 
+        Provider packages are imported here, so only the selected provider's
+        client has to be installed.
+
+        Args:
+            provider: Provider name, defaults to LLM_PROVIDER
+
         Returns:
             A Chat model instance
 
         Raises:
             ValueError: If required API key is missing or provider is unsupported
         """
-        provider = (settings.LLM_PROVIDER or "openai").lower()
+        provider = (provider or settings.LLM_PROVIDER or "openai").lower()
 
         if provider == "openai":
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY is required for OpenAI provider.")
+            from langchain_openai import ChatOpenAI
             return ChatOpenAI(
                 model="gpt-3.5-turbo",
                 temperature=0.7,
                 api_key=settings.OPENAI_API_KEY,
+                timeout=attempt_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
             )
 
         if provider == "gemini":
             if not settings.GOOGLE_API_KEY:
                 raise ValueError("GOOGLE_API_KEY is required for Gemini provider.")
+            from langchain_google_genai import ChatGoogleGenerativeAI
             return ChatGoogleGenerativeAI(
                 model=settings.GEMINI_MODEL,
                 temperature=0.7,
                 google_api_key=settings.GOOGLE_API_KEY,
+                timeout=attempt_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
             )
 
-        raise ValueError(f"Unsupported LLM_PROVIDER: {settings.LLM_PROVIDER}")
+        if provider == "fake":
+            return PrefixCacheFakeChatModel()
+
+        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
     
-    def get_llm(self):
+    def get_llm(self, provider: Optional[str] = None):
         """
         Get the initialized LLM instance.
         
+        Args:
+            provider: Provider name, defaults to LLM_PROVIDER
+
         Returns:
             LLM instance
         """
-        if self.llm is None:
-            self.llm = self._initialize_llm()
-        return self.llm
+        key = (provider or settings.LLM_PROVIDER or "openai").lower()
+        if key not in self._llms:
+            with self._init_lock:
+                if key not in self._llms:
+                    self._llms[key] = self._initialize_llm(key)
+        if key == (settings.LLM_PROVIDER or "openai").lower():
+            self.llm = self._llms[key]
+        return self._llms[key]
+
+    def _tracker(self, provider: str) -> LatencyTracker:
+        """Get (or create) the latency tracker of a provider."""
+        tracker = self._latency.get(provider)
+        if tracker is None:
+            tracker = self._latency.setdefault(
+                provider, LatencyTracker(settings.LLM_LATENCY_WINDOW)
+            )
+        return tracker
+
+    @staticmethod
+    def _cache_options(provider: str, cache_key: Optional[str]) -> Dict:
+        """Provider-specific call options that route a prompt to its prefix cache."""
+        if cache_key and provider == "openai":
+            # Sent as a raw body field, which older client versions accept too
+            return {"extra_body": {"prompt_cache_key": cache_key}}
+        return {}
+
+    def _record_usage(self, provider: str, response):
+        """Add the prompt and cached tokens of a response to the provider's totals."""
+        usage = prompt_cache_usage(response)
+        with self._usage_lock:
+            totals = self._prompt_usage.setdefault(
+                provider, {"calls": 0, "reported": 0, "input_tokens": 0, "cached_tokens": 0}
+            )
+            totals["calls"] += 1
+            if usage is not None:
+                totals["reported"] += 1
+                totals["input_tokens"] += usage[0]
+                totals["cached_tokens"] += usage[1]
+
+    def _timed_call(self, provider: str, messages: List, cache_key: Optional[str] = None):
+        """
+        Run one provider call and record its latency and token usage if it succeeds.
+
+        Args:
+            provider: Provider name
+            messages: LangChain messages to send
+            cache_key: Identifier of the prompt's cacheable prefix
+
+        Returns:
+            The provider response
+        """
+        llm = self.get_llm(provider)
+        started = time.monotonic()
+        response = llm.invoke(messages, **self._cache_options(provider, cache_key))
+        self._tracker(provider).record(time.monotonic() - started)
+        self._record_usage(provider, response)
+        return response
+
+    def _submit(self, provider: str, messages: List, cache_key: Optional[str] = None):
+        """Submit a call that holds an already acquired slot until it finishes."""
+        try:
+            future = self._executor.submit(self._timed_call, provider, messages, cache_key)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is released when the provider call really ends, not when
+        # the caller gives up on it, so the cap reflects actual in-flight calls
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _hedge_provider(self, primary: str) -> str:
+        """Pick the provider for hedged requests, falling back to the primary."""
+        candidate = (settings.LLM_HEDGE_PROVIDER or primary).lower()
+        if candidate == primary:
+            return primary
+        try:
+            self.get_llm(candidate)
+            return candidate
+        except ValueError:
+            return primary
+
+    def _hedge_delay(self, provider: str) -> float:
+        """
+        Time to wait on the primary call before sending a hedged request.
+
+        Uses the LLM_HEDGE_PERCENTILE latency of the provider once enough
+        samples exist, and LLM_HEDGE_DELAY_SECONDS until then.
+        """
+        tracker = self._tracker(provider)
+        if tracker.count() < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DELAY_SECONDS
+        return tracker.percentile(settings.LLM_HEDGE_PERCENTILE)
+
+    def invoke(self, messages: List, cache_key: Optional[str] = None):
+        """
+        Call the configured LLM with a deadline, concurrency limit and optional hedging.
+
+        Args:
+            messages: LangChain messages to send
+            cache_key: Identifier of the prompt's cacheable prefix, if any
+
+        Returns:
+            The first successful provider response
+
+        Raises:
+            LLMOverloadedError: If no concurrency slot frees up in time
+            LLMTimeoutError: If no response arrives before the deadline
+            Exception: The provider error if every attempt failed
+        """
+        primary = (settings.LLM_PROVIDER or "openai").lower()
+        # Fail fast on configuration errors before taking a slot
+        self.get_llm(primary)
+
+        deadline = time.monotonic() + settings.LLM_TIMEOUT_SECONDS
+        if not self._slots.acquire(timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS):
+            raise LLMOverloadedError("Too many concurrent LLM calls, try again later.")
+
+        pending = {self._submit(primary, messages, cache_key)}
+        hedged = not settings.LLM_HEDGE_ENABLED
+        error = None
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            timeout = remaining
+            if not hedged:
+                timeout = min(remaining, self._hedge_delay(primary))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+
+            # Hedge once, on a slow primary or a failed one, if a slot is free
+            if not hedged and time.monotonic() < deadline:
+                hedged = True
+                if self._slots.acquire(blocking=False):
+                    pending.add(self._submit(self._hedge_provider(primary), messages, cache_key))
+
+        if pending or error is None:
+            raise LLMTimeoutError(
+                f"LLM call exceeded the {settings.LLM_TIMEOUT_SECONDS}s deadline."
+            )
+        raise error
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Get latency percentiles of every provider called so far.
+
+        Returns:
+            Mapping of provider name to its latency snapshot
+        """
+        return {provider: tracker.snapshot() for provider, tracker in list(self._latency.items())}
+
+    def get_prompt_cache_stats(self) -> Dict[str, Dict]:
+        """
+        Get prompt token usage of every provider called so far.
+
+        Returns:
+            Mapping of provider name to its calls, calls that reported usage,
+            prompt and cached prompt tokens, and the cached-token ratio
+        """
+        with self._usage_lock:
+            usage = {provider: dict(totals) for provider, totals in self._prompt_usage.items()}
+        for totals in usage.values():
+            totals["cached_ratio"] = (
+                round(totals["cached_tokens"] / totals["input_tokens"], 4) if totals["input_tokens"] else None
+            )
+        return usage
 
 
 # Global LLM service instance
@@ -0,0 +1,507 @@
+"""
+Partition management for the messages and document_chunks tables.
+Creates time-range message partitions ahead of time, archives old ones to compressed files, and hash-partitions chunks by session.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import gzip
+import os
+import re
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.config.settings import settings
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+
+CHUNKS_TABLE = "document_chunks"
+CHUNKS_VECTOR_INDEX = "ix_document_chunks_embedding"
+
+# pgvector release that can continue an HNSW scan until enough rows pass the filter
+ITERATIVE_SCAN_VERSION = (0, 8)
+# Largest hnsw.ef_search pgvector accepts
+MAX_EF_SEARCH = 1000
+
+_PARTITION_NAME = re.compile(r"^messages_p(\d{8})$")
+
+
+def _interval_start(day: date, interval: str) -> date:
+    """First day of the partition interval that contains day."""
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unsupported MESSAGES_PARTITION_INTERVAL: {interval}")
+
+
+def _next_start(start: date, interval: str) -> date:
+    """First day of the interval after the one starting at start."""
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start: date) -> str:
+    """
+    Name of the partition whose range starts at start.
+
+    Args:
+        start: First day covered by the partition
+
+    Returns:
+        Table name such as messages_p20260101
+    """
+    return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+
+def is_partitioned(conn: Connection, table: str = PARENT_TABLE) -> bool:
+    """
+    Check whether a table exists and is partitioned.
+
+    Args:
+        conn: Database connection
+        table: Table name, defaults to messages
+
+    Returns:
+        True if the table is a partitioned table
+    """
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+    """), {"table": table}).scalar())
+
+
+def table_exists(conn: Connection, name: str) -> bool:
+    """Check whether a table exists in the public schema."""
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"public.{name}"}).scalar()
+
+
+def create_partitioned_messages_table(conn: Connection):
+    """
+    Create messages as a table partitioned by range on created_at.
+
+    The primary key has to include the partition key, so it is
+    (id, created_at). A default partition catches rows outside every range
+    instead of failing inserts.
+
+    Args:
+        conn: Database connection
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {PARENT_TABLE} (
+            id SERIAL,
+            session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+            role VARCHAR(50) NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_messages_session_id ON {PARENT_TABLE} (session_id)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_messages_created_at ON {PARENT_TABLE} (created_at)"))
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+    ))
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, date, date]]:
+    """
+    List the range partitions created by this module.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        (name, start, end) tuples ordered by start; end is exclusive
+    """
+    names = [row[0] for row in conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {"table": PARENT_TABLE}).fetchall()]
+
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            start = datetime.strptime(match.group(1), "%Y%m%d").date()
+            end = _next_start(start, settings.MESSAGES_PARTITION_INTERVAL)
+            partitions.append((name, start, end))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _set_aside_default_rows(conn: Connection, lower: str, upper: str):
+    """
+    Move rows of a range from the default partition to messages_moved.
+
+    Rows written while no partition covered their created_at land in the
+    default partition, and PostgreSQL refuses to create a partition for a
+    range the default partition has rows in. The caller inserts them again
+    through the parent once the partition exists.
+
+    Args:
+        conn: Database connection
+        lower: Inclusive start of the range
+        upper: Exclusive end of the range
+    """
+    bounds = {"lower": lower, "upper": upper}
+    # Creating the partition locks the default partition this way anyway
+    conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE messages_moved ON COMMIT DROP AS
+        SELECT * FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper
+    """), bounds)
+    conn.execute(text(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper"
+    ), bounds)
+
+
+def create_future_partitions(
+    conn: Connection,
+    ahead: Optional[int] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Make sure partitions exist for the current interval and the next ones.
+
+    Rows that already landed in the default partition for a new range are
+    moved into the new partition.
+
+    Args:
+        conn: Database connection
+        ahead: Intervals to create beyond the current one,
+            defaults to MESSAGES_PARTITIONS_AHEAD
+        today: Reference day, defaults to the current UTC date
+
+    Returns:
+        Names of the partitions that were created
+    """
+    interval = settings.MESSAGES_PARTITION_INTERVAL
+    ahead = settings.MESSAGES_PARTITIONS_AHEAD if ahead is None else ahead
+    start = _interval_start(today or datetime.now(timezone.utc).date(), interval)
+
+    created = []
+    for _ in range(ahead + 1):
+        end = _next_start(start, interval)
+        name = partition_name(start)
+        if not table_exists(conn, name):
+            lower, upper = f"{start.isoformat()} 00:00:00+00", f"{end.isoformat()} 00:00:00+00"
+            has_default = table_exists(conn, DEFAULT_PARTITION)
+            if has_default:
+                _set_aside_default_rows(conn, lower, upper)
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            ))
+            if has_default:
+                conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM messages_moved"))
+                conn.execute(text("DROP TABLE messages_moved"))
+            created.append(name)
+        start = end
+    return created
+
+
+def archive_partition(conn: Connection, name: str, archive_dir: str) -> str:
+    """
+    Detach a partition, export it to a gzip-compressed CSV file and drop it.
+
+    The file is fully written and synced before the table is dropped, and
+    the whole operation runs in the caller's transaction, so a failure
+    leaves the partition attached.
+
+    Args:
+        conn: Database connection (psycopg2-backed)
+        name: Partition table name
+        archive_dir: Directory for archive files
+
+    Returns:
+        Path of the archive file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    tmp_path = path + ".tmp"
+
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    cursor = conn.connection.cursor()
+    try:
+        with gzip.open(tmp_path, "wb") as archive:
+            cursor.copy_expert(
+                f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)",
+                archive
+            )
+        with open(tmp_path, "rb") as archive:
+            os.fsync(archive.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        cursor.close()
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    conn.execute(text(f"DROP TABLE {name}"))
+    return path
+
+
+def archive_old_partitions(
+    conn: Connection,
+    older_than_days: Optional[int] = None,
+    archive_dir: Optional[str] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Archive every partition whose whole range is older than the cutoff.
+
+    Args:
+        conn: Database connection
+        older_than_days: Age cutoff, defaults to MESSAGES_ARCHIVE_AFTER_DAYS
+        archive_dir: Target directory, defaults to MESSAGES_ARCHIVE_DIR
+        today: Reference day, defaults to the current UTC date
+
+    Returns:
+        Paths of the archive files written
+    """
+    older_than_days = settings.MESSAGES_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    archive_dir = archive_dir or settings.MESSAGES_ARCHIVE_DIR
+    cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=older_than_days)
+
+    archived = []
+    for name, _, end in list_partitions(conn):
+        if end <= cutoff:
+            archived.append(archive_partition(conn, name, archive_dir))
+            # Commit per partition so each archived file matches a dropped table
+            conn.commit()
+    return archived
+
+
+def convert_messages_to_partitioned(conn: Connection) -> int:
+    """
+    Replace an existing plain messages table with a partitioned one.
+
+    Partitions are created to cover every existing row, the rows are copied
+    over in one transaction, and the old table is dropped. Writes to
+    messages are blocked while this runs.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Number of rows moved
+    """
+    if is_partitioned(conn):
+        return 0
+
+    conn.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM {PARENT_TABLE}")).scalar()
+
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {PARENT_TABLE}_unpartitioned"))
+    for index in ("messages_pkey", "ix_messages_session_id", "ix_messages_created_at", "ix_messages_id"):
+        conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_unpartitioned"))
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {PARENT_TABLE}_id_seq_unpartitioned"))
+
+    create_partitioned_messages_table(conn)
+    if oldest is not None:
+        today = datetime.now(timezone.utc).date()
+        intervals = 0
+        start = _interval_start(oldest.date(), settings.MESSAGES_PARTITION_INTERVAL)
+        while start <= today:
+            start = _next_start(start, settings.MESSAGES_PARTITION_INTERVAL)
+            intervals += 1
+        create_future_partitions(conn, ahead=intervals + settings.MESSAGES_PARTITIONS_AHEAD, today=oldest.date())
+    else:
+        create_future_partitions(conn)
+
+    moved = conn.execute(text(f"""
+        INSERT INTO {PARENT_TABLE} (id, session_id, role, content, created_at)
+        SELECT id, session_id, role, content, coalesce(created_at, now())
+        FROM {PARENT_TABLE}_unpartitioned
+    """)).rowcount
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+        f"coalesce((SELECT max(id) FROM {PARENT_TABLE}), 0) + 1, false)"
+    ))
+    conn.execute(text(f"DROP TABLE {PARENT_TABLE}_unpartitioned"))
+    return moved
+
+
+def chunk_partition_name(remainder: int) -> str:
+    """
+    Name of the document_chunks hash partition for a remainder.
+
+    Args:
+        remainder: Hash remainder the partition holds
+
+    Returns:
+        Table name such as document_chunks_h007
+    """
+    return f"{CHUNKS_TABLE}_h{remainder:03d}"
+
+
+def create_partitioned_chunks_table(conn: Connection, partitions: int):
+    """
+    Create document_chunks as a table hash-partitioned by session_id.
+
+    A session's chunks all land in one partition, so its similarity search
+    reads one small table and index instead of the whole corpus. Library
+    chunks have no session (NULL) and share the partition that NULL hashes
+    to. PostgreSQL only allows unique constraints that include the
+    partition key, which can be NULL here, so id is indexed but not a
+    primary key; the sequence keeps it unique.
+
+    Args:
+        conn: Database connection
+        partitions: Number of hash partitions
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {CHUNKS_TABLE} (
+            id SERIAL NOT NULL,
+            document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+            session_id INTEGER REFERENCES sessions (id) ON DELETE CASCADE,
+            chunk_text TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            chunk_hash VARCHAR(64),
+            token_count INTEGER,
+            embedding vector({settings.EMBEDDING_DIMENSION})
+        ) PARTITION BY HASH (session_id)
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_document_chunks_id ON {CHUNKS_TABLE} (id)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id ON {CHUNKS_TABLE} (document_id)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_document_chunks_session_id ON {CHUNKS_TABLE} (session_id)"))
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id_chunk_index "
+        f"ON {CHUNKS_TABLE} (document_id, chunk_index)"
+    ))
+    for remainder in range(partitions):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {chunk_partition_name(remainder)} PARTITION OF {CHUNKS_TABLE} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        ))
+
+
+def create_chunk_vector_index(conn: Connection):
+    """
+    Create an HNSW index for cosine distance on document_chunks.embedding.
+
+    On a partitioned table every partition gets an index of its own, built
+    and searched independently of the others.
+
+    Args:
+        conn: Database connection
+    """
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {CHUNKS_VECTOR_INDEX} ON {CHUNKS_TABLE} "
+        f"USING hnsw (embedding vector_cosine_ops)"
+    ))
+
+
+def pgvector_version(conn: Connection) -> Tuple[int, ...]:
+    """
+    Installed version of the pgvector extension.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Version numbers, e.g. (0, 8, 0), or () if the extension is missing
+    """
+    version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    return tuple(int(part) for part in re.findall(r"\d+", version or ""))
+
+
+def hnsw_scan_settings(version: Tuple[int, ...], top_k: int) -> Dict[str, str]:
+    """
+    Settings for an HNSW search of document_chunks filtered to one session.
+
+    The index is built over every session of a partition and the session
+    filter is applied to the rows it returns, so a plain scan stops after
+    hnsw.ef_search candidates even if fewer than top_k of them belong to
+    the session. From pgvector 0.8 on, iterative scans keep going until
+    top_k rows pass the filter (or hnsw.max_scan_tuples is reached); the
+    outer ORDER BY of the retrieval query restores exact order. Older
+    versions only get a larger hnsw.ef_search, so callers must still check
+    how many rows came back.
+
+    Args:
+        version: Output of pgvector_version()
+        top_k: Number of rows the query asks for
+
+    Returns:
+        Setting names and values, for set_config() or SET LOCAL
+    """
+    scan = {"hnsw.ef_search": str(min(max(settings.DOCUMENT_CHUNKS_EF_SEARCH, top_k), MAX_EF_SEARCH))}
+    if version >= ITERATIVE_SCAN_VERSION:
+        scan["hnsw.iterative_scan"] = "relaxed_order"
+    return scan
+
+
+def backfill_chunk_session_ids(conn: Connection) -> int:
+    """
+    Copy the owning session onto chunks written before document_chunks.session_id existed.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Number of chunks updated
+    """
+    return conn.execute(text(f"""
+        UPDATE {CHUNKS_TABLE} dc SET session_id = d.session_id
+        FROM documents d
+        WHERE dc.document_id = d.id AND dc.session_id IS NULL AND d.session_id IS NOT NULL
+    """)).rowcount
+
+
+def convert_chunks_to_partitioned(conn: Connection, partitions: int) -> int:
+    """
+    Replace an existing plain document_chunks table with a hash-partitioned one.
+
+    The rows are copied over in one transaction (with their session taken
+    from the document) and the old table is dropped. Retrieval and
+    ingestion are blocked while this runs. A vector index is recreated if
+    the old table had one. Finish any re-embedding first: its shadow
+    column is not copied.
+
+    Args:
+        conn: Database connection
+        partitions: Number of hash partitions
+
+    Returns:
+        Number of rows moved
+    """
+    if is_partitioned(conn, CHUNKS_TABLE):
+        return 0
+
+    conn.execute(text(f"LOCK TABLE {CHUNKS_TABLE} IN ACCESS EXCLUSIVE MODE"))
+    had_vector_index = table_exists(conn, CHUNKS_VECTOR_INDEX)
+
+    conn.execute(text(f"ALTER TABLE {CHUNKS_TABLE} RENAME TO {CHUNKS_TABLE}_unpartitioned"))
+    for index in (
+        "document_chunks_pkey", "ix_document_chunks_id", "ix_document_chunks_document_id",
+        "ix_document_chunks_session_id", "ix_document_chunks_document_id_chunk_index", CHUNKS_VECTOR_INDEX
+    ):
+        conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_unpartitioned"))
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {CHUNKS_TABLE}_id_seq RENAME TO {CHUNKS_TABLE}_id_seq_unpartitioned"))
+
+    create_partitioned_chunks_table(conn, partitions)
+    moved = conn.execute(text(f"""
+        INSERT INTO {CHUNKS_TABLE}
+            (id, document_id, session_id, chunk_text, chunk_index, chunk_hash, token_count, embedding)
+        SELECT dc.id, dc.document_id, d.session_id, dc.chunk_text, dc.chunk_index,
+               dc.chunk_hash, dc.token_count, dc.embedding
+        FROM {CHUNKS_TABLE}_unpartitioned dc
+        JOIN documents d ON d.id = dc.document_id
+    """)).rowcount
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{CHUNKS_TABLE}', 'id'), "
+        f"coalesce((SELECT max(id) FROM {CHUNKS_TABLE}), 0) + 1, false)"
+    ))
+    conn.execute(text(f"DROP TABLE {CHUNKS_TABLE}_unpartitioned"))
+    if had_vector_index:
+        create_chunk_vector_index(conn)
+    return moved
@@ -0,0 +1,239 @@
+"""
+Per-request profiling and SQL query counting.
+Samples the stacks of a profiled request and records the SQL statements every request runs.
+"""
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+import os
+import sys
+import threading
+import time
+import uuid
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config.settings import settings
+
+# Only stacks that pass through application code are kept
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statement text is truncated to this many characters in profiles
+MAX_STATEMENT_CHARS = 2000
+
+
+class QueryStats:
+    """
+    SQL statements run on behalf of one request.
+
+    An instance is put into a context variable for every request. Code that
+    runs in the threadpool sees it too, because the threadpool runs calls in
+    a copy of the request's context.
+    """
+
+    def __init__(self, record_statements: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.record_statements = record_statements
+        self.statements: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            if self.record_statements:
+                self.statements.append({
+                    "statement": statement[:MAX_STATEMENT_CHARS],
+                    "ms": round(seconds * 1000, 3),
+                })
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_query_stats(record_statements: bool = False) -> QueryStats:
+    """
+    Start counting SQL statements for the current request.
+
+    Args:
+        record_statements: Also keep the statement text and duration
+
+    Returns:
+        The QueryStats that statements in this context are added to
+    """
+    stats = QueryStats(record_statements)
+    _query_stats.set(stats)
+    return stats
+
+
+def install_query_hooks(engine: Engine):
+    """
+    Attach the engine events that feed QueryStats.
+
+    Args:
+        engine: SQLAlchemy engine to observe
+    """
+    if getattr(engine, "_query_hooks_installed", False):
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.add(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    engine._query_hooks_installed = True
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples thread stacks at a fixed interval while a profiled request runs.
+
+    cProfile only sees the thread it was enabled in, but a request runs on
+    the event loop and in threadpool workers. The sampler therefore looks at
+    every thread and keeps the stacks that are inside application code.
+    Requests running concurrently on the same worker can show up too.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _fold(frame) -> Optional[str]:
+        """Stack as 'outer;...;inner' frame labels, or None if it never enters the app."""
+        labels = []
+        in_app = False
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename.startswith(APP_ROOT):
+                in_app = True
+            labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        if not in_app:
+            return None
+        return ";".join(reversed(labels))
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                folded = self._fold(frame)
+                if folded is not None:
+                    self.samples[folded] += 1
+            self.sample_count += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfile:
+    """CPU samples and SQL statements of one profiled request."""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.status_code: Optional[int] = None
+        self.queries = start_query_stats(record_statements=True)
+        self.sampler = StackSampler(settings.PROFILE_INTERVAL_MS / 1000.0)
+        self._started = time.perf_counter()
+        self.sampler.start()
+
+    def finish(self, status_code: Optional[int]):
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self._started
+        self.status_code = status_code
+
+    def top_functions(self, limit: int = 25) -> List[Dict]:
+        """
+        Aggregate the samples per function.
+
+        Args:
+            limit: Number of functions to return
+
+        Returns:
+            Functions ordered by samples on top of the stack (self), with
+            samples anywhere in the stack (total)
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self.sampler.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        return [
+            {"function": label, "self": count, "total": total[label]}
+            for label, count in own.most_common(limit)
+        ]
+
+    def folded(self) -> str:
+        """Samples in the collapsed-stack format read by flamegraph tools (e.g. speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.sampler.samples.most_common()) + "\n"
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 1),
+            "query_count": self.queries.count,
+            "query_ms": round(self.queries.seconds * 1000, 1),
+            "samples": self.sampler.sample_count,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            **self.summary(),
+            "interval_ms": settings.PROFILE_INTERVAL_MS,
+            "top_functions": self.top_functions(),
+            "queries": self.queries.statements,
+        }
+
+
+class ProfileStore:
+    """Keeps the most recent profiles of this worker in memory."""
+
+    def __init__(self, max_profiles: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles)]
+
+
+# Global profile store instance
+profile_store = ProfileStore(settings.PROFILE_MAX_STORED)
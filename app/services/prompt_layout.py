@@ -0,0 +1,120 @@
+"""
+Prompt layout for chat requests.
+Puts the parts that repeat across turns first, so providers can serve them from their prompt cache.
+"""
+from typing import List, Tuple
+import hashlib
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session, undefer
+from app.models.models import Document, SessionDocument
+from app.services.blob_store import get_document_text
+from app.services.token_budget import CHARS_PER_TOKEN, estimate_tokens
+
+# Same for every session and turn, so it is always part of the cached prefix
+INSTRUCTIONS = (
+    "You are a helpful AI assistant. Answer the user's question using any pinned "
+    "documents below and the context from uploaded documents sent with the "
+    "question. If they don't contain relevant information, you can use your "
+    "general knowledge. Provide a helpful and accurate response based on the "
+    "context and conversation history."
+)
+
+
+def load_pinned_context(db: Session, session_id: int, max_tokens: int) -> str:
+    """
+    Full text of the documents pinned in a session, in a stable order.
+
+    Pinned documents are the session's own documents with `pinned` set and
+    attached library documents whose attachment is pinned. They are
+    concatenated by document id, so the text is identical on every turn
+    until a document is pinned or unpinned. The document that crosses
+    max_tokens is cut off and later ones are left out.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+        max_tokens: Token budget for the pinned text (0 disables pinning)
+
+    Returns:
+        Pinned documents as "[filename]" headed blocks, or "" if none
+    """
+    if max_tokens <= 0:
+        return ""
+
+    pinned_ids = union_all(
+        select(Document.id).where(Document.session_id == session_id, Document.pinned.is_(True)),
+        select(SessionDocument.document_id).where(
+            SessionDocument.session_id == session_id, SessionDocument.pinned.is_(True)
+        )
+    )
+    documents = db.query(Document).options(undefer(Document.content)).filter(
+        Document.id.in_(pinned_ids)
+    ).order_by(Document.id).all()
+
+    blocks = []
+    remaining = max_tokens
+    for document in documents:
+        block = f"[{document.filename}]\n{get_document_text(document) or ''}"
+        tokens = estimate_tokens(block)
+        if tokens > remaining:
+            blocks.append(block[:remaining * CHARS_PER_TOKEN])
+            break
+        blocks.append(block)
+        remaining -= tokens
+    return "\n\n".join(blocks)
+
+
+def build_messages(
+    pinned_context: str,
+    history: List[Tuple[str, str]],
+    context: str,
+    user_message: str
+) -> List[BaseMessage]:
+    """
+    Lay out a chat prompt from its most to its least stable part.
+
+    1. System message: fixed instructions and the pinned documents
+    2. Conversation history
+    3. The retrieved context and the question, which change every turn
+
+    Each turn's prompt therefore starts with the previous turn's prompt up
+    to its last message, which providers can serve from their prompt cache.
+
+    Args:
+        pinned_context: Output of load_pinned_context()
+        history: (role, content) pairs, oldest first
+        context: Retrieved chunks packed into the context budget
+        user_message: The user's question
+
+    Returns:
+        LangChain messages to send
+    """
+    system_message = INSTRUCTIONS
+    if pinned_context:
+        system_message += f"\n\nPinned documents:\n\n{pinned_context}"
+    messages: List[BaseMessage] = [SystemMessage(content=system_message)]
+
+    for role, content in history:
+        if role == "user":
+            messages.append(HumanMessage(content=content))
+        else:
+            messages.append(AIMessage(content=content))
+
+    if context:
+        user_message = f"Context from documents:\n{context}\n\nQuestion: {user_message}"
+    messages.append(HumanMessage(content=user_message))
+    return messages
+
+
+def prefix_key(messages: List[BaseMessage]) -> str:
+    """
+    Short hash of the system message, identifying prompts with the same cacheable prefix.
+
+    Args:
+        messages: Output of build_messages()
+
+    Returns:
+        16 hex characters
+    """
+    return hashlib.sha256(messages[0].content.encode("utf-8")).hexdigest()[:16]
@@ -2,13 +2,142 @@
 RAG (Retrieval Augmented Generation) service.
 Implements the core chatbot logic with context retrieval and generation.
 """
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as StageTimeout
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List, Tuple
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from app.models.models import Message, DocumentChunk
+from sqlalchemy import text, func
+from sqlalchemy.engine import Connection
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+import contextvars
+import logging
+import threading
+import time
+import numpy as np
+from app.config.database import read_router
+from app.config.settings import settings
+from app.models.models import Message, DocumentChunk, Session as ChatSession
 from app.services.llm_service import llm_service
 from app.services.embedding_service import embedding_service
+from app.services.chunk_windows import expand_hits
+from app.services.library_service import session_chunk_filter
+from app.services.partition_service import ITERATIVE_SCAN_VERSION, hnsw_scan_settings, pgvector_version
+from app.services.prompt_layout import build_messages, load_pinned_context, prefix_key
+from app.services.reembedding_service import embedding_model_check
+from app.services.token_budget import RetrievedChunk, estimate_tokens, pack_chunks
+from app.services.vector_cache import vector_cache, SessionVectors, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Similar chunks among the session's own and attached documents. Each branch
+# filters on document_chunks.session_id, so with a partitioned table it reads
+# a single partition (the session's, or the one holding library chunks)
+_SIMILARITY_SQL = """
+    (
+        SELECT {columns}, dc.embedding <=> {embedding} AS distance
+        FROM document_chunks dc
+        WHERE dc.session_id = {session_id}
+        ORDER BY distance
+        LIMIT {top_k}
+    )
+    UNION ALL
+    (
+        SELECT {columns}, dc.embedding <=> {embedding} AS distance
+        FROM document_chunks dc
+        WHERE dc.session_id IS NULL
+          AND dc.document_id IN (SELECT document_id FROM session_documents WHERE session_id = {session_id})
+        ORDER BY distance
+        LIMIT {top_k}
+    )
+    ORDER BY distance
+    LIMIT {top_k}
+"""
+
+# With CHUNK_NEIGHBOR_WINDOW: the same hits, each joined with the chunks
+# around it through (document_id, chunk_index) in the same round trip. The
+# lookup repeats the session filter of the hit's branch for partition pruning
+_WINDOW_SQL = """
+    WITH hits AS (
+        {hits}
+    )
+    SELECT h.document_id, h.chunk_index, h.distance, n.chunk_index, n.chunk_text, n.token_count
+    FROM hits h
+    CROSS JOIN LATERAL (
+        SELECT dc.chunk_index, dc.chunk_text, dc.token_count
+        FROM document_chunks dc
+        WHERE h.session_id IS NOT NULL
+          AND dc.session_id = {session_id}
+          AND dc.document_id = h.document_id
+          AND dc.chunk_index BETWEEN h.chunk_index - {window} AND h.chunk_index + {window}
+        UNION ALL
+        SELECT dc.chunk_index, dc.chunk_text, dc.token_count
+        FROM document_chunks dc
+        WHERE h.session_id IS NULL
+          AND dc.session_id IS NULL
+          AND dc.document_id = h.document_id
+          AND dc.chunk_index BETWEEN h.chunk_index - {window} AND h.chunk_index + {window}
+    ) n
+    ORDER BY h.distance, h.document_id, h.chunk_index, n.chunk_index
+"""
+
+
+def _similarity_sql(embedding: str, session_id: str, top_k: str, window: Optional[str] = None) -> str:
+    """Similarity query with the given placeholders, expanded by neighbour windows if window is given."""
+    if window is None:
+        return _SIMILARITY_SQL.format(
+            columns="dc.chunk_text, dc.token_count", embedding=embedding, session_id=session_id, top_k=top_k
+        )
+    hits = _SIMILARITY_SQL.format(
+        columns="dc.document_id, dc.chunk_index, dc.session_id",
+        embedding=embedding, session_id=session_id, top_k=top_k
+    )
+    return _WINDOW_SQL.format(hits=hits, session_id=session_id, window=window)
+
+
+_SIMILARITY_QUERY = text(_similarity_sql("CAST(:embedding AS vector)", ":session_id", ":top_k"))
+_WINDOW_QUERY = text(_similarity_sql("CAST(:embedding AS vector)", ":session_id", ":top_k", ":window"))
+
+# Prepared variants, created once per connection
+SIMILARITY_STATEMENT = "rag_similarity"
+_PREPARE_SIMILARITY = text(
+    f"PREPARE {SIMILARITY_STATEMENT} (vector, integer, integer) AS"
+    + _similarity_sql("$1", "$2", "$3")
+)
+_EXECUTE_SIMILARITY = text(f"EXECUTE {SIMILARITY_STATEMENT} (:embedding, :session_id, :top_k)")
+WINDOW_STATEMENT = "rag_similarity_window"
+_PREPARE_WINDOW = text(
+    f"PREPARE {WINDOW_STATEMENT} (vector, integer, integer, integer) AS"
+    + _similarity_sql("$1", "$2", "$3", "$4")
+)
+_EXECUTE_WINDOW = text(f"EXECUTE {WINDOW_STATEMENT} (:embedding, :session_id, :top_k, :window)")
+
+# Per-transaction settings for searches through the HNSW index
+_SET_LOCAL = text("SELECT set_config(:name, :value, true)")
+_EXACT_SCAN = text("SELECT set_config('enable_indexscan', 'off', true)")
+
+# Ways a response can be produced, counted in get_path_stats()
+ANSWER_PATHS = ("extractive", "llm_with_context", "llm_without_context", "llm_unavailable")
+
+# Stages a chat request runs at once with RAG_PARALLEL_STAGES, each on its own connection
+RAG_STAGES = ("retrieval", "history", "pinned")
+
+EXTRACTIVE_ANSWER_PREFIX = "Here is the passage from your documents that answers this:\n\n"
+
+
+def database_connections_needed() -> int:
+    """
+    Primary database connections one worker may hold at once.
+    
+    Every admitted chat request holds its own connection and, with
+    RAG_PARALLEL_STAGES, one per stage; a stage that timed out keeps its
+    connection until it finishes, which the stage pool also bounds. Every
+    admitted upload holds one.
+    
+    Returns:
+        Connections needed for CHAT_ and UPLOAD_MAX_CONCURRENCY
+    """
+    per_chat = 1 + (len(RAG_STAGES) if settings.RAG_PARALLEL_STAGES else 0)
+    return settings.CHAT_MAX_CONCURRENCY * per_chat + settings.UPLOAD_MAX_CONCURRENCY
 
 
 class RAGService:
@@ -17,10 +146,23 @@ class RAGService:
     
     This service implements the core chatbot logic by:
     1. Retrieving relevant document chunks using vector similarity search
-    2. Building context from relevant documents
+    2. Packing the most relevant chunks into a token budget as context
     3. Retrieving conversation history for context awareness
     4. Generating responses using the LLM with the retrieved context
     
+    Steps 1 and 3 (and loading the session's pinned documents) are
+    independent, so they run concurrently, each with its own database
+    session and timeout, and the time before the LLM call is that of the
+    slowest one.
+    
+    Prompts start with the fixed instructions and pinned documents and end
+    with the retrieved context and question, so consecutive turns share a
+    prefix that providers can serve from their prompt cache.
+    
+    Retrieved chunks are gated by their distance: chunks beyond
+    RELEVANCE_MAX_DISTANCE are dropped, and with EXTRACTIVE_ANSWERS a
+    near-exact match is returned directly instead of calling the LLM.
+    
     The RAG approach enhances the LLM's responses by grounding them in
     user-provided documents, ensuring more accurate and contextually
     relevant answers.
@@ -30,61 +172,379 @@ class RAGService:
         """Initialize RAG service."""
         self.llm = None
         self.embedding_service = embedding_service
+        self.vector_cache = vector_cache
+        # Enough threads for every stage of every admitted chat request
+        self._stage_executor = ThreadPoolExecutor(
+            max_workers=settings.CHAT_MAX_CONCURRENCY * len(RAG_STAGES),
+            thread_name_prefix="rag-stage"
+        )
+        self._stats_lock = threading.Lock()
+        self._stage_timeouts = {name: 0 for name in RAG_STAGES}
+        self._stage_errors = {name: 0 for name in RAG_STAGES}
+        self._answer_paths = {path: 0 for path in ANSWER_PATHS}
+        self._chunks_below_cutoff = 0
+    
+    def _start_stage(self, function: Callable[..., T], session_key: Optional[str], *args) -> "Future[T]":
+        """
+        Run function(db, *args) in the stage pool with a read session of its own.
+        
+        The stage runs in a copy of the caller's context, so context
+        variables such as the request's SQL query counter carry over.
+        
+        Args:
+            function: Stage function taking a database session first
+            session_key: Public session id, used to route reads to the primary
+                right after the session's own writes
+            *args: Further arguments for the function
+            
+        Returns:
+            Future of the function's result
+        """
+        def run():
+            db = read_router.session(session_key)
+            try:
+                return function(db, *args)
+            finally:
+                db.close()
+        
+        return self._stage_executor.submit(contextvars.copy_context().run, run)
+    
+    def _stage_result(self, name: str, future: "Future[T]", deadline: float, default: T) -> T:
+        """
+        Wait for a stage until its deadline.
+        
+        A stage that times out or fails is replaced by default; a timed-out
+        stage keeps running in the background and closes its session when done.
+        
+        Args:
+            name: Stage name for logs and counters
+            future: Future returned by _start_stage
+            deadline: time.monotonic() value to wait until
+            default: Result to use instead
+            
+        Returns:
+            The stage result, or default
+        """
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except StageTimeout:
+            with self._stats_lock:
+                self._stage_timeouts[name] += 1
+            logger.warning(f"RAG stage {name} timed out; continuing without it")
+        except Exception as e:
+            with self._stats_lock:
+                self._stage_errors[name] += 1
+            logger.error(f"RAG stage {name} failed: {str(e)}", exc_info=True)
+        return default
+    
+    def get_stage_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get counters of stages that were left out of a prompt.
+        
+        Returns:
+            Dictionary with timeouts and errors per stage
+        """
+        with self._stats_lock:
+            return {"timeouts": dict(self._stage_timeouts), "errors": dict(self._stage_errors)}
+    
+    def _record_path(self, path: str, chunks_below_cutoff: int = 0):
+        """Count a response by the way it was produced."""
+        with self._stats_lock:
+            self._answer_paths[path] += 1
+            self._chunks_below_cutoff += chunks_below_cutoff
+    
+    def get_path_stats(self) -> Dict[str, int]:
+        """
+        Get counters of how responses were produced.
+        
+        Returns:
+            Dictionary with responses per answer path and the number of
+            retrieved chunks dropped by the relevance cutoff
+        """
+        with self._stats_lock:
+            return {**self._answer_paths, "chunks_below_cutoff": self._chunks_below_cutoff}
+    
+    def _load_session_vectors(self, db: Session, session_id: int) -> Optional[SessionVectors]:
+        """
+        Load all chunk embeddings of a session (including attached library
+        documents) for the vector cache.
+        
+        Args:
+            db: Database session
+            session_id: Session ID
+            
+        Returns:
+            SessionVectors, or None if the session has more chunks than
+            VECTOR_CACHE_MAX_SESSION_CHUNKS and should stay in the database
+        """
+        chunks = session_chunk_filter(session_id)
+        chunk_count = db.query(func.count(DocumentChunk.id)).filter(chunks).scalar()
+        if chunk_count > settings.VECTOR_CACHE_MAX_SESSION_CHUNKS:
+            return None
+        
+        rows = db.query(
+            DocumentChunk.chunk_text,
+            DocumentChunk.token_count,
+            DocumentChunk.embedding,
+            DocumentChunk.document_id,
+            DocumentChunk.chunk_index
+        ).filter(
+            chunks,
+            DocumentChunk.embedding.isnot(None)
+        ).all()
+        
+        if rows:
+            matrix = normalize_rows(np.stack([row.embedding for row in rows]))
+        else:
+            matrix = np.zeros((0, self.embedding_service.get_embedding_dimension()), dtype=np.float32)
+        return SessionVectors(
+            matrix,
+            [row.chunk_text for row in rows],
+            [self._token_count(row.chunk_text, row.token_count) for row in rows],
+            [(row.document_id, row.chunk_index) for row in rows]
+        )
+    
+    @staticmethod
+    def _token_count(chunk_text: str, token_count: Optional[int]) -> int:
+        """Stored token count of a chunk, estimated for chunks ingested before it existed."""
+        return token_count if token_count is not None else estimate_tokens(chunk_text)
+    
+    def _search_cache(
+        self,
+        db: Session,
+        session_id: int,
+        query_embedding: np.ndarray,
+        top_k: int
+    ) -> Optional[List[RetrievedChunk]]:
+        """
+        Answer a similarity search from the in-process vector cache.
+        
+        With CHUNK_NEIGHBOR_WINDOW, the neighbours of each hit are taken from
+        the cached chunks of the session as well.
+        
+        Args:
+            db: Database session, used to load the session on a miss
+            session_id: Session ID
+            query_embedding: Query vector
+            top_k: Number of top results to return
+            
+        Returns:
+            Relevant chunks, or None if the session is not cacheable
+        """
+        entry = self.vector_cache.get(session_id)
+        if entry is None:
+            generation = self.vector_cache.generation(session_id)
+            entry = self._load_session_vectors(db, session_id)
+            if entry is None:
+                return None
+            self.vector_cache.put(session_id, entry, generation)
+        
+        if settings.CHUNK_NEIGHBOR_WINDOW > 0:
+            return entry.search_windows(query_embedding, top_k, settings.CHUNK_NEIGHBOR_WINDOW)
+        return entry.search(query_embedding, top_k)
     
     def retrieve_relevant_chunks(
         self, 
         db: Session, 
         session_id: int, 
         query: str, 
-        top_k: int = 3
-    ) -> List[str]:
+        top_k: Optional[int] = None
+    ) -> List[RetrievedChunk]:
         """
         Retrieve relevant document chunks using vector similarity search.
         
-        Note: For optimal performance with large datasets, ensure database indexes
-        are created on session_id and document_id columns. Use EXPLAIN ANALYZE
-        to monitor query performance.
+        Searches the session's own documents and the library documents
+        attached to it. Chunks are filtered on document_chunks.session_id:
+        the session's own chunks carry its id, library chunks carry NULL and
+        are narrowed to the documents attached through session_documents.
+        With a partitioned table each branch reads a single partition. Use
+        EXPLAIN ANALYZE to monitor query performance.
+        
+        With CHUNK_NEIGHBOR_WINDOW, each of the top_k hits is returned as a
+        passage with that many neighbouring chunks on either side. Chunks
+        shared with a closer hit's passage are not repeated, so fewer than
+        top_k passages may come back.
+        
+        After reembed.py switched to another model, nothing is retrieved
+        until this process is restarted with that model.
         
         Args:
             db: Database session
             session_id: Session ID to filter documents
             query: User query for similarity search
-            top_k: Number of top results to return
+            top_k: Number of top results to return, defaults to RETRIEVAL_CANDIDATES
             
         Returns:
-            List of relevant text chunks
+            Relevant chunks with their distance and token count, closest first
         """
+        top_k = settings.RETRIEVAL_CANDIDATES if top_k is None else top_k
+        
+        # Query vectors of the loaded model cannot be compared with the stored ones
+        if embedding_model_check.problem(db):
+            return []
+        
         # Generate embedding for the query
-        query_embedding = self.embedding_service.generate_embedding(query)
-        
-        # Convert embedding to PostgreSQL array format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-        
-        # Query for similar chunks using pgvector
-        # Join with documents table to filter by session
-        sql_query = text("""
-            SELECT dc.chunk_text, dc.embedding <=> :embedding::vector AS distance
-            FROM document_chunks dc
-            JOIN documents d ON dc.document_id = d.id
-            JOIN sessions s ON d.session_id = s.id
-            WHERE s.id = :session_id
-            ORDER BY distance
-            LIMIT :top_k
-        """)
+        query_embedding = self.embedding_service.encode([query])[0]
         
-        try:
-            result = db.execute(
-                sql_query,
-                {"embedding": embedding_str, "session_id": session_id, "top_k": top_k}
+        # Serve hot sessions from the in-process cache, falling back to the database
+        if settings.VECTOR_CACHE_ENABLED:
+            try:
+                chunks = self._search_cache(db, session_id, query_embedding, top_k)
+                if chunks is not None:
+                    return chunks
+            except Exception as e:
+                db.rollback()
+                self.vector_cache.record_failure()
+                logger.warning(
+                    f"Vector cache search failed for session {session_id}, using the database: {str(e)}",
+                    exc_info=True
+                )
+        
+        return self._search_database(db, session_id, query_embedding, top_k)
+    
+    def _search_database(
+        self,
+        db: Session,
+        session_id: int,
+        query_embedding: np.ndarray,
+        top_k: int
+    ) -> List[RetrievedChunk]:
+        """
+        Run the similarity search in PostgreSQL.
+        
+        The float32 query vector is bound as is (see
+        app.config.vector_binding). With SIMILARITY_PREPARED_STATEMENT the
+        query is parsed and planned once per connection and only executed
+        afterwards. With CHUNK_NEIGHBOR_WINDOW the neighbours of the hits are
+        fetched by the same query.
+        
+        With DOCUMENT_CHUNKS_VECTOR_INDEX the HNSW scan is widened so the
+        session filter still leaves top_k rows; on pgvector before 0.8 a
+        search that comes back short is repeated as an exact scan.
+        
+        Args:
+            db: Database session
+            session_id: Session ID to filter documents
+            query_embedding: Query vector
+            top_k: Number of top results to return
+            
+        Returns:
+            Relevant chunks with their distance and token count, closest first
+        """
+        params = {"embedding": query_embedding, "session_id": session_id, "top_k": top_k}
+        window = settings.CHUNK_NEIGHBOR_WINDOW
+        if window > 0:
+            statement, prepare, execute, query = WINDOW_STATEMENT, _PREPARE_WINDOW, _EXECUTE_WINDOW, _WINDOW_QUERY
+            params["window"] = window
+        else:
+            statement, prepare, execute, query = (
+                SIMILARITY_STATEMENT, _PREPARE_SIMILARITY, _EXECUTE_SIMILARITY, _SIMILARITY_QUERY
             )
-
-            chunks = [row[0] for row in result.fetchall()]
-            return chunks
-        except Exception:
+        connection = None
+        try:
+            iterative = True
+            if settings.DOCUMENT_CHUNKS_VECTOR_INDEX:
+                iterative = self._configure_hnsw_scan(db, top_k)
+            if settings.SIMILARITY_PREPARED_STATEMENT:
+                connection = db.connection()
+                connection_info = connection.connection.info
+                if not connection_info.get(statement):
+                    db.execute(prepare)
+                    connection_info[statement] = True
+                rows = db.execute(execute, params).fetchall()
+            else:
+                rows = db.execute(query, params).fetchall()
+            
+            hit_count = len(rows) if window <= 0 else len({(row[0], row[1]) for row in rows})
+            if not iterative and hit_count < top_k:
+                # The index scan may have stopped before finding top_k chunks
+                # of this session; a fresh plan without index scans reads the
+                # session's chunks exactly (a cached plan would ignore it)
+                db.execute(_EXACT_SCAN)
+                rows = db.execute(query, params).fetchall()
+            
+            if window <= 0:
+                return [
+                    RetrievedChunk(row[0], float(row[2]), self._token_count(row[0], row[1]))
+                    for row in rows
+                ]
+            
+            # One row per hit and neighbour, hits closest first
+            hits = []
+            chunks = {}
+            for document_id, hit_index, distance, chunk_index, chunk_text, token_count in rows:
+                if not hits or hits[-1][:2] != (document_id, hit_index):
+                    hits.append((document_id, hit_index, float(distance)))
+                chunks[(document_id, chunk_index)] = (chunk_text, self._token_count(chunk_text, token_count))
+            return expand_hits(hits, chunks, window)
+        except Exception as e:
+            if connection is not None:
+                self._discard_prepared(connection, statement, e)
             # Ensure the failed transaction does not poison subsequent queries
             db.rollback()
             return []
     
+    def _configure_hnsw_scan(self, db: Session, top_k: int) -> bool:
+        """
+        Set up the current transaction's HNSW scans to find top_k chunks of a session.
+        
+        See partition_service.hnsw_scan_settings(). The pgvector version is
+        looked up once per connection.
+        
+        Args:
+            db: Database session
+            top_k: Number of chunks the search asks for
+            
+        Returns:
+            True if the index scan continues until top_k rows pass the
+            session filter, False if the caller has to check the row count
+        """
+        connection_info = db.connection().connection.info
+        version = connection_info.get("pgvector_version")
+        if version is None:
+            version = connection_info["pgvector_version"] = pgvector_version(db.connection())
+        for name, value in hnsw_scan_settings(version, top_k).items():
+            db.execute(_SET_LOCAL, {"name": name, "value": value})
+        return version >= ITERATIVE_SCAN_VERSION
+    
+    def _discard_prepared(self, connection: Connection, statement: str, error: Exception):
+        """
+        Make the next search on a connection prepare its statement again.
+        
+        A rollback does not undo PREPARE, so after a failed search the
+        statement may still exist and preparing it again would fail on every
+        later search. Unless the error says it does not exist (SQLSTATE
+        26000), it is deallocated on the same connection before the session
+        gives the connection back; if that fails, the connection is
+        invalidated so the pool replaces it.
+        
+        Args:
+            connection: Connection the search ran on
+            statement: Name of the prepared statement
+            error: Exception raised by the search
+        """
+        if connection.invalidated:
+            # Lost connection: the pool replaces it along with its statements
+            return
+        connection.connection.info.pop(statement, None)
+        if getattr(getattr(error, "orig", None), "pgcode", None) == "26000":
+            return
+        dbapi_connection = connection.connection.dbapi_connection
+        try:
+            # End the failed transaction first; DEALLOCATE fails with 26000
+            # if the statement was never prepared
+            dbapi_connection.rollback()
+            with dbapi_connection.cursor() as cursor:
+                try:
+                    cursor.execute(f"DEALLOCATE {statement}")
+                except Exception as e:
+                    if getattr(e, "pgcode", None) != "26000":
+                        raise
+            dbapi_connection.rollback()
+        except Exception:
+            logger.warning(f"Could not deallocate {statement}; discarding the connection", exc_info=True)
+            connection.invalidate()
+    
     def get_conversation_history(self, db: Session, session_id: int, limit: int = 10) -> List[Tuple[str, str]]:
         """
         Retrieve recent conversation history.
@@ -97,76 +557,120 @@ class RAGService:
         Returns:
             List of (role, content) tuples
         """
-        messages = db.query(Message).filter(
-            Message.session_id == session_id
-        ).order_by(Message.created_at.desc()).limit(limit).all()
+        query = db.query(Message).filter(Message.session_id == session_id)
+        
+        # No message predates its session; with a partitioned messages table
+        # this bound lets PostgreSQL skip partitions older than the session
+        if settings.MESSAGES_PARTITIONING:
+            session_created_at = db.query(ChatSession.created_at).filter(
+                ChatSession.id == session_id
+            ).scalar_subquery()
+            query = query.filter(Message.created_at >= session_created_at)
+        
+        # Both messages of a turn share created_at, so break ties by id
+        messages = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
         
         # Reverse to get chronological order
         messages = list(reversed(messages))
         
         return [(msg.role, msg.content) for msg in messages]
     
+    def get_pinned_context(self, db: Session, session_id: int) -> str:
+        """
+        Load the documents pinned in a session for the cacheable prompt prefix.
+        
+        Args:
+            db: Database session
+            session_id: Session ID
+            
+        Returns:
+            Pinned document text within PROMPT_PINNED_MAX_TOKENS, or ""
+        """
+        return load_pinned_context(db, session_id, settings.PROMPT_PINNED_MAX_TOKENS)
+    
     def generate_response(
         self, 
         db: Session, 
         session_id: int, 
-        user_message: str
+        user_message: str,
+        session_key: Optional[str] = None
     ) -> str:
         """
         Generate chatbot response using RAG.
         
         Args:
-            db: Database session
+            db: Database session (used directly only when RAG_PARALLEL_STAGES is off)
             session_id: Session ID
             user_message: User's message
+            session_key: Public session id; retrieval and history are read
+                from a replica unless this session was just written
             
         Returns:
             Generated response
         """
-        # Retrieve relevant document chunks
-        try:
-            relevant_chunks = self.retrieve_relevant_chunks(db, session_id, user_message)
-        except Exception:
-            relevant_chunks = []
+        history_stage = None
+        if settings.RAG_PARALLEL_STAGES:
+            # Retrieval (query embedding + vector search), history and pinned
+            # documents are independent: load them at once on their own connections
+            started = time.monotonic()
+            retrieval = self._start_stage(self.retrieve_relevant_chunks, session_key, session_id, user_message)
+            history_stage = self._start_stage(self.get_conversation_history, session_key, session_id)
+            pinned_stage = self._start_stage(self.get_pinned_context, session_key, session_id)
+            relevant_chunks = self._stage_result(
+                "retrieval", retrieval, started + settings.RETRIEVAL_TIMEOUT_SECONDS, []
+            )
+        else:
+            # Retrieve relevant document chunks
+            try:
+                relevant_chunks = self.retrieve_relevant_chunks(db, session_id, user_message)
+            except Exception:
+                relevant_chunks = []
         
-        # Get conversation history
-        history = self.get_conversation_history(db, session_id)
+        # Chunks beyond the relevance cutoff would only add noise to the prompt
+        retrieved_count = len(relevant_chunks)
+        relevant_chunks = [
+            chunk for chunk in relevant_chunks if chunk.distance <= settings.RELEVANCE_MAX_DISTANCE
+        ]
+        below_cutoff = retrieved_count - len(relevant_chunks)
         
-        # Build context from relevant chunks
-        context = ""
-        if relevant_chunks:
-            context = "\n\n".join(relevant_chunks)
+        # A near-exact match answers the question by itself (chunks are
+        # ordered closest first); the history is not needed then
+        if (
+            settings.EXTRACTIVE_ANSWERS
+            and relevant_chunks
+            and relevant_chunks[0].distance <= settings.EXTRACTIVE_MAX_DISTANCE
+        ):
+            self._record_path("extractive", below_cutoff)
+            return EXTRACTIVE_ANSWER_PREFIX + relevant_chunks[0].text
         
-        # Create the prompt template
-        if context:
-            system_message = f"""You are a helpful AI assistant. Use the following context from uploaded documents to answer the user's question. If the context doesn't contain relevant information, you can use your general knowledge.
-
-Context from documents:
-{context}
-
-Provide a helpful and accurate response based on the context and conversation history."""
+        # Get conversation history and pinned documents
+        if history_stage is not None:
+            history = self._stage_result(
+                "history", history_stage, started + settings.HISTORY_TIMEOUT_SECONDS, []
+            )
+            pinned_context = self._stage_result(
+                "pinned", pinned_stage, started + settings.HISTORY_TIMEOUT_SECONDS, ""
+            )
         else:
-            system_message = "You are a helpful AI assistant. Provide accurate and helpful responses to user questions."
+            history = self.get_conversation_history(db, session_id)
+            pinned_context = self.get_pinned_context(db, session_id)
         
-        # Build message history for LangChain using BaseMessage types
-        messages = [SystemMessage(content=system_message)]
-
-        # Add conversation history
-        for role, content in history:
-            if role == "user":
-                messages.append(HumanMessage(content=content))
-            else:
-                messages.append(AIMessage(content=content))
-
-        # Add current user message
-        messages.append(HumanMessage(content=user_message))
+        # Build context from the best chunks that fit into the token budget
+        context = ""
+        if relevant_chunks:
+            context = "\n\n".join(chunk.text for chunk in pack_chunks(relevant_chunks))
+        
+        # Stable parts first (instructions, pinned documents, history), the
+        # retrieved context and question last
+        messages = build_messages(pinned_context, history, context, user_message)
 
         # Generate response using LLM (with graceful fallback if unavailable)
         try:
-            llm = llm_service.get_llm()
-            response = llm.invoke(messages)
+            response = llm_service.invoke(messages, cache_key=prefix_key(messages))
+            self._record_path("llm_with_context" if context else "llm_without_context", below_cutoff)
             return response.content if hasattr(response, "content") else str(response)
         except Exception:
+            self._record_path("llm_unavailable", below_cutoff)
             if context:
                 trimmed_context = context[:1000]
                 return (
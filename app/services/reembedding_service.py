@@ -0,0 +1,477 @@
+"""
+Bulk re-embedding of document chunks for an embedding model change.
+Writes new vectors into a shadow column in checkpointed id ranges, then swaps columns atomically.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+import multiprocessing
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.services.encode_pool import set_torch_threads
+from app.services.partition_service import CHUNKS_VECTOR_INDEX
+
+logger = logging.getLogger(__name__)
+
+SHADOW_COLUMN = "embedding_next"
+PREVIOUS_COLUMN = "embedding_prev"
+
+# The vector index follows its column through a switch under these names
+SHADOW_INDEX = f"{CHUNKS_VECTOR_INDEX}_next"
+PREVIOUS_INDEX = f"{CHUNKS_VECTOR_INDEX}_prev"
+
+# Arbitrary application-wide key so only one coordinator runs at a time
+REEMBED_LOCK_KEY = 727_034
+
+_STATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS reembed_jobs (
+        model VARCHAR(255) PRIMARY KEY,
+        dimension INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+        switched_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reembed_ranges (
+        model VARCHAR(255) NOT NULL REFERENCES reembed_jobs (model) ON DELETE CASCADE,
+        range_start BIGINT NOT NULL,
+        range_end BIGINT NOT NULL,
+        chunks INTEGER,
+        done_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (model, range_start)
+    )
+    """,
+]
+
+
+def _column_dimension(conn: Connection, column: str) -> Optional[int]:
+    """Dimension of a vector column of document_chunks, or None if it does not exist."""
+    return conn.execute(text("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'document_chunks'::regclass AND attname = :column AND NOT attisdropped
+    """), {"column": column}).scalar()
+
+
+def _index_exists(conn: Connection, name: str) -> bool:
+    """Check whether an index exists in the public schema."""
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"public.{name}"}).scalar()
+
+
+def ensure_job(conn: Connection, model: str, dimension: int, range_size: int, restart: bool = False):
+    """
+    Prepare the shadow column and the checkpoint ranges for a model.
+
+    An unfinished job for the same model is resumed as is. Starting a job
+    for a different model discards the shadow column of the previous one.
+
+    Args:
+        conn: Database connection
+        model: Target sentence-transformers model name
+        dimension: Embedding dimension of the target model
+        range_size: Chunk ids per checkpointed range
+        restart: Discard progress of an existing job for this model
+    """
+    for statement in _STATE_TABLES:
+        conn.execute(text(statement))
+
+    running = conn.execute(text(
+        "SELECT model, dimension FROM reembed_jobs WHERE status = 'running'"
+    )).fetchall()
+    resuming = [row for row in running if row.model == model and row.dimension == dimension]
+
+    if restart or not resuming:
+        conn.execute(text("DELETE FROM reembed_jobs WHERE status = 'running' OR model = :model"), {"model": model})
+        conn.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {SHADOW_COLUMN}"))
+        conn.execute(text(f"ALTER TABLE document_chunks ADD COLUMN {SHADOW_COLUMN} vector({dimension})"))
+        conn.execute(text(
+            "INSERT INTO reembed_jobs (model, dimension, status) VALUES (:model, :dimension, 'running')"
+        ), {"model": model, "dimension": dimension})
+
+    add_missing_ranges(conn, model, range_size)
+
+
+def add_missing_ranges(conn: Connection, model: str, range_size: int):
+    """
+    Create checkpoint ranges up to the current highest chunk id.
+
+    Re-running this after new uploads extends the job to the new chunks.
+
+    Args:
+        conn: Database connection
+        model: Target model of the job
+        range_size: Chunk ids per range
+    """
+    max_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM document_chunks")).scalar()
+    covered = conn.execute(text(
+        "SELECT coalesce(max(range_end), 0) FROM reembed_ranges WHERE model = :model"
+    ), {"model": model}).scalar()
+    if max_id < covered:
+        return
+    conn.execute(text("""
+        INSERT INTO reembed_ranges (model, range_start, range_end)
+        SELECT :model, start, start + :range_size
+        FROM generate_series(CAST(:covered AS bigint), CAST(:max_id AS bigint), CAST(:range_size AS bigint)) AS start
+        ON CONFLICT DO NOTHING
+    """), {"model": model, "covered": covered, "max_id": max_id, "range_size": range_size})
+
+
+def pending_ranges(conn: Connection, model: str) -> List[Tuple[int, int]]:
+    """
+    List ranges that still need embedding.
+
+    Args:
+        conn: Database connection
+        model: Target model of the job
+
+    Returns:
+        (range_start, range_end) tuples; range_end is exclusive
+    """
+    return [tuple(row) for row in conn.execute(text("""
+        SELECT range_start, range_end FROM reembed_ranges
+        WHERE model = :model AND done_at IS NULL
+        ORDER BY range_start
+    """), {"model": model}).fetchall()]
+
+
+def job_status(conn: Connection) -> List[Dict]:
+    """
+    Summarize all re-embedding jobs.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        One dictionary per job with range and chunk counts
+    """
+    for statement in _STATE_TABLES:
+        conn.execute(text(statement))
+    return [dict(row._mapping) for row in conn.execute(text("""
+        SELECT j.model, j.dimension, j.status, j.started_at, j.switched_at,
+               count(r.range_start) AS ranges,
+               count(r.done_at) AS ranges_done,
+               coalesce(sum(r.chunks), 0) AS chunks_done
+        FROM reembed_jobs j
+        LEFT JOIN reembed_ranges r ON r.model = j.model
+        GROUP BY j.model
+        ORDER BY j.started_at
+    """)).fetchall()]
+
+
+# --- Worker processes --------------------------------------------------------
+
+_worker_model = None
+_worker_engine: Optional[Engine] = None
+_worker_batch_size = 256
+
+
+def _init_worker(model_name: str, database_url: str, batch_size: int, threads: int):
+    """Load the target model and open a database engine once per worker process."""
+    global _worker_model, _worker_engine, _worker_batch_size
+    set_torch_threads(threads)
+    from sentence_transformers import SentenceTransformer
+
+    _worker_model = SentenceTransformer(model_name)
+    _worker_engine = create_engine(database_url, pool_size=1, max_overflow=0)
+    _worker_batch_size = batch_size
+
+
+def _embed_rows(conn: Connection, rows: List[Tuple[int, str]]):
+    """Embed (id, text) rows with the worker model and write them to the shadow column."""
+    from pgvector.utils import to_db
+
+    embeddings = _worker_model.encode(
+        [row[1] for row in rows],
+        batch_size=_worker_batch_size,
+        convert_to_numpy=True
+    )
+    cursor = conn.connection.cursor()
+    try:
+        from psycopg2.extras import execute_values
+        execute_values(
+            cursor,
+            f"UPDATE document_chunks AS dc SET {SHADOW_COLUMN} = CAST(v.embedding AS vector) "
+            f"FROM (VALUES %s) AS v (id, embedding) WHERE dc.id = v.id",
+            [(row[0], to_db(embedding)) for row, embedding in zip(rows, embeddings)],
+            page_size=1000
+        )
+    finally:
+        cursor.close()
+
+
+def _process_range(task: Tuple[str, int, int]) -> Tuple[int, int]:
+    """
+    Embed every chunk in one id range and checkpoint it in the same transaction.
+
+    Returns:
+        (range_start, chunks embedded)
+    """
+    model, start, end = task
+    with _worker_engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT id, chunk_text FROM document_chunks
+            WHERE id >= :start AND id < :end AND {SHADOW_COLUMN} IS NULL
+            ORDER BY id
+        """), {"start": start, "end": end}).fetchall()
+        if rows:
+            _embed_rows(conn, rows)
+        conn.execute(text("""
+            UPDATE reembed_ranges SET done_at = now(), chunks = :chunks
+            WHERE model = :model AND range_start = :start
+        """), {"chunks": len(rows), "model": model, "start": start})
+        conn.commit()
+    return start, len(rows)
+
+
+def run_job(
+    engine: Engine,
+    model: str,
+    workers: int,
+    batch_size: int,
+    threads_per_worker: int
+) -> Iterator[Dict[str, float]]:
+    """
+    Embed all pending ranges of a job with a pool of worker processes.
+
+    Progress is checkpointed per range, so an interrupted run resumes where
+    it stopped.
+
+    Args:
+        engine: Database engine of the coordinator
+        model: Target model of the job
+        workers: Number of worker processes
+        batch_size: Texts per encode batch
+        threads_per_worker: Torch threads per worker (0 keeps the default)
+
+    Yields:
+        Progress dictionaries with ranges done, chunks done and chunks/sec
+    """
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": REEMBED_LOCK_KEY}).scalar():
+            raise RuntimeError("Another re-embedding run is already in progress")
+        try:
+            ranges = pending_ranges(conn, model)
+            conn.commit()
+            if not ranges:
+                return
+
+            ctx = multiprocessing.get_context("spawn")
+            started = time.monotonic()
+            chunks = 0
+            with ctx.Pool(
+                processes=workers,
+                initializer=_init_worker,
+                initargs=(model, engine.url.render_as_string(hide_password=False), batch_size, threads_per_worker)
+            ) as pool:
+                tasks = [(model, start, end) for start, end in ranges]
+                for done, (_, count) in enumerate(pool.imap_unordered(_process_range, tasks), start=1):
+                    chunks += count
+                    elapsed = time.monotonic() - started
+                    yield {
+                        "ranges_done": done,
+                        "ranges_total": len(ranges),
+                        "chunks": chunks,
+                        "chunks_per_sec": chunks / elapsed if elapsed else 0.0,
+                    }
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REEMBED_LOCK_KEY})
+            conn.commit()
+
+
+def switch_to_model(engine: Engine, model: str, batch_size: int = 256) -> int:
+    """
+    Make the re-embedded vectors the ones retrieval uses, atomically.
+
+    Chunks added since the job started are embedded first. If the current
+    column has a vector index, the same index is built on the new column
+    before the switch. Then, holding an exclusive lock on document_chunks,
+    the few chunks written in the meantime are embedded and the columns and
+    their indexes are renamed in one transaction:
+    embedding -> embedding_prev, embedding_next -> embedding.
+
+    API workers keep the model they loaded until they are restarted;
+    embedding_model_check stops them from using it against the new vectors.
+
+    Args:
+        engine: Database engine
+        model: Target model of a finished job
+        batch_size: Texts per encode batch for the catch-up
+
+    Returns:
+        Number of chunks embedded during the catch-up
+
+    Raises:
+        RuntimeError: If the job does not exist or has unfinished ranges
+    """
+    from sentence_transformers import SentenceTransformer
+
+    global _worker_model, _worker_batch_size
+    _worker_model = SentenceTransformer(model)
+    _worker_batch_size = batch_size
+
+    def catch_up(conn: Connection) -> int:
+        total = 0
+        while True:
+            rows = conn.execute(text(f"""
+                SELECT id, chunk_text FROM document_chunks
+                WHERE {SHADOW_COLUMN} IS NULL ORDER BY id LIMIT 5000
+            """)).fetchall()
+            if not rows:
+                return total
+            _embed_rows(conn, rows)
+            total += len(rows)
+
+    with engine.connect() as conn:
+        job = conn.execute(text("SELECT status FROM reembed_jobs WHERE model = :model"), {"model": model}).scalar()
+        if job != "running":
+            raise RuntimeError(f"No running re-embedding job for {model}")
+        if pending_ranges(conn, model):
+            raise RuntimeError("The job still has pending ranges; run it to completion first")
+
+        embedded = catch_up(conn)
+        conn.commit()
+
+        # Build the index while retrieval still runs; chunks embedded from
+        # here on are indexed as they are written
+        if _index_exists(conn, CHUNKS_VECTOR_INDEX):
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {SHADOW_INDEX} ON document_chunks "
+                f"USING hnsw ({SHADOW_COLUMN} vector_cosine_ops)"
+            ))
+            conn.commit()
+
+        conn.execute(text("LOCK TABLE document_chunks IN ACCESS EXCLUSIVE MODE"))
+        embedded += catch_up(conn)
+        # Dropping the column drops its index too
+        conn.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {PREVIOUS_COLUMN}"))
+        conn.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN embedding TO {PREVIOUS_COLUMN}"))
+        conn.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN {SHADOW_COLUMN} TO embedding"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {CHUNKS_VECTOR_INDEX} RENAME TO {PREVIOUS_INDEX}"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {SHADOW_INDEX} RENAME TO {CHUNKS_VECTOR_INDEX}"))
+        conn.execute(text(
+            "UPDATE reembed_jobs SET status = 'switched', switched_at = :now WHERE model = :model"
+        ), {"now": datetime.now(timezone.utc), "model": model})
+        conn.commit()
+    return embedded
+
+
+def rollback_switch(engine: Engine):
+    """
+    Swap the previous embeddings back in after a switch.
+
+    Args:
+        engine: Database engine
+
+    Raises:
+        RuntimeError: If there is no previous embedding column
+    """
+    with engine.connect() as conn:
+        if _column_dimension(conn, PREVIOUS_COLUMN) is None:
+            raise RuntimeError("No previous embeddings to roll back to")
+        conn.execute(text("LOCK TABLE document_chunks IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN embedding TO {SHADOW_COLUMN}_rolled_back"))
+        conn.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN {PREVIOUS_COLUMN} TO embedding"))
+        conn.execute(text(f"ALTER TABLE document_chunks DROP COLUMN {SHADOW_COLUMN}_rolled_back"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {PREVIOUS_INDEX} RENAME TO {CHUNKS_VECTOR_INDEX}"))
+        conn.execute(text("""
+            UPDATE reembed_jobs SET status = 'rolled_back'
+            WHERE model = (
+                SELECT model FROM reembed_jobs WHERE status = 'switched'
+                ORDER BY switched_at DESC LIMIT 1
+            )
+        """))
+        conn.commit()
+
+
+# --- Model check for the API -------------------------------------------------
+
+class EmbeddingModelMismatchError(RuntimeError):
+    """The stored embeddings were not made by the model this process uses."""
+
+
+def stored_embedding_model(conn: Connection) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Describe the vectors currently in document_chunks.embedding.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        (model, dimension); model is None unless reembed.py switched to one
+    """
+    model = None
+    if conn.execute(text("SELECT to_regclass('public.reembed_jobs') IS NOT NULL")).scalar():
+        model = conn.execute(text(
+            "SELECT model FROM reembed_jobs WHERE status = 'switched' ORDER BY switched_at DESC LIMIT 1"
+        )).scalar()
+    return model, _column_dimension(conn, "embedding")
+
+
+class EmbeddingModelCheck:
+    """
+    Detects a model switch made after this process loaded its model.
+
+    API workers keep the model they loaded at startup while reembed.py
+    switches the stored vectors. Their query vectors would then fail
+    against a column of another dimension, or be ranked against vectors of
+    another model without any error. The stored model is read at most once
+    per interval, so a switch is noticed within that time.
+    """
+
+    def __init__(self, interval_seconds: float = 30.0):
+        self.interval_seconds = interval_seconds
+        self._checked_at: Optional[float] = None
+        self._problem: Optional[str] = None
+
+    def problem(self, db: Session) -> Optional[str]:
+        """
+        Compare the stored embeddings with EMBEDDING_MODEL and EMBEDDING_DIMENSION.
+
+        Args:
+            db: Database session
+
+        Returns:
+            What does not match, or None if the stored embeddings can be used
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.interval_seconds:
+            return self._problem
+
+        model, dimension = stored_embedding_model(db.connection())
+        problem = None
+        if model is not None and model != settings.EMBEDDING_MODEL:
+            problem = (
+                f"Stored embeddings were made by {model} but this process uses "
+                f"{settings.EMBEDDING_MODEL}; restart it with EMBEDDING_MODEL={model}"
+            )
+        elif dimension is not None and dimension != settings.EMBEDDING_DIMENSION:
+            problem = (
+                f"Stored embeddings have {dimension} dimensions but this process uses "
+                f"{settings.EMBEDDING_DIMENSION}; restart it with EMBEDDING_DIMENSION={dimension}"
+            )
+        if problem:
+            logger.error(problem)
+        self._problem, self._checked_at = problem, now
+        return problem
+
+    def ensure(self, db: Session):
+        """
+        Raise if the stored embeddings were made by another model.
+
+        Args:
+            db: Database session
+
+        Raises:
+            EmbeddingModelMismatchError: If they do not match
+        """
+        problem = self.problem(db)
+        if problem:
+            raise EmbeddingModelMismatchError(problem)
+
+
+# Global embedding model check instance
+embedding_model_check = EmbeddingModelCheck()
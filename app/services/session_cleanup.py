@@ -0,0 +1,200 @@
+"""
+Session deletion and expiry service.
+Deletes sessions with set-based statements in bounded batches instead of through the ORM.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import logging
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.models import Session as ChatSession
+from app.services.vector_cache import vector_cache
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_try_advisory_lock, so only one
+# worker sweeps at a time
+SWEEPER_LOCK_KEY = 727_031
+
+_DELETE_CHUNK_BATCH = text("""
+    DELETE FROM document_chunks
+    WHERE session_id = :session_id AND id IN (
+        SELECT id FROM document_chunks
+        WHERE session_id = :session_id
+        LIMIT :batch_size
+    )
+""")
+
+_DELETE_MESSAGE_BATCH = text("""
+    DELETE FROM messages
+    WHERE id IN (
+        SELECT id FROM messages
+        WHERE session_id = :session_id
+        LIMIT :batch_size
+    )
+""")
+
+
+def count_session_rows(db: Session, session_id: int) -> int:
+    """
+    Count the chunk and message rows a session deletion would remove.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+
+    Returns:
+        Number of document chunks plus messages
+    """
+    return db.execute(text("""
+        SELECT
+            (SELECT count(*) FROM document_chunks WHERE session_id = :session_id)
+          + (SELECT count(*) FROM messages WHERE session_id = :session_id)
+    """), {"session_id": session_id}).scalar()
+
+
+def mark_session_deleted(db: Session, session: ChatSession):
+    """
+    Hide a session until its data is purged.
+
+    The public session_id is renamed so it can be reused right away, and
+    deleted_at marks the row for purge_session() and the sweeper.
+
+    Args:
+        db: Database session
+        session: Session to hide
+    """
+    session.session_id = f"{session.session_id[:200]}#deleted-{session.id}"
+    session.deleted_at = datetime.now(timezone.utc)
+    db.commit()
+    vector_cache.invalidate(session.id)
+
+
+def purge_session(db: Session, session_id: int, batch_size: Optional[int] = None):
+    """
+    Delete a session and all its data with set-based statements.
+
+    Chunks and messages are removed in batches of batch_size rows, each in
+    its own transaction, so no single statement holds locks or WAL for the
+    whole session. The session row goes last; ON DELETE CASCADE removes the
+    (by then empty) documents.
+
+    Args:
+        db: Database session
+        session_id: Database id of the session
+        batch_size: Rows per delete statement, defaults to SESSION_PURGE_BATCH_SIZE
+    """
+    batch_size = batch_size or settings.SESSION_PURGE_BATCH_SIZE
+    params = {"session_id": session_id, "batch_size": batch_size}
+
+    for statement in (_DELETE_CHUNK_BATCH, _DELETE_MESSAGE_BATCH):
+        while True:
+            deleted = db.execute(statement, params).rowcount
+            db.commit()
+            if deleted < batch_size:
+                break
+
+    db.execute(text("DELETE FROM sessions WHERE id = :session_id"), params)
+    db.commit()
+    vector_cache.invalidate(session_id)
+
+
+def purge_session_in_background(session_id: int):
+    """
+    Purge a session with its own database session (for BackgroundTasks).
+
+    Args:
+        session_id: Database id of the session
+    """
+    db = SessionLocal()
+    try:
+        purge_session(db, session_id)
+    except Exception as e:
+        db.rollback()
+        # The session stays marked deleted; the sweeper retries it
+        logger.error(f"Error purging session {session_id}: {str(e)}", exc_info=True)
+    finally:
+        db.close()
+
+
+def expire_idle_sessions(
+    db: Session,
+    ttl: Optional[timedelta],
+    batch_size: int,
+    max_batches: int
+) -> int:
+    """
+    Delete sessions idle for longer than ttl, plus any left marked deleted.
+
+    Only one worker sweeps at a time: a PostgreSQL advisory lock is held on
+    a dedicated connection for the duration of the run. Each run handles at
+    most max_batches batches of batch_size sessions so it never runs unbounded.
+    A session whose purge fails is logged and skipped for the rest of the
+    run, so it cannot hold up the others; the next run retries it.
+
+    Args:
+        db: Database session
+        ttl: Idle time after which a session expires; None only finishes
+            purges of sessions already marked deleted
+        batch_size: Sessions per batch
+        max_batches: Maximum batches per run
+
+    Returns:
+        Number of sessions deleted
+    """
+    condition = ChatSession.deleted_at.isnot(None)
+    if ttl is not None:
+        condition = condition | (ChatSession.updated_at < datetime.now(timezone.utc) - ttl)
+
+    deleted = 0
+    failed: List[int] = []
+    with db.get_bind().connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SWEEPER_LOCK_KEY}).scalar():
+            return 0
+        try:
+            for _ in range(max_batches):
+                query = db.query(ChatSession.id).filter(condition)
+                if failed:
+                    query = query.filter(ChatSession.id.notin_(failed))
+                session_ids: List[int] = [
+                    row[0] for row in query.order_by(ChatSession.updated_at).limit(batch_size).all()
+                ]
+                db.commit()
+                for session_id in session_ids:
+                    try:
+                        purge_session(db, session_id)
+                        deleted += 1
+                    except Exception as e:
+                        db.rollback()
+                        failed.append(session_id)
+                        logger.error(f"Error purging session {session_id}: {str(e)}", exc_info=True)
+                if len(session_ids) < batch_size:
+                    break
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SWEEPER_LOCK_KEY})
+            lock_conn.commit()
+
+    if failed:
+        logger.warning(f"Session sweep could not purge {len(failed)} sessions, retrying them next run: {failed}")
+    return deleted
+
+
+def run_session_sweep() -> int:
+    """
+    Run one sweep with a fresh database session using the configured TTL.
+
+    Returns:
+        Number of sessions deleted
+    """
+    db = SessionLocal()
+    try:
+        return expire_idle_sessions(
+            db,
+            ttl=timedelta(hours=settings.SESSION_TTL_HOURS) if settings.SESSION_TTL_HOURS > 0 else None,
+            batch_size=settings.SESSION_SWEEP_BATCH_SIZE,
+            max_batches=settings.SESSION_SWEEP_MAX_BATCHES
+        )
+    finally:
+        db.close()
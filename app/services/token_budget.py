@@ -0,0 +1,102 @@
+"""
+Token counting and token-budgeted context packing.
+Chunk token counts are computed once at ingestion so prompts can be sized without re-tokenizing.
+"""
+from typing import List, NamedTuple, Optional
+import logging
+import math
+from app.config.settings import settings
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough tokens per character for English text when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Tokens taken by the blank line between two chunks in the prompt
+SEPARATOR_TOKENS = 2
+
+_encoding = None
+_encoding_failed = False
+
+
+class RetrievedChunk(NamedTuple):
+    """A chunk returned by similarity search."""
+    text: str
+    distance: float
+    token_count: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of text from its length.
+
+    Args:
+        text: Input text
+
+    Returns:
+        ceil(len(text) / CHARS_PER_TOKEN)
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _get_encoding():
+    """Load the configured tiktoken encoding once, or None if unavailable."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+        except Exception as e:
+            # The encoding files are downloaded on first use and may be unreachable
+            _encoding_failed = True
+            logger.warning(f"Falling back to estimated token counts: {str(e)}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of text.
+
+    Uses tiktoken with TOKENIZER_ENCODING when it is installed and falls
+    back to estimate_tokens() otherwise.
+
+    Args:
+        text: Input text
+
+    Returns:
+        Number of tokens
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_chunks(chunks: List[RetrievedChunk], budget: Optional[int] = None) -> List[RetrievedChunk]:
+    """
+    Select the best chunks that fit into a token budget.
+
+    Chunks are taken greedily in the given (best-first) order; a chunk that
+    does not fit is skipped so a smaller, lower-ranked one can still use
+    the remaining budget.
+
+    Args:
+        chunks: Candidates ordered from most to least relevant
+        budget: Maximum context tokens, defaults to CONTEXT_TOKEN_BUDGET
+
+    Returns:
+        Selected chunks in their original order
+    """
+    budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    selected = []
+    used = 0
+    for chunk in chunks:
+        cost = chunk.token_count + (SEPARATOR_TOKENS if selected else 0)
+        if used + cost <= budget:
+            selected.append(chunk)
+            used += cost
+    return selected
@@ -0,0 +1,274 @@
+"""
+In-process cache of chunk embeddings for active sessions.
+Answers similarity search with a single matrix-vector product instead of a database round trip.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+from app.config.settings import settings
+from app.services.chunk_windows import ChunkPosition, expand_hits, window_positions
+from app.services.token_budget import RetrievedChunk
+
+
+class SessionVectors:
+    """
+    Cached chunks of one session.
+
+    Embeddings are stored as one contiguous float32 matrix with L2-normalized
+    rows, so cosine distance to a query is 1 - matrix @ normalized_query.
+    With positions, neighbouring chunks of a hit can be looked up without
+    going back to the database.
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        texts: List[str],
+        token_counts: List[int],
+        positions: Optional[List[ChunkPosition]] = None
+    ):
+        self.matrix = matrix
+        self.texts = texts
+        self.token_counts = token_counts
+        self.positions = positions or []
+        self._rows_by_position = {position: row for row, position in enumerate(self.positions)}
+        self.loaded_at = time.monotonic()
+        self.nbytes = (
+            matrix.nbytes + sum(len(text) for text in texts) + 8 * len(token_counts) + 16 * len(self.positions)
+        )
+
+    def _nearest(self, query_embedding: np.ndarray, top_k: int):
+        """Rows of the top_k closest chunks, closest first, and all distances."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        distances = 1.0 - self.matrix @ query
+
+        k = min(top_k, len(self.texts))
+        if k < len(self.texts):
+            candidates = np.argpartition(distances, k - 1)[:k]
+        else:
+            candidates = np.arange(len(self.texts))
+        return candidates[np.argsort(distances[candidates], kind="stable")], distances
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> List[RetrievedChunk]:
+        """
+        Find the chunks closest to a query.
+
+        Args:
+            query_embedding: Query vector (not necessarily normalized)
+            top_k: Number of results to return
+
+        Returns:
+            RetrievedChunks ordered by cosine distance
+        """
+        if not self.texts or top_k <= 0:
+            return []
+        ordered, distances = self._nearest(query_embedding, top_k)
+        return [RetrievedChunk(self.texts[i], float(distances[i]), self.token_counts[i]) for i in ordered]
+
+    def search_windows(self, query_embedding: np.ndarray, top_k: int, window: int) -> List[RetrievedChunk]:
+        """
+        Find the chunks closest to a query, each extended with its neighbours.
+
+        Requires positions. Neighbours are looked up among the cached chunks
+        of the session (see chunk_windows.expand_hits).
+
+        Args:
+            query_embedding: Query vector (not necessarily normalized)
+            top_k: Number of hits to expand
+            window: Neighbouring chunks on each side of a hit
+
+        Returns:
+            RetrievedChunks of the merged passages, ordered by cosine distance
+        """
+        if not self.texts or top_k <= 0:
+            return []
+        ordered, distances = self._nearest(query_embedding, top_k)
+        hits = [(*self.positions[i], float(distances[i])) for i in ordered]
+        chunks = {}
+        for hit in hits:
+            for position in window_positions(hit, window):
+                row = self._rows_by_position.get(position)
+                if row is not None:
+                    chunks[position] = (self.texts[row], self.token_counts[row])
+        return expand_hits(hits, chunks, window)
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize embedding rows into a contiguous float32 matrix.
+
+    Args:
+        embeddings: Array of shape (n, dim)
+
+    Returns:
+        Normalized float32 matrix; all-zero rows stay zero
+    """
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SessionVectorCache:
+    """
+    LRU cache of SessionVectors bounded by a memory budget.
+
+    Entries are invalidated explicitly on document upload and session
+    deletion. Invalidation only reaches the current process, so entries also
+    expire after VECTOR_CACHE_TTL_SECONDS to bound staleness when several
+    workers serve the same session.
+
+    A generation number guards against a load that started before an
+    invalidation storing stale data after it. Generations come from one
+    counter, so they only ever grow. Each invalidated session keeps its
+    generation until the entry is older than the TTL. After that it is
+    pruned and its generation folds into a shared floor, which sessions
+    without an entry of their own report.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Memory budget for all cached sessions
+            ttl_seconds: Maximum age of an entry
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, SessionVectors]" = OrderedDict()
+        # session id -> (generation, monotonic time of the invalidation)
+        self._generations: Dict[int, Tuple[int, float]] = {}
+        self._last_generation = 0
+        self._generation_floor = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+
+    def get(self, session_id: int) -> Optional[SessionVectors]:
+        """
+        Look up a session and mark it most recently used.
+
+        Args:
+            session_id: Database id of the session
+
+        Returns:
+            Cached entry, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                self._remove(session_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def generation(self, session_id: int) -> int:
+        """
+        Get the current generation of a session, to be passed back to put().
+
+        Args:
+            session_id: Database id of the session
+
+        Returns:
+            Generation counter
+        """
+        with self._lock:
+            return self._generation(session_id)
+
+    def put(self, session_id: int, entry: SessionVectors, generation: int) -> bool:
+        """
+        Store a freshly loaded session, evicting least recently used ones to fit.
+
+        Args:
+            session_id: Database id of the session
+            entry: Loaded session vectors
+            generation: Value of generation() taken before loading
+
+        Returns:
+            True if the entry was stored
+        """
+        if entry.nbytes > self.max_bytes:
+            return False
+        with self._lock:
+            if self._generation(session_id) != generation:
+                return False
+            self._remove(session_id)
+            while self._entries and self._bytes + entry.nbytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._entries[session_id] = entry
+            self._bytes += entry.nbytes
+            return True
+
+    def invalidate(self, session_id: int):
+        """
+        Drop a session after its documents changed or it was deleted.
+
+        Args:
+            session_id: Database id of the session
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._last_generation += 1
+            self._generations[session_id] = (self._last_generation, now)
+            self._remove(session_id)
+            if len(self._generations) > 10000:
+                cutoff = now - self.ttl_seconds
+                for key, (generation, invalidated_at) in list(self._generations.items()):
+                    if invalidated_at < cutoff:
+                        del self._generations[key]
+                        self._generation_floor = max(self._generation_floor, generation)
+
+    def record_failure(self):
+        """Count a search that failed on the cache and fell back to the database."""
+        with self._lock:
+            self.failures += 1
+
+    def _generation(self, session_id: int) -> int:
+        """Current generation of a session; caller holds the lock."""
+        generation = self._generations.get(session_id)
+        return self._generation_floor if generation is None else generation[0]
+
+    def _remove(self, session_id: int):
+        """Remove an entry; caller holds the lock."""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hits, misses, evictions, failures, sessions and bytes
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "failures": self.failures,
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+# Global vector cache instance
+vector_cache = SessionVectorCache(
+    max_bytes=settings.VECTOR_CACHE_MAX_BYTES,
+    ttl_seconds=settings.VECTOR_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,114 @@
+"""
+Memory and throughput comparison of in-process embeddings vs. the shared embedding server.
+
+Starts N worker processes in each mode, has them embed chat-sized requests
+concurrently, and reports the resident memory of every process involved
+along with the combined throughput.
+
+Usage:
+    python benchmarks/embedding_server_bench.py --workers 8 --requests 200 --batch 1
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mb(pid: str = "self") -> float:
+    """Resident set size of a process in MiB (Linux only)."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def _worker(mode, requests, batch, barrier, results):
+    """Embed `requests` calls of `batch` texts each and report memory and timing."""
+    os.environ["EMBEDDING_MODE"] = mode
+    from app.services.embedding_service import embedding_service
+
+    texts = [f"benchmark query number {i} about retrieval augmented generation" for i in range(batch)]
+    embedding_service.encode(texts)
+    barrier.wait()
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        embedding_service.encode(texts)
+    elapsed = time.perf_counter() - started
+    results.put((rss_mb(), requests * batch, elapsed))
+
+
+def run_mode(mode: str, workers: int, requests: int, batch: int) -> dict:
+    """Run one benchmark round and aggregate worker results."""
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(mode, requests, batch, barrier, results))
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    rows = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    worker_rss = sum(row[0] for row in rows)
+    texts = sum(row[1] for row in rows)
+    wall = max(row[2] for row in rows)
+    return {"worker_rss": worker_rss, "texts_per_sec": texts / wall if wall else 0.0}
+
+
+def start_server(socket_path: str) -> subprocess.Popen:
+    """Start the embedding server and wait until its socket accepts connections."""
+    env = dict(os.environ, EMBEDDING_MODE="server", EMBEDDING_SERVER_SOCKET=socket_path)
+    proc = subprocess.Popen([sys.executable, "-m", "app.services.embedding_server"], cwd=ROOT, env=env)
+    from app.services.embedding_server import EmbeddingClient
+    client = EmbeddingClient(socket_path, timeout=5.0)
+    for _ in range(600):
+        try:
+            client.info()
+            return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("Embedding server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="Worker processes per mode")
+    parser.add_argument("--requests", type=int, default=200, help="encode() calls per worker")
+    parser.add_argument("--batch", type=int, default=1, help="Texts per encode() call")
+    parser.add_argument("--socket", default="/tmp/chatbot-embeddings-bench.sock")
+    args = parser.parse_args()
+
+    print(f"Workers: {args.workers}, requests/worker: {args.requests}, texts/request: {args.batch}\n")
+
+    local = run_mode("local", args.workers, args.requests, args.batch)
+
+    os.environ["EMBEDDING_SERVER_SOCKET"] = args.socket
+    server = start_server(args.socket)
+    try:
+        shared = run_mode("server", args.workers, args.requests, args.batch)
+        shared["server_rss"] = rss_mb(str(server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'mode':<8} {'worker RSS (MiB)':>18} {'server RSS (MiB)':>18} {'total (MiB)':>12} {'texts/sec':>10}")
+    print(f"{'local':<8} {local['worker_rss']:>18.0f} {0:>18.0f} {local['worker_rss']:>12.0f} "
+          f"{local['texts_per_sec']:>10.0f}")
+    total = shared["worker_rss"] + shared["server_rss"]
+    print(f"{'server':<8} {shared['worker_rss']:>18.0f} {shared['server_rss']:>18.0f} {total:>12.0f} "
+          f"{shared['texts_per_sec']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Scaling benchmark for the multi-process embedding encode pool.
+
+Encodes the same ingestion-sized batch in-process and with pools of
+increasing size, and reports throughput and speedup for each.
+
+Usage:
+    python benchmarks/encode_pool_bench.py --texts 4096 --workers 1 2 4 8 --threads-per-worker 1
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.config.settings import settings  # noqa: E402
+from app.services.encode_pool import EncodePool, set_torch_threads  # noqa: E402
+
+
+def make_texts(count: int, length: int):
+    """Chunk-sized texts that differ from each other."""
+    base = "Retrieval augmented generation combines search over documents with a language model. "
+    return [(f"Chunk {i}. " + base * (length // len(base) + 1))[:length] for i in range(count)]
+
+
+def timed(encode, texts, repeat: int) -> float:
+    """Best-of-repeat throughput in texts/sec (one warm-up call first)."""
+    encode(texts[:64])
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(texts)
+        best = min(best, time.perf_counter() - started)
+    return len(texts) / best
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+
+    parser = argparse.ArgumentParser(description="Embedding encode pool scaling benchmark")
+    parser.add_argument("--texts", type=int, default=4096, help="Texts per encode call")
+    parser.add_argument("--length", type=int, default=settings.CHUNK_SIZE, help="Characters per text")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers, help="Pool sizes to try")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.length)
+    print(f"{args.texts} texts of {args.length} chars, model {settings.EMBEDDING_MODEL}, {cpus} CPUs")
+
+    from sentence_transformers import SentenceTransformer
+
+    set_torch_threads(settings.EMBEDDING_THREADS)
+    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    baseline = timed(lambda batch: model.encode(batch, batch_size=args.batch_size), texts, args.repeat)
+    print(f"{'in-process':>24}: {baseline:8.1f} texts/sec")
+
+    for workers in args.workers:
+        pool = EncodePool(
+            settings.EMBEDDING_MODEL,
+            workers,
+            batch_size=args.batch_size,
+            threads_per_worker=args.threads_per_worker
+        )
+        try:
+            throughput = timed(pool.encode, texts, args.repeat)
+        finally:
+            pool.close()
+        label = f"{workers} workers x {args.threads_per_worker} threads"
+        print(f"{label:>24}: {throughput:8.1f} texts/sec  ({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Serialization benchmark for a 10k-message conversation history.
+
+Serves the same in-memory rows through the old path (a Pydantic model per
+row, response_model validation, jsonable_encoder) and through
+FastJSONResponse, with and without response compression, and reports time
+per request and payload size. No database is needed.
+
+Usage:
+    python benchmarks/history_serialization_bench.py --messages 10000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.api.responses import FastJSONResponse, orjson  # noqa: E402
+from app.middleware.compression import CompressionMiddleware, brotli  # noqa: E402
+from app.models.schemas import ConversationHistory, MessageHistory  # noqa: E402
+
+
+def make_rows(count: int):
+    """(role, content, created_at) rows like a long chat session."""
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        (
+            "user" if i % 2 == 0 else "assistant",
+            f"Message {i}: " + "retrieval augmented generation answer text " * 6,
+            started + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def build_app(rows) -> FastAPI:
+    """App with the old and the fast history endpoint over the same rows."""
+    app = FastAPI()
+
+    @app.get("/default", response_model=ConversationHistory)
+    async def default_history():
+        return ConversationHistory(
+            session_id="bench",
+            messages=[
+                MessageHistory(role=role, content=content, created_at=created_at)
+                for role, content, created_at in rows
+            ]
+        )
+
+    @app.get("/fast", response_model=ConversationHistory)
+    async def fast_history():
+        return FastJSONResponse({
+            "session_id": "bench",
+            "messages": [
+                {"role": role, "content": content, "created_at": created_at}
+                for role, content, created_at in rows
+            ]
+        })
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return app
+
+
+def measure(client: TestClient, path: str, encoding: str, repeat: int):
+    """Median request time in ms and the size of the body on the wire."""
+    headers = {"Accept-Encoding": encoding}
+    response = client.get(path, headers=headers)
+    size = int(response.headers["content-length"])
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(path, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History serialization benchmark")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = TestClient(build_app(make_rows(args.messages)))
+    print(f"{args.messages} messages, orjson {'on' if orjson else 'off'}, brotli {'on' if brotli else 'off'}")
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+    baseline = None
+    for path in ("/default", "/fast"):
+        for encoding in encodings:
+            ms, size = measure(client, path, encoding, args.repeat)
+            baseline = baseline or ms
+            print(f"{path:>9} {encoding:>9}: {ms:8.1f} ms  {size / 1024:8.0f} KiB  ({baseline / ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
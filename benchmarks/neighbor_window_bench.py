@@ -0,0 +1,98 @@
+"""
+Ingestion cost of stored chunk overlap vs neighbour windows at query time.
+
+Chunks the same documents twice: with CHUNK_OVERLAP (the default mode) and
+without overlap (the CHUNK_NEIGHBOR_WINDOW mode), then embeds both sets and
+reports chunk count, embedding time and stored bytes (text plus float32
+vectors) for each. The text retrieval sends for one hit is a chunk in the
+first mode and a chunk with its neighbours in the second.
+
+Usage:
+    python benchmarks/neighbor_window_bench.py --documents 200 --doc-chars 20000
+    python benchmarks/neighbor_window_bench.py --file sample_document.txt --overlap 200 --window 1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.config.settings import settings  # noqa: E402
+from app.services.document_service import document_processor  # noqa: E402
+
+
+def make_documents(count: int, length: int, rng):
+    """Documents of random sentences, different from each other."""
+    words = np.array([f"term{index}" for index in range(2000)])
+    documents = []
+    for _ in range(count):
+        sentences = []
+        size = 0
+        while size < length:
+            sentence = " ".join(rng.choice(words, size=12)) + ". "
+            sentences.append(sentence)
+            size += len(sentence)
+        documents.append("".join(sentences)[:length])
+    return documents
+
+
+def run(documents, chunk_size: int, overlap: int, encode, dim: int):
+    """Chunk and embed all documents; returns (chunks, seconds, stored bytes)."""
+    chunks = []
+    for document in documents:
+        chunks.extend(document_processor.chunk_text(document, chunk_size=chunk_size, chunk_overlap=overlap))
+    started = time.perf_counter()
+    encode(chunks)
+    seconds = time.perf_counter() - started
+    stored = sum(len(chunk.encode("utf-8")) for chunk in chunks) + 4 * dim * len(chunks)
+    return len(chunks), seconds, stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk overlap vs neighbour window benchmark")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--doc-chars", type=int, default=20000)
+    parser.add_argument("--file", help="Use this text file as the only document")
+    parser.add_argument("--chunk-size", type=int, default=settings.CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=settings.CHUNK_OVERLAP)
+    parser.add_argument("--window", type=int, default=settings.CHUNK_NEIGHBOR_WINDOW or 1)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as file:
+            documents = [file.read()]
+    else:
+        documents = make_documents(args.documents, args.doc_chars, np.random.default_rng(0))
+
+    from app.services.embedding_service import embedding_service
+
+    dim = embedding_service.get_embedding_dimension()
+    embedding_service.encode(["warm-up"])
+    print(
+        f"{len(documents)} documents, {sum(len(document) for document in documents)} chars, "
+        f"chunk size {args.chunk_size}, model {settings.EMBEDDING_MODEL}"
+    )
+    print(f"{'mode':>22} {'chunks':>8} {'embed s':>8} {'stored MB':>10} {'chars/hit':>10}")
+    results = {}
+    for name, overlap, hit_chars in (
+        (f"overlap {args.overlap}", args.overlap, args.chunk_size),
+        (f"window {args.window}, no overlap", 0, args.chunk_size * (2 * args.window + 1)),
+    ):
+        chunks, seconds, stored = run(documents, args.chunk_size, overlap, embedding_service.encode, dim)
+        results[name] = (chunks, seconds, stored)
+        print(f"{name:>22} {chunks:>8} {seconds:>8.2f} {stored / 1024 / 1024:>10.1f} {hit_chars:>10}")
+
+    (overlap_chunks, overlap_seconds, overlap_stored), (window_chunks, window_seconds, window_stored) = results.values()
+    print(
+        f"no overlap: {1 - window_chunks / overlap_chunks:.0%} fewer chunks, "
+        f"{1 - window_seconds / overlap_seconds:.0%} less embedding time, "
+        f"{1 - window_stored / overlap_stored:.0%} less storage"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Per-session retrieval latency as document_chunks grows: plain vs hash-partitioned table.
+
+Builds two scratch tables shaped like document_chunks, one plain and one
+hash-partitioned by session_id (as with DOCUMENT_CHUNKS_PARTITIONS), and
+grows both in steps by adding sessions with a fixed number of chunks each.
+After every step it runs the same random per-session similarity queries
+(the own-documents branch of the retrieval query) against both tables and
+prints p50/p99 latency, the pages a query touches and recall@k against an
+exact scan next to the total row count and on-disk size.
+
+With --vector-index both tables get an HNSW index (one per partition on
+the partitioned table), searched with the same settings as retrieval
+(DOCUMENT_CHUNKS_EF_SEARCH, and iterative scans on pgvector 0.8+). The
+index holds every session of a partition and the session filter is applied
+to what it returns, so recall shows how many of a session's top k chunks
+the index scan alone finds. Without the index, recall is always 1.
+
+Every session has the same number of chunks, so a flat latency means the
+cost of a search does not depend on how many other sessions exist. The
+scratch tables are dropped at the end unless --keep is given; application
+tables are not touched.
+
+Usage:
+    python benchmarks/partition_bench.py --steps 1000,2000,4000,8000 --chunks-per-session 20
+    python benchmarks/partition_bench.py --partitions 128 --dim 384 --queries 500
+    python benchmarks/partition_bench.py --vector-index --ef-search 40
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.config.settings import settings  # noqa: E402
+from app.config.vector_binding import format_vector  # noqa: E402
+from app.services.partition_service import hnsw_scan_settings  # noqa: E402
+
+PLAIN_TABLE = "partition_bench_plain"
+HASH_TABLE = "partition_bench_hash"
+
+QUERY = """
+    SELECT id, embedding <=> %(q)s::vector AS distance
+    FROM {table}
+    WHERE session_id = %(session_id)s
+    ORDER BY distance
+    LIMIT %(k)s
+"""
+
+
+def create_tables(conn, dim: int, partitions: int, vector_index: bool):
+    """Create the plain and the hash-partitioned scratch table."""
+    columns = f"""
+        id INTEGER NOT NULL,
+        session_id INTEGER NOT NULL,
+        chunk_text TEXT NOT NULL,
+        embedding vector({dim})
+    """
+    with conn.cursor() as cursor:
+        for table in (PLAIN_TABLE, HASH_TABLE):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"CREATE TABLE {PLAIN_TABLE} ({columns})")
+        cursor.execute(f"CREATE TABLE {HASH_TABLE} ({columns}) PARTITION BY HASH (session_id)")
+        for remainder in range(partitions):
+            cursor.execute(
+                f"CREATE TABLE {HASH_TABLE}_h{remainder:03d} PARTITION OF {HASH_TABLE} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        for table in (PLAIN_TABLE, HASH_TABLE):
+            cursor.execute(f"CREATE INDEX ON {table} (id)")
+            cursor.execute(f"CREATE INDEX ON {table} (session_id)")
+            if vector_index:
+                cursor.execute(f"CREATE INDEX ON {table} USING hnsw (embedding vector_cosine_ops)")
+    conn.commit()
+
+
+def use_retrieval_scan_settings(conn, k: int):
+    """Search the HNSW indexes of this connection the way retrieval does."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        version = tuple(int(part) for part in cursor.fetchone()[0].split("."))
+        for name, value in hnsw_scan_settings(version, k).items():
+            cursor.execute("SELECT set_config(%s, %s, false)", (name, value))
+    conn.commit()
+
+
+def add_sessions(conn, first_session: int, sessions: int, chunks: int, dim: int, rng):
+    """
+    COPY `sessions` new sessions of `chunks` random chunks into both tables.
+
+    Rows are written in random order, so like chunks uploaded over time a
+    session's rows are spread over the heap between other sessions' rows.
+    """
+    session_ids = np.repeat(np.arange(first_session, first_session + sessions), chunks)
+    rng.shuffle(session_ids)
+    embeddings = rng.standard_normal((len(session_ids), dim)).astype(np.float32)
+    buffer = io.StringIO()
+    row_id = first_session * chunks
+    for session_id, embedding in zip(session_ids, embeddings):
+        buffer.write(f"{row_id}\t{session_id}\tchunk {row_id}\t{format_vector(embedding)}\n")
+        row_id += 1
+    with conn.cursor() as cursor:
+        for table in (PLAIN_TABLE, HASH_TABLE):
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} (id, session_id, chunk_text, embedding) FROM STDIN", buffer)
+            cursor.execute(f"ANALYZE {table}")
+    conn.commit()
+
+
+def table_size_mb(conn, table: str) -> float:
+    """Size of a table (all partitions) including its indexes."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT coalesce(sum(pg_total_relation_size(c.oid)), 0)
+            FROM pg_class c
+            WHERE c.oid = CAST(%(table)s AS regclass)
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = CAST(%(table)s AS regclass))
+        """, {"table": table})
+        return cursor.fetchone()[0] / 1024 / 1024
+
+
+def pages_per_query(conn, table: str, queries, session_ids, k: int, samples: int = 50) -> float:
+    """Mean shared buffers (8 kB pages) a query touches, hit or read, from EXPLAIN BUFFERS."""
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + QUERY.format(table=table)
+    pages = []
+    with conn.cursor() as cursor:
+        for query, session_id in list(zip(queries, session_ids))[:samples]:
+            cursor.execute(sql, {"q": format_vector(query), "session_id": int(session_id), "k": k})
+            plan = cursor.fetchone()[0][0]["Plan"]
+            pages.append(plan["Shared Hit Blocks"] + plan["Shared Read Blocks"])
+    return statistics.mean(pages)
+
+
+def recall(conn, table: str, queries, session_ids, k: int, samples: int = 100) -> float:
+    """Mean share of a session's k nearest chunks (found by an exact scan) that the query returns."""
+    sql = QUERY.format(table=table)
+    shares = []
+    with conn.cursor() as cursor:
+        for query, session_id in list(zip(queries, session_ids))[:samples]:
+            params = {"q": format_vector(query), "session_id": int(session_id), "k": k}
+            cursor.execute(sql, params)
+            found = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            cursor.execute(sql, params)
+            exact = {row[0] for row in cursor.fetchall()}
+            conn.rollback()
+            if exact:
+                shares.append(len(found & exact) / len(exact))
+    return statistics.mean(shares)
+
+
+def measure(conn, table: str, queries, session_ids, k: int):
+    """p50 and p99 latency in milliseconds over all queries (after a short warm-up)."""
+    sql = QUERY.format(table=table)
+    literals = [format_vector(query) for query in queries]
+    with conn.cursor() as cursor:
+        for literal, session_id in list(zip(literals, session_ids))[:20]:
+            cursor.execute(sql, {"q": literal, "session_id": int(session_id), "k": k})
+            cursor.fetchall()
+        timings = []
+        for literal, session_id in zip(literals, session_ids):
+            started = time.perf_counter()
+            cursor.execute(sql, {"q": literal, "session_id": int(session_id), "k": k})
+            cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="document_chunks partitioning benchmark")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--steps", default="1000,2000,4000,8000", help="Total sessions after each step")
+    parser.add_argument("--chunks-per-session", type=int, default=20)
+    parser.add_argument("--partitions", type=int, default=settings.DOCUMENT_CHUNKS_PARTITIONS or 64)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_CANDIDATES)
+    parser.add_argument("--vector-index", action="store_true", help="Add an HNSW index to both tables")
+    parser.add_argument("--ef-search", type=int, default=settings.DOCUMENT_CHUNKS_EF_SEARCH)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch tables")
+    args = parser.parse_args()
+
+    steps = [int(step) for step in args.steps.split(",")]
+    rng = np.random.default_rng(0)
+    conn = psycopg2.connect(args.database_url.replace("postgresql+psycopg2://", "postgresql://"))
+    try:
+        create_tables(conn, args.dim, args.partitions, args.vector_index)
+        if args.vector_index:
+            settings.DOCUMENT_CHUNKS_EF_SEARCH = args.ef_search
+            use_retrieval_scan_settings(conn, args.k)
+        print(
+            f"{args.chunks_per_session} chunks per session, dimension {args.dim}, "
+            f"{args.partitions} partitions, top {args.k}, {args.queries} queries per step"
+            + (f", HNSW index (ef_search {args.ef_search})" if args.vector_index else "")
+        )
+        header = f"{'p50':>9} {'p99':>7} {'pages':>6} {'MB':>7} {'recall':>6}"
+        print(f"{'':>19} | {'plain':^39} | {'hash-partitioned':^39}")
+        print(f"{'sessions':>9} {'chunks':>9} | {header} | {header}")
+        loaded = 0
+        for total in steps:
+            if total > loaded:
+                add_sessions(conn, loaded, total - loaded, args.chunks_per_session, args.dim, rng)
+                loaded = total
+            queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+            session_ids = rng.integers(0, loaded, size=args.queries)
+            row = [f"{loaded:>9} {loaded * args.chunks_per_session:>9}"]
+            for table in (PLAIN_TABLE, HASH_TABLE):
+                p50, p99 = measure(conn, table, queries, session_ids, args.k)
+                pages = pages_per_query(conn, table, queries, session_ids, args.k)
+                found = recall(conn, table, queries, session_ids, args.k)
+                row.append(
+                    f"{p50:>7.2f}ms {p99:>5.2f}ms {pages:>6.1f} {table_size_mb(conn, table):>7.1f} {found:>6.3f}"
+                )
+            print(" | ".join(row))
+    finally:
+        if not args.keep:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {PLAIN_TABLE}")
+                cursor.execute(f"DROP TABLE IF EXISTS {HASH_TABLE}")
+            conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Share of prompt tokens a provider prefix cache can serve, per prompt layout.
+
+Plays multi-turn conversations against the local fake provider
+(app.services.fake_llm), which reports cached tokens the way hosted
+providers with automatic prefix caching do, and compares:
+
+    legacy  retrieved context (and the pinned text) inside the system
+            message, the layout before prompt_layout, so the prefix changes
+            every turn
+    stable  prompt_layout.build_messages(): instructions and pinned
+            documents first, retrieved context and question last
+
+Each turn retrieves a different random set of chunks; history is the usual
+window of the last 10 messages. No database or API key is needed.
+
+Usage:
+    python benchmarks/prompt_cache_bench.py --sessions 20 --turns 10 --pinned-tokens 3000
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage  # noqa: E402
+from app.services.fake_llm import PrefixCacheFakeChatModel  # noqa: E402
+from app.services.llm_service import prompt_cache_usage  # noqa: E402
+from app.services.prompt_layout import build_messages  # noqa: E402
+from app.services.token_budget import CHARS_PER_TOKEN  # noqa: E402
+
+
+def legacy_messages(pinned_context, history, context, user_message):
+    """The prompt as generate_response built it before prompt_layout; pinned text follows the retrieved chunks."""
+    context = "\n\n".join(part for part in (context, pinned_context) if part)
+    if context:
+        system_message = (
+            "You are a helpful AI assistant. Use the following context from uploaded documents "
+            "to answer the user's question. If the context doesn't contain relevant information, "
+            f"you can use your general knowledge.\n\nContext from documents:\n{context}\n\n"
+            "Provide a helpful and accurate response based on the context and conversation history."
+        )
+    else:
+        system_message = "You are a helpful AI assistant. Provide accurate and helpful responses to user questions."
+    messages = [SystemMessage(content=system_message)]
+    for role, content in history:
+        messages.append(HumanMessage(content=content) if role == "user" else AIMessage(content=content))
+    messages.append(HumanMessage(content=user_message))
+    return messages
+
+
+def random_text(rng, vocabulary, tokens: int) -> str:
+    """Roughly `tokens` tokens of random words."""
+    words = rng.choice(vocabulary, size=max(1, tokens * CHARS_PER_TOKEN // 6))
+    return " ".join(words)
+
+
+def run(layout, args, rng, vocabulary):
+    """Play every session with one layout; returns (prompt tokens, cached tokens, calls)."""
+    model = PrefixCacheFakeChatModel()
+    input_tokens = cached_tokens = calls = 0
+    chunks = [random_text(rng, vocabulary, args.chunk_tokens) for _ in range(args.chunk_pool)]
+    for session in range(args.sessions):
+        pinned = random_text(rng, vocabulary, args.pinned_tokens) if args.pinned_tokens else ""
+        history = []
+        for turn in range(args.turns):
+            question = f"Question {turn} of session {session}: " + random_text(rng, vocabulary, 15)
+            picked = rng.choice(len(chunks), size=args.context_chunks, replace=False)
+            context = "\n\n".join(chunks[index] for index in picked)
+            messages = layout(pinned, history[-10:], context, question)
+            usage = prompt_cache_usage(model.invoke(messages))
+            input_tokens += usage[0]
+            cached_tokens += usage[1]
+            calls += 1
+            history += [("user", question), ("assistant", random_text(rng, vocabulary, args.answer_tokens))]
+    return input_tokens, cached_tokens, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt prefix cache benchmark")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--pinned-tokens", type=int, default=3000, help="Pinned document size (0 = none)")
+    parser.add_argument("--context-chunks", type=int, default=5)
+    parser.add_argument("--chunk-tokens", type=int, default=250)
+    parser.add_argument("--chunk-pool", type=int, default=200)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    vocabulary = np.array([f"w{index}" for index in range(5000)])
+    print(
+        f"{args.sessions} sessions x {args.turns} turns, pinned {args.pinned_tokens} tokens, "
+        f"context {args.context_chunks} x {args.chunk_tokens} tokens"
+    )
+    for name, layout in (("legacy", legacy_messages), ("stable", build_messages)):
+        rng = np.random.default_rng(0)
+        input_tokens, cached_tokens, calls = run(layout, args, rng, vocabulary)
+        print(
+            f"{name:>7}: {input_tokens / calls:7.0f} prompt tokens/turn  "
+            f"{(input_tokens - cached_tokens) / calls:7.0f} uncached/turn  "
+            f"cached ratio {cached_tokens / input_tokens:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Recall vs. latency evaluation for vector retrieval configurations.
+
+Loads a corpus into a scratch pgvector table, computes exact top-k ground
+truth with numpy, then runs the same queries against an exact scan, HNSW
+(several ef_search values), IVFFlat (several probes values) and quantized
+variants (halfvec, binary with re-ranking; pgvector >= 0.7), and prints
+recall@k, QPS and p50/p99 latency for each in one table.
+
+The corpus is either synthetic (clustered unit vectors) or copied from the
+chunks of an existing session. The scratch table is dropped at the end
+unless --keep is given; application tables are only read.
+
+Usage:
+    python benchmarks/retrieval_eval.py --rows 100000 --queries 200 --k 10
+    python benchmarks/retrieval_eval.py --from-session my-session --k 5
+    python benchmarks/retrieval_eval.py --rows 200000 --sessions 50   # filtered like retrieve_relevant_chunks
+"""
+import argparse
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.config.settings import settings  # noqa: E402
+
+TABLE = "retrieval_eval_chunks"
+
+
+def vector_literal(vector) -> str:
+    """pgvector text representation of a vector."""
+    return "[" + ",".join(f"{value:.7g}" for value in vector) + "]"
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def synthetic_corpus(rows: int, queries: int, dim: int, clusters: int, seed: int):
+    """Clustered unit vectors, with queries drawn from the same distribution."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+
+    def sample(count):
+        assignment = rng.integers(0, clusters, size=count)
+        return normalize(centers[assignment] + 0.6 * rng.normal(size=(count, dim)).astype(np.float32))
+
+    return sample(rows), sample(queries)
+
+
+def session_corpus(conn, session_id: str, queries: int, seed: int):
+    """Embeddings of a session's chunks; queries are perturbed copies of random chunks."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT dc.embedding::text FROM document_chunks dc
+            JOIN documents d ON dc.document_id = d.id
+            JOIN sessions s ON d.session_id = s.id
+            WHERE s.session_id = %s AND dc.embedding IS NOT NULL
+            ORDER BY dc.id
+        """, (session_id,))
+        rows = cursor.fetchall()
+    if not rows:
+        raise SystemExit(f"Session {session_id} has no embedded chunks")
+    corpus = normalize(np.array([np.array(row[0][1:-1].split(","), dtype=np.float32) for row in rows]))
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), size=queries)]
+    return corpus, normalize(picks + 0.05 * rng.normal(size=picks.shape).astype(np.float32))
+
+
+def load_table(conn, corpus: np.ndarray, session_ids: np.ndarray):
+    """Create the scratch table and COPY the corpus into it."""
+    dim = corpus.shape[1]
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, session_id INTEGER NOT NULL, embedding vector({dim}))")
+        buffer = io.StringIO()
+        for index, (vector, session_id) in enumerate(zip(corpus, session_ids)):
+            buffer.write(f"{index}\t{session_id}\t{vector_literal(vector)}\n")
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {TABLE} (id, session_id, embedding) FROM STDIN", buffer)
+        cursor.execute(f"CREATE INDEX ON {TABLE} (session_id)")
+        cursor.execute(f"ANALYZE {TABLE}")
+
+
+def ground_truth(corpus, queries, query_sessions, session_ids, k: int):
+    """Exact top-k ids by cosine distance (within the query's session)."""
+    truth = []
+    for query, session_id in zip(queries, query_sessions):
+        candidates = np.flatnonzero(session_ids == session_id)
+        distances = 1.0 - corpus[candidates] @ query
+        order = np.argsort(distances, kind="stable")[:k]
+        truth.append(set(candidates[order].tolist()))
+    return truth
+
+
+def pgvector_version(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cursor.fetchone()
+    return tuple(int(part) for part in row[0].split(".")[:2]) if row else (0, 0)
+
+
+def build_index(conn, name: str, definition: str) -> dict:
+    """Create an index and report build time and size."""
+    with conn.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(f"CREATE INDEX {name} ON {TABLE} {definition}")
+        build_seconds = time.perf_counter() - started
+        cursor.execute(f"ANALYZE {TABLE}")
+        cursor.execute("SELECT pg_relation_size(%s)", (name,))
+        size = cursor.fetchone()[0]
+    return {"build_s": build_seconds, "size_mb": size / 1024 / 1024}
+
+
+def drop_index(conn, name: str):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def run_queries(conn, sql: str, queries, query_sessions, k: int, setup=()):
+    """Run every query once (after a short warm-up) and collect ids and latencies."""
+    literals = [vector_literal(query) for query in queries]
+    results = []
+    latencies = []
+    with conn.cursor() as cursor:
+        for statement in setup:
+            cursor.execute(statement)
+
+        def execute(literal, session_id):
+            params = {"q": literal, "k": k, "session_id": int(session_id)}
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+        for literal, session_id in list(zip(literals, query_sessions))[:10]:
+            execute(literal, session_id)
+        for literal, session_id in zip(literals, query_sessions):
+            started = time.perf_counter()
+            results.append(execute(literal, session_id))
+            latencies.append(time.perf_counter() - started)
+
+        cursor.execute("RESET ALL")
+    return results, latencies
+
+
+def score(name, results, latencies, truth, k, index_info=None) -> dict:
+    recall = sum(len(set(result) & expected) for result, expected in zip(results, truth)) / (k * len(truth))
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "config": name,
+        "recall": recall,
+        "qps": len(latencies) / sum(latencies),
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+        "build_s": (index_info or {}).get("build_s"),
+        "size_mb": (index_info or {}).get("size_mb"),
+    }
+
+
+def print_table(rows, k: int):
+    print()
+    print(f"{'config':<34} {'recall@' + str(k):>9} {'QPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'index MB':>9}")
+    for row in rows:
+        build = f"{row['build_s']:.1f}" if row["build_s"] is not None else "-"
+        size = f"{row['size_mb']:.1f}" if row["size_mb"] is not None else "-"
+        print(
+            f"{row['config']:<34} {row['recall']:>9.3f} {row['qps']:>9.0f} "
+            f"{row['p50']:>8.2f} {row['p99']:>8.2f} {build:>8} {size:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval recall vs. latency evaluation")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=100000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--clusters", type=int, default=100, help="Clusters in the synthetic corpus")
+    parser.add_argument("--from-session", help="Use the chunk embeddings of this session as the corpus")
+    parser.add_argument("--sessions", type=int, default=1, help="Spread rows over N sessions and filter queries by one")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, help="IVFFlat lists (default sqrt(rows))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--rerank", type=int, default=4, help="Candidates per result for binary quantization")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch table")
+    args = parser.parse_args()
+
+    import psycopg2
+
+    conn = psycopg2.connect(args.database_url.replace("postgresql+psycopg2://", "postgresql://"))
+    conn.autocommit = True
+
+    if args.from_session:
+        corpus, queries = session_corpus(conn, args.from_session, args.queries, args.seed)
+    else:
+        corpus, queries = synthetic_corpus(args.rows, args.queries, args.dim, args.clusters, args.seed)
+    rows, dim = corpus.shape
+
+    rng = np.random.default_rng(args.seed + 1)
+    session_ids = rng.integers(0, args.sessions, size=rows)
+    query_sessions = rng.integers(0, args.sessions, size=len(queries))
+    filtered = args.sessions > 1
+    where = "WHERE session_id = %(session_id)s" if filtered else ""
+
+    print(f"Loading {rows} vectors of dimension {dim} into {TABLE}...")
+    load_table(conn, corpus, session_ids)
+    truth = ground_truth(corpus, queries, query_sessions, session_ids, args.k)
+    version = pgvector_version(conn)
+
+    plain_sql = f"SELECT id FROM {TABLE} {where} ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    results = []
+    try:
+        found, latencies = run_queries(conn, plain_sql, queries, query_sessions, args.k)
+        results.append(score("exact scan", found, latencies, truth, args.k))
+
+        info = build_index(
+            conn, "retrieval_eval_hnsw",
+            f"USING hnsw (embedding vector_cosine_ops) WITH (m = {args.hnsw_m}, ef_construction = {args.ef_construction})"
+        )
+        for ef_search in args.ef_search:
+            found, latencies = run_queries(
+                conn, plain_sql, queries, query_sessions, args.k,
+                setup=[f"SET hnsw.ef_search = {ef_search}"]
+            )
+            results.append(score(f"hnsw m={args.hnsw_m} ef_search={ef_search}", found, latencies, truth, args.k, info))
+        drop_index(conn, "retrieval_eval_hnsw")
+
+        lists = args.lists or max(1, int(math.sqrt(rows)))
+        info = build_index(conn, "retrieval_eval_ivfflat", f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})")
+        for probes in args.probes:
+            if probes > lists:
+                continue
+            found, latencies = run_queries(
+                conn, plain_sql, queries, query_sessions, args.k,
+                setup=[f"SET ivfflat.probes = {probes}"]
+            )
+            results.append(score(f"ivfflat lists={lists} probes={probes}", found, latencies, truth, args.k, info))
+        drop_index(conn, "retrieval_eval_ivfflat")
+
+        if version >= (0, 7):
+            # Half-precision index, ranked by the half-precision distance
+            info = build_index(
+                conn, "retrieval_eval_halfvec",
+                f"USING hnsw ((embedding::halfvec({dim})) halfvec_cosine_ops) "
+                f"WITH (m = {args.hnsw_m}, ef_construction = {args.ef_construction})"
+            )
+            halfvec_sql = (
+                f"SELECT id FROM {TABLE} {where} "
+                f"ORDER BY embedding::halfvec({dim}) <=> %(q)s::halfvec({dim}) LIMIT %(k)s"
+            )
+            for ef_search in args.ef_search:
+                found, latencies = run_queries(
+                    conn, halfvec_sql, queries, query_sessions, args.k,
+                    setup=[f"SET hnsw.ef_search = {ef_search}"]
+                )
+                results.append(score(f"halfvec hnsw ef_search={ef_search}", found, latencies, truth, args.k, info))
+            drop_index(conn, "retrieval_eval_halfvec")
+
+            # Binary quantization: Hamming-distance candidates re-ranked by exact distance
+            info = build_index(
+                conn, "retrieval_eval_binary",
+                f"USING hnsw ((binary_quantize(embedding)::bit({dim})) bit_hamming_ops) "
+                f"WITH (m = {args.hnsw_m}, ef_construction = {args.ef_construction})"
+            )
+            binary_sql = (
+                f"SELECT id FROM ("
+                f"SELECT id, embedding FROM {TABLE} {where} "
+                f"ORDER BY binary_quantize(embedding)::bit({dim}) <~> binary_quantize(%(q)s::vector) "
+                f"LIMIT %(k)s * {args.rerank}"
+                f") candidates ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+            )
+            for ef_search in args.ef_search:
+                if ef_search < args.k * args.rerank:
+                    continue
+                found, latencies = run_queries(
+                    conn, binary_sql, queries, query_sessions, args.k,
+                    setup=[f"SET hnsw.ef_search = {ef_search}"]
+                )
+                results.append(score(
+                    f"binary hnsw x{args.rerank} ef_search={ef_search}", found, latencies, truth, args.k, info
+                ))
+            drop_index(conn, "retrieval_eval_binary")
+        else:
+            print(f"pgvector {'.'.join(map(str, version))} has no halfvec/bit types; skipping quantized variants (needs 0.7+)")
+    finally:
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.close()
+
+    print_table(results, args.k)
+    if filtered:
+        print(f"\nQueries filtered to one of {args.sessions} sessions; approximate indexes filter after the index scan,")
+        print("so low ef_search/probes values can return fewer than k rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Per-query overhead of the similarity search in retrieve_relevant_chunks.
+
+Creates a throwaway session with a few random chunks (so the search itself
+is cheap and the fixed per-query cost dominates) and compares:
+
+    legacy    str() of every float, text() rebuilt per call, CAST to vector
+    bound     float32 array bound via app.config.vector_binding, shared text()
+    prepared  bound array, statement prepared once per connection
+
+Reports median and p99 time per query, plus the cost and size of encoding
+the query vector alone. The session is deleted at the end.
+
+Usage:
+    python benchmarks/vector_binding_bench.py --chunks 50 --queries 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert, text  # noqa: E402
+from app.config.database import SessionLocal  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+from app.config.vector_binding import format_vector  # noqa: E402
+from app.models.models import Document, DocumentChunk, Session  # noqa: E402
+from app.services.rag_service import rag_service  # noqa: E402
+from app.services.session_cleanup import purge_session  # noqa: E402
+
+
+def legacy_search(db, session_id, query_embedding, top_k):
+    """The search as it was written before binding arrays and preparing the statement."""
+    embedding_str = "[" + ",".join(map(str, query_embedding.tolist())) + "]"
+    sql_query = text("""
+        SELECT dc.chunk_text, dc.embedding <=> CAST(:embedding AS vector) AS distance, dc.token_count
+        FROM document_chunks dc
+        WHERE dc.document_id IN (
+            SELECT id FROM documents WHERE session_id = :session_id
+            UNION ALL
+            SELECT document_id FROM session_documents WHERE session_id = :session_id
+        )
+        ORDER BY distance
+        LIMIT :top_k
+    """)
+    return db.execute(
+        sql_query,
+        {"embedding": embedding_str, "session_id": session_id, "top_k": top_k}
+    ).fetchall()
+
+
+def create_session(db, chunks: int, dim: int, rng) -> int:
+    """A session with one document of random chunks; returns its database id."""
+    session = Session(session_id=f"vector-binding-bench-{uuid.uuid4().hex[:8]}")
+    db.add(session)
+    db.flush()
+    document = Document(session_id=session.id, filename="bench.txt", file_type="txt")
+    db.add(document)
+    db.flush()
+    embeddings = rng.standard_normal((chunks, dim)).astype(np.float32)
+    db.execute(insert(DocumentChunk), [
+        {
+            "document_id": document.id,
+            "session_id": session.id,
+            "chunk_text": f"chunk {index}",
+            "chunk_index": index,
+            "token_count": 3,
+            "embedding": embedding,
+        }
+        for index, embedding in enumerate(embeddings)
+    ])
+    db.commit()
+    return session.id
+
+
+def measure(search, queries, repeat_warmup: int = 20):
+    """Median and p99 latency in microseconds."""
+    for query in queries[:repeat_warmup]:
+        search(query)
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similarity query overhead benchmark")
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=settings.RETRIEVAL_CANDIDATES)
+    args = parser.parse_args()
+
+    dim = settings.EMBEDDING_DIMENSION
+    rng = np.random.default_rng(0)
+    queries = list(rng.standard_normal((args.queries, dim)).astype(np.float32))
+
+    legacy_literal = "[" + ",".join(map(str, queries[0].tolist())) + "]"
+    for name, encode, literal in (
+        ("str() join", lambda q: "[" + ",".join(map(str, q.tolist())) + "]", legacy_literal),
+        ("format_vector", format_vector, format_vector(queries[0])),
+    ):
+        started = time.perf_counter()
+        for query in queries:
+            encode(query)
+        per_query = (time.perf_counter() - started) / len(queries) * 1e6
+        print(f"encode {name:>14}: {per_query:7.1f} us  {len(literal)} bytes")
+
+    db = SessionLocal()
+    session_id = create_session(db, args.chunks, dim, rng)
+    try:
+        def bound(query):
+            settings.SIMILARITY_PREPARED_STATEMENT = False
+            return rag_service._search_database(db, session_id, query, args.top_k)
+
+        def prepared(query):
+            settings.SIMILARITY_PREPARED_STATEMENT = True
+            return rag_service._search_database(db, session_id, query, args.top_k)
+
+        print(f"\n{args.chunks} chunks, dimension {dim}, top_k {args.top_k}, {args.queries} queries")
+        baseline = None
+        for name, search in (
+            ("legacy", lambda query: legacy_search(db, session_id, query, args.top_k)),
+            ("bound", bound),
+            ("prepared", prepared),
+        ):
+            median, p99 = measure(search, queries)
+            baseline = baseline or median
+            print(f"{name:>9}: median {median:7.1f} us  p99 {p99:7.1f} us  ({baseline / median:.2f}x)")
+    finally:
+        db.rollback()
+        purge_session(db, session_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
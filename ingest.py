@@ -0,0 +1,103 @@
+"""
+Bulk document ingestion.
+Loads every PDF and TXT file of a directory or ZIP archive into a chat session
+or into the shared document library.
+
+Usage:
+    python ingest.py PATH --session-id SESSION [--extract-workers N] [--embed-batch-size N] [--queue-size N]
+    python ingest.py PATH --library
+
+Files whose name (relative to PATH) already exists in the session (or the
+library) are skipped, so an interrupted run can simply be started again.
+"""
+import argparse
+import os
+import sys
+from app.config.database import SessionLocal
+from app.models.models import Session, Document
+from app.services.bulk_ingestion import BulkIngestionPipeline, file_type_of, find_sources
+
+
+def get_or_create_session(session_id: str):
+    """Return the database id of a session and the filenames it already has."""
+    db = SessionLocal()
+    try:
+        session = db.query(Session).filter(Session.session_id == session_id).first()
+        if not session:
+            session = Session(session_id=session_id)
+            db.add(session)
+            db.commit()
+            db.refresh(session)
+        filenames = {row[0] for row in db.query(Document.filename).filter(Document.session_id == session.id)}
+        return session.id, filenames
+    finally:
+        db.close()
+
+
+def library_filenames():
+    """Return the filenames already in the shared library."""
+    db = SessionLocal()
+    try:
+        return {row[0] for row in db.query(Document.filename).filter(Document.session_id.is_(None))}
+    finally:
+        db.close()
+
+
+def format_stats(stats):
+    """One-line progress summary."""
+    utilization = ", ".join(f"{stage} {value:.0%}" for stage, value in stats["utilization"].items())
+    return (
+        f"{stats['files']} files ({stats['files_per_sec']:.1f}/sec), "
+        f"{stats['chunks']} chunks ({stats['chunks_per_sec']:.0f}/sec) | {utilization}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory or ZIP archive of documents into a session")
+    parser.add_argument("path", help="Directory or .zip file with PDF and TXT files")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--session-id", help="Session to add the documents to")
+    target.add_argument("--library", action="store_true", help="Add the documents to the shared library")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--embed-batch-size", type=int, default=512, help="Chunks per embedding batch")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacity of the queues between stages")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: {args.path} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    if args.library:
+        session_pk, existing = None, library_filenames()
+    else:
+        session_pk, existing = get_or_create_session(args.session_id)
+    skipped = {"existing": 0, "unsupported": 0}
+
+    def sources():
+        for source in find_sources(args.path):
+            if file_type_of(source.name) is None:
+                skipped["unsupported"] += 1
+            elif source.name in existing:
+                skipped["existing"] += 1
+            else:
+                yield source
+
+    pipeline = BulkIngestionPipeline(
+        session_pk,
+        extract_workers=args.extract_workers,
+        embed_batch_size=args.embed_batch_size,
+        queue_size=args.queue_size
+    )
+    stats = pipeline.run(sources(), progress=lambda stats: print(f"\r{format_stats(stats)}", end="", flush=True))
+    print(f"\r{format_stats(stats)}")
+
+    print(f"Ingested {stats['files']} files ({stats['chunks']} chunks) in {stats['elapsed_seconds']:.1f}s")
+    print(f"Skipped {skipped['existing']} already ingested and {skipped['unsupported']} unsupported files")
+    if pipeline.failed:
+        print(f"Failed to extract {len(pipeline.failed)} files:")
+        for name in pipeline.failed:
+            print(f"  - {name}")
+
+
+if __name__ == "__main__":
+    main()
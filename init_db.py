@@ -3,9 +3,104 @@ Database initialization script.
 Creates tables and enables pgvector extension.
 """
 from sqlalchemy import text
-from app.config.database import engine, Base
+from app.config.database import engine, Base, SessionLocal
+from app.config.settings import settings
 from app.models.models import Session, Message, Document, DocumentChunk
 
+# Idempotent changes for databases created by earlier versions
+# (create_all only creates missing tables, never missing columns)
+SCHEMA_UPDATES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_sessions_updated_at ON sessions (updated_at)",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS chunk_hash VARCHAR(64)",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS token_count INTEGER",
+    "ALTER TABLE documents ALTER COLUMN session_id DROP NOT NULL",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS pinned BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE session_documents ADD COLUMN IF NOT EXISTS pinned BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS session_id INTEGER REFERENCES sessions (id) ON DELETE CASCADE",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_session_id ON document_chunks (session_id)",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id_chunk_index ON document_chunks (document_id, chunk_index)",
+]
+
+# Foreign keys that must cascade deletes in the database:
+# (table, column, referenced table)
+CASCADE_FOREIGN_KEYS = [
+    ("messages", "session_id", "sessions"),
+    ("documents", "session_id", "sessions"),
+    ("document_chunks", "document_id", "documents"),
+]
+
+
+def ensure_cascading_foreign_keys(conn):
+    """
+    Recreate foreign keys from earlier versions with ON DELETE CASCADE.
+    Keys that already cascade are left alone, so this is cheap to re-run.
+    """
+    for table, column, referenced in CASCADE_FOREIGN_KEYS:
+        rows = conn.execute(text("""
+            SELECT con.conname, con.confdeltype
+            FROM pg_constraint con
+            JOIN pg_attribute att
+              ON att.attrelid = con.conrelid AND att.attnum = ANY (con.conkey)
+            WHERE con.contype = 'f'
+              AND con.conrelid = CAST(:table AS regclass)
+              AND att.attname = :column
+        """), {"table": table, "column": column}).fetchall()
+        
+        for name, delete_action in rows:
+            if delete_action == "c":
+                continue
+            conn.execute(text(
+                f'ALTER TABLE {table} DROP CONSTRAINT "{name}", '
+                f'ADD CONSTRAINT "{name}" FOREIGN KEY ({column}) '
+                f'REFERENCES {referenced} (id) ON DELETE CASCADE'
+            ))
+
+
+def create_tables_with_partitions():
+    """
+    Create all tables, with messages range-partitioned by created_at
+    (MESSAGES_PARTITIONING) and document_chunks hash-partitioned by session
+    (DOCUMENT_CHUNKS_PARTITIONS). Also makes sure message partitions exist
+    for the next MESSAGES_PARTITIONS_AHEAD intervals.
+    """
+    from app.services import partition_service
+    
+    partitioned = set()
+    if settings.MESSAGES_PARTITIONING:
+        partitioned.add("messages")
+    if settings.DOCUMENT_CHUNKS_PARTITIONS > 0:
+        partitioned.add("document_chunks")
+    other_tables = [table for table in Base.metadata.sorted_tables if table.name not in partitioned]
+    Base.metadata.create_all(bind=engine, tables=other_tables)
+    
+    with engine.connect() as conn:
+        if settings.MESSAGES_PARTITIONING:
+            if not partition_service.table_exists(conn, "messages"):
+                partition_service.create_partitioned_messages_table(conn)
+            
+            if partition_service.is_partitioned(conn):
+                created = partition_service.create_future_partitions(conn)
+                for name in created:
+                    print(f"Created partition {name}")
+            else:
+                print(
+                    "Warning: messages is not partitioned. "
+                    "Run `python maintain_db.py convert-messages` to convert it."
+                )
+        
+        if settings.DOCUMENT_CHUNKS_PARTITIONS > 0:
+            if not partition_service.table_exists(conn, "document_chunks"):
+                partition_service.create_partitioned_chunks_table(conn, settings.DOCUMENT_CHUNKS_PARTITIONS)
+            elif not partition_service.is_partitioned(conn, "document_chunks"):
+                print(
+                    "Warning: document_chunks is not partitioned. "
+                    "Run `python maintain_db.py convert-chunks` to convert it."
+                )
+        conn.commit()
+
 
 def init_db():
     """
@@ -19,7 +114,34 @@ def init_db():
         conn.commit()
     
     # Create all tables
-    Base.metadata.create_all(bind=engine)
+    if settings.MESSAGES_PARTITIONING or settings.DOCUMENT_CHUNKS_PARTITIONS > 0:
+        create_tables_with_partitions()
+    else:
+        Base.metadata.create_all(bind=engine)
+    
+    # Bring existing tables up to date
+    from app.services import partition_service
+    with engine.connect() as conn:
+        for statement in SCHEMA_UPDATES:
+            conn.execute(text(statement))
+        ensure_cascading_foreign_keys(conn)
+        backfilled = partition_service.backfill_chunk_session_ids(conn)
+        if settings.DOCUMENT_CHUNKS_VECTOR_INDEX:
+            partition_service.create_chunk_vector_index(conn)
+        conn.commit()
+    if backfilled:
+        print(f"Copied the session onto {backfilled} document chunks")
+    
+    # Move full document text out of the documents table
+    if settings.DOCUMENT_CONTENT_STORAGE == "blob":
+        from app.services.blob_store import move_inline_content_to_blobs
+        db = SessionLocal()
+        try:
+            moved = move_inline_content_to_blobs(db)
+        finally:
+            db.close()
+        if moved:
+            print(f"Moved full text of {moved} documents to the blob store")
     
     print("Database initialized successfully!")
     print("Tables created:")
@@ -0,0 +1,99 @@
+"""
+Database maintenance commands.
+Run periodically (e.g. daily from cron) to manage the partitioned messages table; the convert commands run once.
+
+Usage:
+    python maintain_db.py create-partitions [--ahead N]
+    python maintain_db.py archive-messages [--older-than-days N] [--archive-dir DIR]
+    python maintain_db.py convert-messages
+    python maintain_db.py convert-chunks [--partitions N]
+    python maintain_db.py gc-blobs [--min-age-hours N]
+"""
+import argparse
+from app.config.database import engine, SessionLocal
+from app.config.settings import settings
+from app.services import partition_service
+
+
+def create_partitions(args):
+    """Create messages partitions for the coming intervals."""
+    with engine.connect() as conn:
+        created = partition_service.create_future_partitions(conn, ahead=args.ahead)
+        conn.commit()
+    print(f"Created {len(created)} partitions")
+    for name in created:
+        print(f"  - {name}")
+
+
+def archive_messages(args):
+    """Detach old messages partitions and export them to compressed files."""
+    with engine.connect() as conn:
+        archived = partition_service.archive_old_partitions(
+            conn,
+            older_than_days=args.older_than_days,
+            archive_dir=args.archive_dir
+        )
+        conn.commit()
+    print(f"Archived {len(archived)} partitions")
+    for path in archived:
+        print(f"  - {path}")
+
+
+def convert_messages(args):
+    """Convert an existing plain messages table into a partitioned one."""
+    with engine.connect() as conn:
+        moved = partition_service.convert_messages_to_partitioned(conn)
+        conn.commit()
+    print(f"messages is partitioned ({moved} rows moved)")
+
+
+def convert_chunks(args):
+    """Convert an existing plain document_chunks table into a hash-partitioned one."""
+    with engine.connect() as conn:
+        moved = partition_service.convert_chunks_to_partitioned(conn, args.partitions)
+        conn.commit()
+    print(f"document_chunks is partitioned ({moved} rows moved)")
+
+
+def gc_blobs(args):
+    """Delete stored document text that no document references any more."""
+    from app.services.blob_store import delete_unreferenced_blobs
+
+    db = SessionLocal()
+    try:
+        deleted = delete_unreferenced_blobs(db, min_age_seconds=args.min_age_hours * 3600)
+    finally:
+        db.close()
+    print(f"Deleted {deleted} blobs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_create = commands.add_parser("create-partitions", help=create_partitions.__doc__)
+    parser_create.add_argument("--ahead", type=int, default=settings.MESSAGES_PARTITIONS_AHEAD)
+    parser_create.set_defaults(func=create_partitions)
+
+    parser_archive = commands.add_parser("archive-messages", help=archive_messages.__doc__)
+    parser_archive.add_argument("--older-than-days", type=int, default=settings.MESSAGES_ARCHIVE_AFTER_DAYS)
+    parser_archive.add_argument("--archive-dir", default=settings.MESSAGES_ARCHIVE_DIR)
+    parser_archive.set_defaults(func=archive_messages)
+
+    parser_convert = commands.add_parser("convert-messages", help=convert_messages.__doc__)
+    parser_convert.set_defaults(func=convert_messages)
+
+    parser_chunks = commands.add_parser("convert-chunks", help=convert_chunks.__doc__)
+    parser_chunks.add_argument("--partitions", type=int, default=settings.DOCUMENT_CHUNKS_PARTITIONS or 64)
+    parser_chunks.set_defaults(func=convert_chunks)
+
+    parser_gc = commands.add_parser("gc-blobs", help=gc_blobs.__doc__)
+    parser_gc.add_argument("--min-age-hours", type=float, default=1)
+    parser_gc.set_defaults(func=gc_blobs)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
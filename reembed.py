@@ -0,0 +1,115 @@
+"""
+Re-embedding tool for embedding model changes.
+Writes vectors for a new model next to the current ones, then switches retrieval over atomically.
+
+Usage:
+    python reembed.py run --model all-mpnet-base-v2 --dimension 768 [--workers 8]
+    python reembed.py status
+    python reembed.py switch --model all-mpnet-base-v2
+    python reembed.py rollback
+
+`run` can be interrupted and re-run at any time; it resumes from the last
+checkpointed range. After `switch`, restart the API with EMBEDDING_MODEL and
+EMBEDDING_DIMENSION set to the new model.
+"""
+import argparse
+import os
+import sys
+import time
+from app.config.database import engine
+from app.services import reembedding_service
+
+
+def run(args):
+    """Embed all chunks with the new model into the shadow column."""
+    with engine.connect() as conn:
+        reembedding_service.ensure_job(conn, args.model, args.dimension, args.range_size, restart=args.restart)
+        conn.commit()
+
+    started = time.monotonic()
+    progress = None
+    for progress in reembedding_service.run_job(
+        engine,
+        args.model,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        threads_per_worker=args.threads_per_worker
+    ):
+        print(
+            f"\r{progress['ranges_done']}/{progress['ranges_total']} ranges, "
+            f"{progress['chunks']} chunks, {progress['chunks_per_sec']:.0f} chunks/sec",
+            end="",
+            flush=True
+        )
+    print()
+
+    if progress is None:
+        print("Nothing left to embed.")
+    else:
+        elapsed = time.monotonic() - started
+        print(f"Embedded {progress['chunks']} chunks in {elapsed:.1f}s")
+    print(f"Run `python reembed.py switch --model {args.model}` to start using the new embeddings.")
+
+
+def status(args):
+    """Show progress of re-embedding jobs."""
+    with engine.connect() as conn:
+        jobs = reembedding_service.job_status(conn)
+        conn.commit()
+    if not jobs:
+        print("No re-embedding jobs.")
+    for job in jobs:
+        print(
+            f"{job['model']} (dim {job['dimension']}): {job['status']}, "
+            f"{job['ranges_done']}/{job['ranges']} ranges, {job['chunks_done']} chunks"
+        )
+
+
+def switch(args):
+    """Swap the new embeddings in atomically."""
+    embedded = reembedding_service.switch_to_model(engine, args.model, batch_size=args.batch_size)
+    print(f"Switched to {args.model} ({embedded} chunks caught up).")
+    print("Restart the API with EMBEDDING_MODEL and EMBEDDING_DIMENSION set to the new model.")
+
+
+def rollback(args):
+    """Swap the previous embeddings back in."""
+    reembedding_service.rollback_switch(engine)
+    print("Rolled back to the previous embeddings. Restore EMBEDDING_MODEL and EMBEDDING_DIMENSION.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed document chunks for a new embedding model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = commands.add_parser("run", help=run.__doc__)
+    parser_run.add_argument("--model", required=True, help="sentence-transformers model name")
+    parser_run.add_argument("--dimension", type=int, required=True, help="Embedding dimension of the model")
+    parser_run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser_run.add_argument("--batch-size", type=int, default=256, help="Texts per encode batch")
+    parser_run.add_argument("--threads-per-worker", type=int, default=1, help="Torch threads per worker (0 = default)")
+    parser_run.add_argument("--range-size", type=int, default=10000, help="Chunk ids per checkpoint")
+    parser_run.add_argument("--restart", action="store_true", help="Discard progress and start over")
+    parser_run.set_defaults(func=run)
+
+    parser_status = commands.add_parser("status", help=status.__doc__)
+    parser_status.set_defaults(func=status)
+
+    parser_switch = commands.add_parser("switch", help=switch.__doc__)
+    parser_switch.add_argument("--model", required=True)
+    parser_switch.add_argument("--batch-size", type=int, default=256)
+    parser_switch.set_defaults(func=switch)
+
+    parser_rollback = commands.add_parser("rollback", help=rollback.__doc__)
+    parser_rollback.set_defaults(func=rollback)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Tests for admission control of expensive endpoints."""
+import asyncio
+import json
+
+import pytest
+
+from app.middleware.admission import AdmissionControlMiddleware, AdmissionController, AdmissionRejected
+
+
+def controller(**overrides) -> AdmissionController:
+    options = {"max_concurrent": 1, "max_queue": 1, "queue_timeout": 1.0}
+    options.update(overrides)
+    return AdmissionController("test", **options)
+
+
+def test_admits_up_to_max_concurrent_then_queues():
+    async def scenario():
+        admission = controller(max_concurrent=2)
+        await admission.acquire()
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.stats()["active"] == 2
+        assert admission.stats()["queued"] == 1
+        assert not waiter.done()
+
+        admission.release()
+        await waiter
+        assert admission.stats()["active"] == 2
+        assert admission.stats()["queued"] == 0
+        assert admission.admitted == 3
+
+    asyncio.run(scenario())
+
+
+def test_slots_are_handed_to_the_oldest_waiter():
+    async def scenario():
+        admission = controller(max_queue=2)
+        order = []
+        await admission.acquire()
+
+        async def request(name):
+            await admission.acquire()
+            order.append(name)
+
+        first = asyncio.ensure_future(request("first"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(request("second"))
+        await asyncio.sleep(0)
+
+        admission.release()
+        await first
+        admission.release()
+        await second
+        assert order == ["first", "second"]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_503():
+    async def scenario():
+        admission = controller()
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.status_code == 503
+        assert rejected.value.retry_after >= 1
+        assert admission.rejected["queue_full"] == 1
+
+        admission.release()
+        await waiter
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_is_rejected_and_leaves_the_queue():
+    async def scenario():
+        admission = controller(queue_timeout=0.01)
+        await admission.acquire()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.status_code == 503
+        assert admission.rejected["queue_timeout"] == 1
+        assert admission.stats()["queued"] == 0
+
+        # The slot goes back to the pool, not to the timed-out waiter
+        admission.release()
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        admission = controller(max_per_session=1)
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.stats()["queued"] == 0
+
+        # Session b may queue again
+        again = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        admission.release("a")
+        await again
+
+    asyncio.run(scenario())
+
+
+def test_per_session_limit_counts_running_and_waiting_requests():
+    async def scenario():
+        admission = controller(max_concurrent=1, max_queue=5, max_per_session=2)
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("a"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("a")
+        assert rejected.value.status_code == 429
+        assert admission.rejected["session_limit"] == 1
+
+        # Other sessions are not affected
+        other = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+
+        admission.release("a")
+        await waiter
+        admission.release("a")
+        await other
+        admission.release("b")
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_grows_with_the_backlog():
+    async def scenario():
+        admission = controller(max_concurrent=1, max_queue=4, queue_timeout=5.0)
+        await admission.acquire()
+        admission.release(duration=11.0)
+        await admission.acquire()
+        short = admission.retry_after()
+
+        waiters = [asyncio.ensure_future(admission.acquire()) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert admission.retry_after() > short
+
+        for waiter in waiters:
+            admission.release()
+            await waiter
+
+    asyncio.run(scenario())
+
+
+async def call(app, body: bytes):
+    """Send one POST /api/chat/ request through an ASGI app."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/chat/", "headers": []}
+    await app(scope, receive, send)
+    return sent
+
+
+def test_middleware_replays_the_body_and_rejects_over_the_session_limit():
+    async def scenario():
+        admission = controller(max_per_session=1)
+        received = []
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            received.append((await receive())["body"])
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        middleware = AdmissionControlMiddleware(app, [("/api/chat", admission)])
+        body = json.dumps({"session_id": "s1", "message": "hi"}).encode()
+
+        running = asyncio.ensure_future(call(middleware, body))
+        await asyncio.sleep(0.01)
+        rejected = await call(middleware, body)
+        release.set()
+        accepted = await running
+
+        assert received == [body]
+        assert accepted[0]["status"] == 200
+        assert rejected[0]["status"] == 429
+        assert (b"retry-after", b"1") in rejected[0]["headers"]
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+"""Tests for the blob store and the sweep of unreferenced blobs."""
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Document, Session as ChatSession
+from app.services import blob_store as blob_store_module
+from app.services.blob_store import BlobStore, delete_unreferenced_blobs
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"), level=3)
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    return store
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    ChatSession.metadata.create_all(engine, tables=[ChatSession.__table__, Document.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def age(store, digest, seconds):
+    """Make a blob look written `seconds` ago."""
+    for _, path in store.iter_blobs():
+        if os.path.basename(path).startswith(digest):
+            past = time.time() - seconds
+            os.utime(path, (past, past))
+
+
+def test_put_text_round_trip_and_dedup(store):
+    digest = store.put_text("same text")
+
+    assert store.put_text("same text") == digest
+    assert store.get_text(digest) == "same text"
+    assert [found for found, _ in store.iter_blobs()] == [digest]
+
+
+def test_put_text_refreshes_age_of_reused_blob(store):
+    digest = store.put_text("reused")
+    age(store, digest, 7200)
+
+    store.put_text("reused")
+
+    (_, path), = store.iter_blobs()
+    assert time.time() - os.stat(path).st_mtime < 60
+
+
+def test_deletes_only_unreferenced_blobs(store, db):
+    kept = store.put_text("still used")
+    orphan = store.put_text("document was deleted")
+    db.add(Document(filename="a.txt", file_type="txt", content_hash=kept))
+    db.commit()
+    age(store, kept, 7200)
+    age(store, orphan, 7200)
+
+    assert delete_unreferenced_blobs(db, min_age_seconds=3600, batch_size=1) == 1
+
+    assert store.exists(kept)
+    assert not store.exists(orphan)
+
+
+def test_keeps_recent_unreferenced_blobs(store, db):
+    # Written by an upload whose document row is not committed yet
+    digest = store.put_text("upload in progress")
+
+    assert delete_unreferenced_blobs(db, min_age_seconds=3600) == 0
+    assert store.exists(digest)
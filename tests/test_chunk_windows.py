@@ -0,0 +1,63 @@
+"""Tests for neighbour-window expansion of retrieved chunks."""
+from app.services.chunk_windows import expand_hits, window_positions
+
+
+def stored(document_id: int, count: int):
+    """Chunks 0..count-1 of a document, each "d<document>c<index> " with 3 tokens."""
+    return {(document_id, index): (f"d{document_id}c{index} ", 3) for index in range(count)}
+
+
+def test_window_positions():
+    assert window_positions((7, 5, 0.1), 2) == [(7, 3), (7, 4), (7, 5), (7, 6), (7, 7)]
+    assert window_positions((7, 5, 0.1), 0) == [(7, 5)]
+
+
+def test_hit_is_joined_with_its_neighbours():
+    passages = expand_hits([(1, 5, 0.2)], stored(1, 10), window=1)
+
+    assert len(passages) == 1
+    assert passages[0].text == "d1c4 d1c5 d1c6 "
+    assert passages[0].distance == 0.2
+    assert passages[0].token_count == 9
+
+
+def test_window_stops_at_the_document_edges():
+    chunks = stored(1, 3)
+
+    first, = expand_hits([(1, 0, 0.1)], chunks, window=2)
+    last, = expand_hits([(1, 2, 0.1)], chunks, window=2)
+
+    assert first.text == "d1c0 d1c1 d1c2 "
+    assert last.text == "d1c0 d1c1 d1c2 "
+
+
+def test_overlapping_windows_do_not_repeat_chunks():
+    hits = [(1, 5, 0.1), (1, 6, 0.2), (1, 2, 0.3)]
+
+    passages = expand_hits(hits, stored(1, 10), window=1)
+
+    assert [p.text for p in passages] == ["d1c4 d1c5 d1c6 ", "d1c7 ", "d1c1 d1c2 d1c3 "]
+    assert [p.distance for p in passages] == [0.1, 0.2, 0.3]
+    assert [p.token_count for p in passages] == [9, 3, 9]
+
+
+def test_fully_covered_hit_is_dropped():
+    hits = [(1, 5, 0.1), (1, 4, 0.2), (1, 5, 0.3)]
+
+    passages = expand_hits(hits, stored(1, 10), window=2)
+
+    assert [p.text for p in passages] == ["d1c3 d1c4 d1c5 d1c6 d1c7 ", "d1c2 "]
+
+
+def test_documents_are_kept_apart():
+    chunks = {**stored(1, 5), **stored(2, 5)}
+
+    passages = expand_hits([(2, 2, 0.1), (1, 2, 0.2)], chunks, window=1)
+
+    assert [p.text for p in passages] == ["d2c1 d2c2 d2c3 ", "d1c1 d1c2 d1c3 "]
+
+
+def test_zero_window_returns_the_hits():
+    passages = expand_hits([(1, 3, 0.1), (1, 3, 0.2)], stored(1, 5), window=0)
+
+    assert [p.text for p in passages] == ["d1c3 "]
@@ -0,0 +1,109 @@
+"""Tests for response compression with content negotiation."""
+import asyncio
+import gzip
+
+import pytest
+
+from app.middleware import compression
+from app.middleware.compression import CompressionMiddleware, parse_accept_encoding
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("br;q=1.0, GZIP;q=0.8, *;q=0.1") == {"br": 1.0, "gzip": 0.8, "*": 0.1}
+    assert parse_accept_encoding("gzip, deflate") == {"gzip": 1.0, "deflate": 1.0}
+    assert parse_accept_encoding("gzip;q=bad, , identity") == {"gzip": 0.0, "identity": 1.0}
+    assert parse_accept_encoding("") == {}
+
+
+def make_app(body: bytes, headers=None, chunks: int = 1):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": list(headers or [])})
+        size = len(body) // chunks
+        for index in range(chunks):
+            last = index == chunks - 1
+            part = body[index * size:] if last else body[index * size:(index + 1) * size]
+            await send({"type": "http.response.body", "body": part, "more_body": not last})
+    return app
+
+
+def request(app, accept_encoding=None):
+    """Run one GET through the middleware; returns (headers dict, body)."""
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = CompressionMiddleware(app, minimum_size=100)
+    asyncio.run(middleware({"type": "http", "method": "GET", "path": "/", "headers": headers}, receive, send))
+    response_headers = {name.decode(): value.decode() for name, value in sent[0].get("headers", [])}
+    return response_headers, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+BODY = b'{"messages": "' + b"hello " * 100 + b'"}'
+
+
+def test_gzip_when_brotli_is_not_accepted():
+    headers, body = request(make_app(BODY, [(b"content-length", str(len(BODY)).encode())]), "gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["content-length"] == str(len(body))
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == BODY
+
+
+def test_brotli_is_preferred_when_available():
+    brotli = pytest.importorskip("brotli")
+
+    headers, body = request(make_app(BODY), "gzip, br")
+
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body) == BODY
+
+
+def test_gzip_fallback_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+    headers, body = request(make_app(BODY), "br, gzip;q=0.5")
+
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == BODY
+
+
+def test_client_quality_decides():
+    pytest.importorskip("brotli")
+
+    headers, _ = request(make_app(BODY), "br;q=0.2, gzip;q=0.9")
+
+    assert headers["content-encoding"] == "gzip"
+
+
+def test_wildcard_and_refused_codings():
+    headers, _ = request(make_app(BODY), "*;q=0.5, br;q=0")
+    assert headers["content-encoding"] == "gzip"
+
+    headers, body = request(make_app(BODY), "gzip;q=0, *;q=0")
+    assert "content-encoding" not in headers
+    assert body == BODY
+
+
+@pytest.mark.parametrize("app, accept, encoding", [
+    (make_app(BODY), None, None),
+    (make_app(b"small" * 10), "gzip", None),
+    (make_app(BODY, chunks=3), "gzip", None),
+    (make_app(BODY, [(b"content-encoding", b"identity")]), "gzip", "identity"),
+], ids=["no-accept-encoding", "small", "streamed", "already-encoded"])
+def test_sent_unchanged(app, accept, encoding):
+    headers, body = request(app, accept)
+
+    assert headers.get("content-encoding") == encoding
+    assert body in (BODY, b"small" * 10)
+
+
+def test_existing_vary_header_is_kept():
+    headers, _ = request(make_app(BODY, [(b"vary", b"Origin")]), "gzip")
+
+    assert headers["vary"] == "Origin, Accept-Encoding"
@@ -0,0 +1,86 @@
+"""Tests for the embedding server client."""
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.embedding_server import EmbeddingClient, EmbeddingServer
+
+
+class StubService:
+    """Counts encode calls and returns constant embeddings, optionally slowly."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def get_embedding_dimension(self) -> int:
+        return 4
+
+    def encode(self, texts):
+        self.calls += 1
+        time.sleep(self.delay)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "embeddings.sock")
+
+
+def start_server(socket_path: str, service) -> EmbeddingServer:
+    server = EmbeddingServer(socket_path, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_encode_round_trip(socket_path):
+    server = start_server(socket_path, StubService())
+    try:
+        embeddings = EmbeddingClient(socket_path, timeout=5).encode(["a", "b"])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert embeddings.shape == (2, 4)
+
+
+def test_timeout_is_not_retried(socket_path):
+    service = StubService(delay=0.5)
+    server = start_server(socket_path, service)
+    try:
+        with pytest.raises(socket.timeout):
+            EmbeddingClient(socket_path, timeout=0.1).encode(["slow"])
+        time.sleep(0.7)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert service.calls == 1
+
+
+def test_reconnects_after_server_restart(socket_path):
+    server = start_server(socket_path, StubService())
+    client = EmbeddingClient(socket_path, timeout=5)
+    client.encode(["first"])
+    server.shutdown()
+    server.server_close()
+    # The old connection is still open on the client side, but broken
+    server = start_server(socket_path, StubService())
+    try:
+        embeddings = client.encode(["second"])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert embeddings.shape == (1, 4)
+
+
+def test_missing_socket_raises_after_one_retry(socket_path):
+    with pytest.raises(FileNotFoundError):
+        EmbeddingClient(socket_path, timeout=1).encode(["nobody listening"])
@@ -0,0 +1,58 @@
+"""Tests for the check of the stored embedding model against the loaded one."""
+import pytest
+
+from app.config.settings import settings
+from app.services import reembedding_service
+from app.services.reembedding_service import EmbeddingModelCheck, EmbeddingModelMismatchError
+
+
+class StubDB:
+    def connection(self):
+        return None
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    state = {"model": None, "dimension": settings.EMBEDDING_DIMENSION, "reads": 0}
+
+    def stored_embedding_model(conn):
+        state["reads"] += 1
+        return state["model"], state["dimension"]
+
+    monkeypatch.setattr(reembedding_service, "stored_embedding_model", stored_embedding_model)
+    return state
+
+
+def test_matching_embeddings(stored):
+    check = EmbeddingModelCheck()
+
+    assert check.problem(StubDB()) is None
+    check.ensure(StubDB())
+
+
+def test_switched_model_is_refused(stored):
+    stored["model"] = "other-model"
+    check = EmbeddingModelCheck()
+
+    assert "EMBEDDING_MODEL=other-model" in check.problem(StubDB())
+    with pytest.raises(EmbeddingModelMismatchError):
+        check.ensure(StubDB())
+
+
+def test_dimension_mismatch_is_refused(stored):
+    stored["dimension"] = settings.EMBEDDING_DIMENSION * 2
+    check = EmbeddingModelCheck()
+
+    assert f"EMBEDDING_DIMENSION={stored['dimension']}" in check.problem(StubDB())
+
+
+def test_stored_model_is_read_once_per_interval(stored):
+    check = EmbeddingModelCheck(interval_seconds=60)
+    check.problem(StubDB())
+    stored["model"] = "other-model"
+
+    assert check.problem(StubDB()) is None
+    assert stored["reads"] == 1
+
+    check.interval_seconds = 0
+    assert check.problem(StubDB()) is not None
@@ -0,0 +1,40 @@
+"""Tests for the multi-process encode pool."""
+import os
+import subprocess
+import sys
+
+from app.services.encode_pool import EncodePool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_split_keeps_order_and_batch_alignment():
+    pool = EncodePool("model", workers=2, batch_size=32)
+    texts = [str(index) for index in range(300)]
+
+    slices = pool.split(texts)
+
+    assert [text for part in slices for text in part] == texts
+    assert all(len(part) % 32 == 0 for part in slices[:-1])
+    assert len(slices) > pool.workers
+
+
+def test_split_never_goes_below_one_batch():
+    pool = EncodePool("model", workers=8, batch_size=32)
+
+    assert [len(part) for part in pool.split(["text"] * 40)] == [32, 8]
+
+
+def test_worker_modules_do_not_load_the_embedding_service():
+    # Spawned workers import only these modules; app.services.embedding_service
+    # would load a second copy of the model in each of them
+    code = (
+        "import sys\n"
+        "import app.services.encode_pool, app.services.bulk_ingestion, app.services.reembedding_service\n"
+        "print('app.services.embedding_service' in sys.modules)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,211 @@
+"""Tests for Idempotency-Key handling of chat requests."""
+import asyncio
+import json
+
+import pytest
+
+from app.middleware import idempotency
+from app.middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+class CountingApp:
+    """ASGI app that answers with a numbered response after an optional wait."""
+
+    def __init__(self, status: int = 200, delay: float = 0.0, fail: bool = False):
+        self.status = status
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.bodies = []
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        self.bodies.append((await receive())["body"])
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        body = json.dumps({"call": self.calls}).encode()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def post(app, body: bytes = b'{"message": "hi"}', key: str = "k1", path: str = "/api/chat/"):
+    """Send one POST through an ASGI app; returns (status, headers dict, body)."""
+    sent = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b"idempotency-key", key.encode())] if key is not None else []
+    await app({"type": "http", "method": "POST", "path": path, "headers": headers}, receive, send)
+    start = sent[0]
+    return (
+        start["status"],
+        {name.decode(): value.decode() for name, value in start["headers"]},
+        b"".join(message.get("body", b"") for message in sent[1:]),
+    )
+
+
+def middleware(app, store=None, wait_timeout: float = 5.0):
+    store = store or IdempotencyStore(ttl_seconds=300, max_keys=100)
+    return IdempotencyMiddleware(app, store, paths=["/api/chat"], wait_timeout=wait_timeout), store
+
+
+def test_duplicate_in_flight_joins_the_leader():
+    async def scenario():
+        app = CountingApp(delay=0.05)
+        wrapped, store = middleware(app)
+
+        first, second = await asyncio.gather(post(wrapped), post(wrapped))
+
+        assert app.calls == 1
+        assert first[2] == second[2]
+        assert "idempotent-replayed" not in first[1]
+        assert second[1]["idempotent-replayed"] == "true"
+        assert store.stats()["joined"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_completed_response_is_replayed():
+    async def scenario():
+        app = CountingApp()
+        wrapped, store = middleware(app)
+
+        first = await post(wrapped)
+        again = await post(wrapped)
+
+        assert app.calls == 1
+        assert app.bodies == [b'{"message": "hi"}']
+        assert again[0] == first[0] and again[2] == first[2]
+        assert store.stats()["replayed"] == 1
+        assert store.stats()["stored"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_with_another_body_is_rejected():
+    async def scenario():
+        app = CountingApp()
+        wrapped, store = middleware(app)
+        await post(wrapped)
+
+        status, _, body = await post(wrapped, body=b'{"message": "other"}')
+
+        assert status == 422
+        assert "different request body" in json.loads(body)["detail"]
+        assert app.calls == 1
+        assert store.stats()["mismatched"] == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("outcome", [{"status": 500}, {"status": 429}, {"fail": True}],
+                         ids=["server-error", "too-many-requests", "exception"])
+def test_failed_requests_are_forgotten(outcome):
+    async def scenario():
+        app = CountingApp(**outcome)
+        wrapped, store = middleware(app)
+        for _ in range(2):
+            try:
+                await post(wrapped)
+            except RuntimeError:
+                pass
+
+        assert app.calls == 2
+        assert store.stats() == {"in_flight": 0, "stored": 0, "replayed": 0, "joined": 0, "mismatched": 0}
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_of_a_failed_request_runs_it_again():
+    async def scenario():
+        app = CountingApp(status=503, delay=0.05)
+        wrapped, _ = middleware(app)
+
+        results = await asyncio.gather(post(wrapped), post(wrapped))
+
+        assert app.calls == 2
+        assert [status for status, _, _ in results] == [503, 503]
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_waiting_too_long_gets_409():
+    async def scenario():
+        app = CountingApp(delay=0.2)
+        wrapped, _ = middleware(app, wait_timeout=0.01)
+
+        first, second = await asyncio.gather(post(wrapped), post(wrapped))
+
+        assert first[0] == 200
+        assert second[0] == 409
+        assert second[1]["retry-after"] == "1"
+        assert app.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_scoped_to_the_path_and_optional():
+    async def scenario():
+        app = CountingApp()
+        wrapped, _ = middleware(app)
+
+        await post(wrapped, key=None)
+        await post(wrapped, key=None)
+        await post(wrapped, path="/api/other")
+        await post(wrapped, path="/api/other")
+        assert app.calls == 4
+
+        status, _, _ = await post(wrapped, key="x" * (idempotency.MAX_KEY_LENGTH + 1))
+        assert status == 400
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, "monotonic", lambda: now[0])
+    return now
+
+
+def complete(store, key, response=(200, [], b"ok")):
+    store.complete(key, store.begin(key, "fingerprint"), response)
+
+
+def test_responses_expire_after_the_ttl(clock):
+    store = IdempotencyStore(ttl_seconds=60, max_keys=10)
+    complete(store, "a")
+
+    clock[0] += 59
+    assert store.get("a") is not None
+    clock[0] += 2
+    assert store.get("a") is None
+    assert store.stats()["stored"] == 0
+
+
+def test_oldest_responses_are_evicted_beyond_max_keys(clock):
+    store = IdempotencyStore(ttl_seconds=60, max_keys=2)
+    for key in ("a", "b", "c"):
+        complete(store, key)
+        clock[0] += 1
+
+    assert store.get("a") is None
+    assert store.get("b") is not None
+    assert store.get("c") is not None
+
+
+def test_forgotten_key_is_not_stored(clock):
+    store = IdempotencyStore(ttl_seconds=60, max_keys=10)
+    entry = store.begin("a", "fingerprint")
+    assert store.get("a") is entry
+
+    store.complete("a", entry, None)
+
+    assert entry.done.is_set()
+    assert store.get("a") is None
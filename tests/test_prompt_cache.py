@@ -0,0 +1,52 @@
+"""Tests for the cache-friendly prompt layout and prompt cache accounting."""
+from app.config.settings import settings
+from app.services.fake_llm import PrefixCacheFakeChatModel
+from app.services.llm_service import LLMService
+from app.services.prompt_layout import build_messages, prefix_key
+from app.services.token_budget import CHARS_PER_TOKEN
+
+PINNED = "[handbook.txt]\n" + "Pinned policy text that stays the same on every turn. " * 120
+
+
+def test_two_turns_share_a_cached_prefix(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    service = LLMService()
+    model = service._llms["fake"] = PrefixCacheFakeChatModel()
+
+    first = build_messages(PINNED, [], "chunk about refunds", "How do refunds work?")
+    first_reply = service.invoke(first, cache_key=prefix_key(first))
+
+    history = [("user", "How do refunds work?"), ("assistant", first_reply.content)]
+    second = build_messages(PINNED, history, "chunk about shipping", "And shipping?")
+    second_reply = service.invoke(second, cache_key=prefix_key(second))
+
+    # Everything before the first turn's question is repeated unchanged
+    assert second[:len(first) - 1] == first[:-1]
+    assert prefix_key(second) == prefix_key(first)
+
+    first_usage = first_reply.usage_metadata
+    second_usage = second_reply.usage_metadata
+    assert first_usage["input_token_details"]["cache_read"] == 0
+    cached = second_usage["input_token_details"]["cache_read"]
+    # The system message is served from the cache, down to a block boundary
+    system_tokens = len(f"<system>{second[0].content}\n") // CHARS_PER_TOKEN
+    assert system_tokens - model.cache_block_tokens < cached <= system_tokens
+
+    stats = service.get_prompt_cache_stats()["fake"]
+    input_tokens = first_usage["input_tokens"] + second_usage["input_tokens"]
+    assert stats["calls"] == 2
+    assert stats["reported"] == 2
+    assert stats["input_tokens"] == input_tokens
+    assert stats["cached_tokens"] == cached
+    assert stats["cached_ratio"] == round(cached / input_tokens, 4)
+    assert 0 < stats["cached_ratio"] < 1
+
+
+def test_retrieved_context_does_not_change_the_prefix():
+    first = build_messages(PINNED, [], "one context", "question")
+    second = build_messages(PINNED, [], "another context", "question")
+
+    assert first[0] == second[0]
+    assert prefix_key(first) == prefix_key(second)
+    assert prefix_key(build_messages("", [], "one context", "question")) != prefix_key(first)
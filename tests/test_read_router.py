@@ -0,0 +1,65 @@
+"""Tests for routing reads to replicas."""
+from contextlib import contextmanager
+
+import pytest
+
+from app.config.database import ReadRouter
+
+
+class StubReplica:
+    """Engine stand-in whose lag query returns a fixed value or raises."""
+
+    def __init__(self, lag):
+        self.lag = lag
+        self.checks = 0
+
+    @contextmanager
+    def connect(self):
+        self.checks += 1
+        if isinstance(self.lag, Exception):
+            raise self.lag
+        yield self
+
+    def execute(self, statement):
+        return self
+
+    def scalar(self):
+        return self.lag
+
+
+def router(*replicas, check_interval=0.0) -> ReadRouter:
+    return ReadRouter(list(replicas), read_your_writes=10.0, max_lag=5.0, check_interval=check_interval)
+
+
+@pytest.mark.parametrize("lag, usable", [
+    (0, True),
+    (4.9, True),
+    (5.1, False),
+    (None, False),  # WAL receiver not streaming
+    (OSError("connection refused"), False),
+])
+def test_replica_health(lag, usable):
+    assert router(StubReplica(lag))._usable(0) is usable
+
+
+def test_health_is_rechecked_after_the_interval():
+    replica = StubReplica(None)
+    read_router = router(replica, check_interval=60.0)
+
+    assert not read_router._usable(0)
+    replica.lag = 0
+    assert not read_router._usable(0)
+    assert replica.checks == 1
+
+    read_router.check_interval = 0.0
+    assert read_router._usable(0)
+
+
+def test_recent_writes_stay_on_the_primary():
+    read_router = router(StubReplica(0))
+
+    read_router.mark_written("s1")
+
+    assert read_router.recently_written("s1")
+    assert not read_router.recently_written("s2")
+    assert not read_router.recently_written(None)
@@ -0,0 +1,77 @@
+"""Tests for the session expiry sweep; they run when TEST_DATABASE_URL is set."""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.services import session_cleanup
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def db():
+    """A database session on the test database, with the application tables created."""
+    from app.config.database import Base
+
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
+def deleted_sessions(db, count: int):
+    """Create sessions marked deleted, oldest first; returns their ids."""
+    from app.models.models import Session as ChatSession
+
+    started = datetime.now(timezone.utc) - timedelta(days=1)
+    sessions = [
+        ChatSession(
+            session_id=str(uuid.uuid4()),
+            updated_at=started + timedelta(seconds=index),
+            deleted_at=started
+        )
+        for index in range(count)
+    ]
+    db.add_all(sessions)
+    db.commit()
+    return [session.id for session in sessions]
+
+
+def test_failed_purge_does_not_stop_the_sweep(db, monkeypatch):
+    from app.models.models import Session as ChatSession
+
+    ids = deleted_sessions(db, 5)
+    failing = ids[1]
+    attempts = []
+    purge = session_cleanup.purge_session
+
+    def flaky_purge(db, session_id, batch_size=None):
+        attempts.append(session_id)
+        if session_id == failing:
+            db.execute(text("SELECT 1 / 0"))
+        purge(db, session_id, batch_size)
+
+    monkeypatch.setattr(session_cleanup, "purge_session", flaky_purge)
+
+    deleted = session_cleanup.expire_idle_sessions(db, ttl=None, batch_size=2, max_batches=10)
+
+    remaining = [row[0] for row in db.query(ChatSession.id).filter(ChatSession.id.in_(ids))]
+    assert remaining == [failing]
+    assert attempts.count(failing) == 1
+    assert deleted >= 4
+
+    monkeypatch.setattr(session_cleanup, "purge_session", purge)
+    session_cleanup.expire_idle_sessions(db, ttl=None, batch_size=2, max_batches=10)
+    assert db.query(ChatSession.id).filter(ChatSession.id.in_(ids)).count() == 0
@@ -0,0 +1,88 @@
+"""Tests for the similarity search in PostgreSQL; they run when TEST_DATABASE_URL is set."""
+import os
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.config.settings import settings
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A session on a one-connection pool, with five chunks in a new chat session."""
+    from app.config.database import Base
+    from app.config.vector_binding import install_vector_binding
+    from app.models.models import Document, DocumentChunk, Session as ChatSession
+
+    monkeypatch.setattr(settings, "SIMILARITY_PREPARED_STATEMENT", True)
+    monkeypatch.setattr(settings, "CHUNK_NEIGHBOR_WINDOW", 0)
+
+    engine = create_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0)
+    install_vector_binding(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    Base.metadata.create_all(engine)
+
+    session = sessionmaker(bind=engine)()
+    chat = ChatSession(session_id=str(uuid.uuid4()))
+    session.add(chat)
+    session.flush()
+    document = Document(session_id=chat.id, filename="a.txt", file_type="txt")
+    session.add(document)
+    session.flush()
+    rng = np.random.default_rng(0)
+    session.add_all([
+        DocumentChunk(
+            document_id=document.id,
+            session_id=chat.id,
+            chunk_text=f"chunk {index}",
+            chunk_index=index,
+            token_count=2,
+            embedding=rng.random(settings.EMBEDDING_DIMENSION, dtype=np.float32)
+        )
+        for index in range(5)
+    ])
+    session.commit()
+
+    yield session, chat.id
+
+    session.rollback()
+    session.query(ChatSession).filter(ChatSession.id == chat.id).delete()
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+def search(session, session_id, dimension=settings.EMBEDDING_DIMENSION):
+    from app.services.rag_service import rag_service
+
+    return rag_service._search_database(session, session_id, np.ones(dimension, dtype=np.float32), 3)
+
+
+def test_failed_execute_does_not_break_later_searches(db):
+    session, session_id = db
+
+    # A query vector of the wrong dimension makes EXECUTE fail, on the call
+    # that prepares the statement and on one that reuses it
+    assert search(session, session_id, dimension=3) == []
+    assert len(search(session, session_id)) == 3
+    assert search(session, session_id, dimension=3) == []
+    assert len(search(session, session_id)) == 3
+
+
+def test_lost_statement_is_prepared_again(db):
+    session, session_id = db
+    assert len(search(session, session_id))
+
+    session.execute(text("DEALLOCATE ALL"))
+    session.commit()
+
+    assert search(session, session_id) == []
+    assert len(search(session, session_id)) == 3
@@ -0,0 +1,49 @@
+"""Tests for token-budgeted context packing."""
+from app.config.settings import settings
+from app.services.token_budget import SEPARATOR_TOKENS, RetrievedChunk, estimate_tokens, pack_chunks
+
+
+def chunk(name: str, tokens: int) -> RetrievedChunk:
+    return RetrievedChunk(name, 0.1, tokens)
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_takes_chunks_in_order_while_they_fit():
+    chunks = [chunk("a", 40), chunk("b", 40), chunk("c", 40)]
+
+    selected = pack_chunks(chunks, budget=80 + SEPARATOR_TOKENS)
+
+    assert [c.text for c in selected] == ["a", "b"]
+
+
+def test_separators_count_against_the_budget():
+    chunks = [chunk("a", 40), chunk("b", 40)]
+
+    assert [c.text for c in pack_chunks(chunks, budget=80)] == ["a"]
+
+
+def test_skips_a_chunk_that_does_not_fit_for_a_smaller_one():
+    chunks = [chunk("a", 50), chunk("big", 100), chunk("small", 20)]
+
+    selected = pack_chunks(chunks, budget=80)
+
+    assert [c.text for c in selected] == ["a", "small"]
+
+
+def test_chunk_larger_than_the_budget_is_left_out():
+    assert pack_chunks([chunk("huge", 500)], budget=100) == []
+
+
+def test_empty_budget_selects_nothing():
+    assert pack_chunks([chunk("a", 1)], budget=0) == []
+
+
+def test_defaults_to_context_token_budget(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 10)
+
+    assert [c.text for c in pack_chunks([chunk("a", 10), chunk("b", 1)])] == ["a"]
@@ -0,0 +1,43 @@
+"""Tests for the in-process vector cache."""
+import numpy as np
+
+from app.services import vector_cache as vector_cache_module
+from app.services.vector_cache import SessionVectorCache, SessionVectors, normalize_rows
+
+
+def entry() -> SessionVectors:
+    return SessionVectors(normalize_rows(np.eye(2)), ["a", "b"], [1, 1])
+
+
+def test_search_orders_by_cosine_distance():
+    found = entry().search(np.array([0.1, 1.0]), top_k=2)
+
+    assert [chunk.text for chunk in found] == ["b", "a"]
+
+
+def test_load_started_before_an_invalidation_is_not_stored():
+    cache = SessionVectorCache(max_bytes=10_000, ttl_seconds=60)
+    generation = cache.generation(1)
+
+    cache.invalidate(1)
+
+    assert not cache.put(1, entry(), generation)
+    assert cache.put(1, entry(), cache.generation(1))
+    assert cache.get(1) is not None
+
+
+def test_old_generations_are_pruned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vector_cache_module.time, "monotonic", lambda: now[0])
+    cache = SessionVectorCache(max_bytes=10_000, ttl_seconds=60)
+    stale = {session_id: cache.generation(session_id) for session_id in range(10_001)}
+    for session_id in range(10_001):
+        cache.invalidate(session_id)
+
+    now[0] += 61
+    cache.invalidate(20_000)
+
+    assert len(cache._generations) == 1
+    # Loads that started before a pruned invalidation are still refused
+    assert not cache.put(5, entry(), stale[5])
+    assert cache.put(5, entry(), cache.generation(5))